@@ -6,11 +6,26 @@ Application Factory Pattern
 """
 
 import os
+import asyncio
 import logging
 from telegram.ext import Application, ApplicationBuilder
 
 from config.config import BOT_TOKEN, ADMIN_IDS
+from config.constants import (
+    CACHE_WARMUP_FILE, CACHE_WARMUP_MAX_KEYS, CACHE_WARMUP_WORKERS,
+    CACHE_WARMUP_TIME_BUDGET, CACHE_HOT_KEYS_SAVE_INTERVAL,
+    CACHE_SNAPSHOT_FILE, CACHE_SNAPSHOT_INTERVAL, UA_STATS_RECONCILE_INTERVAL,
+    CACHE_MAX_SIZE, CACHE_MAX_BYTES, CACHE_EVICTION_POLICY,
+)
 from core.database.database_adapter import get_database_adapter, DatabaseMode
+from core.cache.warming import warm_caches, save_hot_keys, register_target
+from core.cache.snapshot import load_snapshot, save_snapshot, schedule_snapshots
+from core.cache.coherency import start_bus, stop_bus, transport_from_env
+from core.cache.shared_l2 import attach_shared_l2
+from core.cache.backends import attach_backend
+from core.cache.ua_cache_manager import get_ua_cache
+from core.cache.ua_refresher import start_ua_refresher, stop_ua_refresher
+from core.cache.engine import get_engine
 
 # Import registries
 from .registry.user_registry import UserHandlerRegistry
@@ -39,6 +54,7 @@ class BotApplicationFactory:
         self.bot = bot_instance
         self.application = None
         self.db = bot_instance.db
+        self._warmup_task = None
     
     def create_application(self, post_init_callback=None, post_shutdown_callback=None):
         """
@@ -52,15 +68,33 @@ class BotApplicationFactory:
             Application: Telegram Application آماده
         """
         logger.info("Building Telegram Application...")
+        self._configure_cache_limits()
         
         # ساخت Application - دقیقاً مثل main.py
         builder = ApplicationBuilder().token(BOT_TOKEN)
         
-        if post_init_callback:
-            builder = builder.post_init(post_init_callback)
+        # callback ها با مراحل cache پیچیده می‌شوند: bus هماهنگی، refresher آمار UA، load
+        # snapshot و warm up (در پس‌زمینه) در startup، توقف warm up، refresher و bus و ذخیره
+        # snapshot و hot key ها در shutdown
+        async def post_init(application):
+            if post_init_callback:
+                await post_init_callback(application)
+            self._attach_l2_cache()
+            self._start_cache_bus()
+            self._start_ua_refresher(application)
+            self._load_cache_snapshot()
+            # startup منتظر replay نمی‌ماند؛ هندلرها از همان لحظه سرو می‌شوند
+            self._warmup_task = asyncio.get_running_loop().create_task(self._warm_caches())
         
-        if post_shutdown_callback:
-            builder = builder.post_shutdown(post_shutdown_callback)
+        async def post_shutdown(application):
+            if post_shutdown_callback:
+                await post_shutdown_callback(application)
+            await self._stop_cache_warmup()
+            await stop_ua_refresher()
+            self._save_cache_state()
+            stop_bus()
+        
+        builder = builder.post_init(post_init).post_shutdown(post_shutdown)
         
         self.application = builder.build()
         
@@ -78,6 +112,129 @@ class BotApplicationFactory:
         logger.info("Application built successfully")
         return self.application
     
+    @staticmethod
+    def _configure_cache_limits():
+        """بودجه و eviction policy region 'default' (get_cache / cached) از config.constants"""
+        try:
+            get_engine().configure_region(
+                'default', max_entries=CACHE_MAX_SIZE, max_bytes=CACHE_MAX_BYTES, policy=CACHE_EVICTION_POLICY,
+            )
+        except Exception as e:
+            logger.error(f"Cache limits could not be applied: {e}")
+    
+    def _attach_l2_cache(self):
+        """
+        اتصال region های پرخواندن به backend L2 مشترک
+        
+        CACHE_BACKEND=redis (بین سرورها با CACHE_REDIS_URL)، shared (حافظه مشترک
+        بین worker های این سرور) یا memory؛ CACHE_L2_ENABLED=true معادل shared است.
+        key متدهای DatabaseAdapter با نام 'db' سریال می‌شوند تا بین process ها یکسان باشند.
+        """
+        use_shared = os.getenv('CACHE_L2_ENABLED', 'false').lower() == 'true'
+        if not os.getenv('CACHE_BACKEND') and not use_shared:
+            return
+        try:
+            register_target('db', self.db)
+            if os.getenv('CACHE_BACKEND'):
+                attach_backend()
+            else:
+                attach_shared_l2()
+        except Exception as e:
+            logger.error(f"Cache L2 backend could not be attached: {e}")
+    
+    def _start_cache_bus(self):
+        """
+        شروع bus هماهنگی cache بین process ها
+        
+        با CACHE_BUS=postgres (LISTEN/NOTIFY) یا CACHE_BUS=unix فعال می‌شود؛ بدون آن
+        cache فقط داخل همین process است.
+        """
+        try:
+            transport = transport_from_env()
+            if transport is not None:
+                start_bus(transport)
+        except Exception as e:
+            logger.error(f"Cache invalidation bus failed to start: {e}")
+    
+    def _start_ua_refresher(self, application):
+        """
+        پیش‌محاسبه آمار و رتبه‌بندی‌های داشبورد اتچمنت کاربران روی event loop برنامه
+        
+        آمار و رتبه‌بندی‌ها در startup، هر UA_STATS_RECONCILE_INTERVAL ثانیه و بعد از
+        رویدادها در پس‌زمینه محاسبه می‌شوند تا هندلرها فقط مقدار آماده بخوانند.
+        وضعیت اجراها (زمان، مدت، خطاها) با bot_data['ua_refresher'].get_stats() در دسترس است.
+        """
+        try:
+            refresher = start_ua_refresher(get_ua_cache(self.db), UA_STATS_RECONCILE_INTERVAL)
+            application.bot_data['ua_refresher'] = refresher
+        except Exception as e:
+            logger.error(f"UA aggregate refresher could not be started: {e}")
+    
+    @staticmethod
+    def _snapshot_enabled() -> bool:
+        return os.getenv('CACHE_SNAPSHOT_ENABLED', 'false').lower() == 'true'
+    
+    def _load_cache_snapshot(self):
+        """
+        برگرداندن cache از snapshot اجرای قبلی و زمان‌بندی ذخیره دوره‌ای آن
+        
+        با CACHE_SNAPSHOT_ENABLED=true فعال می‌شود. entry هایی که از snapshot
+        برمی‌گردند در warm up دوباره اجرا نمی‌شوند (cache hit هستند).
+        """
+        if not self._snapshot_enabled():
+            return
+        try:
+            # key متدهای DatabaseAdapter با نام 'db' ذخیره شده‌اند
+            register_target('db', self.db)
+            load_snapshot(CACHE_SNAPSHOT_FILE)
+            schedule_snapshots(CACHE_SNAPSHOT_FILE, CACHE_SNAPSHOT_INTERVAL)
+        except Exception as e:
+            logger.error(f"Cache snapshot load failed: {e}")
+    
+    async def _warm_caches(self):
+        """
+        گرم کردن cache با replay پرمصرف‌ترین فراخوانی‌های اجرای قبلی
+        
+        به صورت Task پس‌زمینه از post_init اجرا می‌شود. با CACHE_WARMUP_ENABLED=false
+        غیرفعال می‌شود؛ خطا در warm up مانع startup نمی‌شود.
+        """
+        if os.getenv('CACHE_WARMUP_ENABLED', 'true').lower() != 'true':
+            return
+        try:
+            await warm_caches(
+                {'db': self.db},
+                CACHE_WARMUP_FILE,
+                max_keys=CACHE_WARMUP_MAX_KEYS,
+                max_workers=CACHE_WARMUP_WORKERS,
+                time_budget=CACHE_WARMUP_TIME_BUDGET,
+                save_interval=CACHE_HOT_KEYS_SAVE_INTERVAL,
+            )
+        except Exception as e:
+            logger.error(f"Cache warm up failed: {e}")
+    
+    async def _stop_cache_warmup(self):
+        """لغو warm up اگر تا shutdown تمام نشده باشد"""
+        task, self._warmup_task = self._warmup_task, None
+        if task is None or task.done():
+            return
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    
+    def _save_cache_state(self):
+        """ذخیره snapshot cache و لیست hot key ها برای اجرای بعدی"""
+        if self._snapshot_enabled():
+            try:
+                save_snapshot(CACHE_SNAPSHOT_FILE)
+            except Exception as e:
+                logger.error(f"Could not save cache snapshot: {e}")
+        try:
+            save_hot_keys(CACHE_WARMUP_FILE, CACHE_WARMUP_MAX_KEYS)
+        except Exception as e:
+            logger.error(f"Could not save hot cache keys: {e}")
+    
     def setup_handlers(self):
         """
         راه‌اندازی تمام handlers - جایگزین setup_handlers() در main.py
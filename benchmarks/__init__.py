@@ -0,0 +1,6 @@
+"""
+Benchmarks برای زیرسیستم cache
+
+اجرا از ریشه پروژه:
+    python -m benchmarks.cache_contention
+"""
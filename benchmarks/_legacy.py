@@ -0,0 +1,125 @@
+"""
+پیاده‌سازی‌های قبلی cache که فقط برای مقایسه در benchmark ها نگه داشته شده‌اند
+
+⚠️ در کد اصلی استفاده نشود
+"""
+
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from utils.logger import get_logger
+from utils.metrics import get_metrics, log_cache_access
+from core.cache.cache_manager import CacheManager
+
+logger = get_logger('cache', 'cache.log')
+
+
+class LegacyCacheEntry:
+    """CacheEntry قبلی (بدون __slots__)"""
+
+    def __init__(self, value: Any, ttl: int):
+        self.value = value
+        ttl_int = int(ttl) if isinstance(ttl, str) else ttl
+        self.expiry = time.time() + ttl_int
+
+    def is_expired(self) -> bool:
+        return time.time() > self.expiry
+
+
+class LegacyCacheManager:
+    """CacheManager قبلی با یک RLock سراسری"""
+
+    def __init__(self):
+        self._cache: Dict[str, LegacyCacheEntry] = {}
+        self._lock = threading.RLock()
+        self._metrics = get_metrics()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            if key in self._cache:
+                entry = self._cache[key]
+                if not entry.is_expired():
+                    log_cache_access(hit=True)
+                    logger.debug(f"Cache HIT: {key}")
+                    return entry.value
+                else:
+                    del self._cache[key]
+                    self._metrics.cache_metrics.record_eviction()
+
+            log_cache_access(hit=False)
+            logger.debug(f"Cache MISS: {key}")
+            return None
+
+    def set(self, key: str, value: Any, ttl: int = 300):
+        with self._lock:
+            self._cache[key] = LegacyCacheEntry(value, ttl)
+            logger.debug(f"Cache SET: {key} (TTL={ttl}s)")
+
+
+class EagerLoggingCacheManager(CacheManager):
+    """CacheManager با مسیر get قبلی (f-string log و log_cache_access در هر فراخوانی)"""
+
+    def get(self, key):
+        segment = self._segments[hash(key) % self._shard_count]
+        entry = segment.entries.get(key)
+        if self._track_access:
+            self._policy.on_access(key)
+        if entry is not None:
+            now = time.monotonic()
+            if now <= entry.expiry:
+                entry.last_access = now
+                entry.hits += 1
+                log_cache_access(hit=True)
+                logger.debug(f"Cache HIT: {key}")
+                return entry.value
+
+        log_cache_access(hit=False)
+        logger.debug(f"Cache MISS: {key}")
+        return None
+
+
+class EagerStatsSmartCacheManager:
+    """مسیر get/set قبلی SmartCacheManager (OrderedDict با یک RLock و محاسبه hit rate در هر فراخوانی)"""
+
+    def __init__(self):
+        self._cache = OrderedDict()
+        self._lock = threading.RLock()
+        self._stats = {'hits': 0, 'misses': 0, 'sets': 0, 'hit_rate': 0.0}
+
+    def _update_hit_rate(self):
+        total = self._stats['hits'] + self._stats['misses']
+        if total > 0:
+            self._stats['hit_rate'] = (self._stats['hits'] / total) * 100
+
+    def get(self, key):
+        entry = self._cache.get(key)
+        if entry is not None:
+            now = time.monotonic()
+            if now < entry['expires_at']:
+                self._stats['hits'] += 1
+                self._update_hit_rate()
+                if self._lock.acquire(blocking=False):
+                    try:
+                        if self._cache.get(key) is entry:
+                            self._cache.move_to_end(key)
+                    finally:
+                        self._lock.release()
+                logger.debug(f"Cache HIT: {key} (TTL remaining: {entry['expires_at'] - now:.1f}s)")
+                return entry['value']
+
+        self._stats['misses'] += 1
+        self._update_hit_rate()
+        logger.debug(f"Cache MISS: {key}")
+        return None
+
+    def set(self, key, value, data_type: str = 'default', ttl: int = 300):
+        with self._lock:
+            self._cache[key] = {
+                'value': value,
+                'expires_at': time.monotonic() + ttl,
+                'data_type': data_type,
+                'created_at': time.time()
+            }
+            self._stats['sets'] += 1
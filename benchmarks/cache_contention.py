@@ -0,0 +1,75 @@
+"""
+Benchmark رقابت روی lock در CacheManager
+
+چند thread به صورت همزمان ترکیبی از get (90%) و set (10%) روی key های
+نامرتبط اجرا می‌کنند و throughput کل (ops/s) برای 1/4/16 thread بین
+پیاده‌سازی قبلی (یک RLock سراسری) و CacheManager فعلی (sharded) مقایسه می‌شود.
+
+اجرا:
+    python -m benchmarks.cache_contention [--ops 200000] [--keys 2000]
+"""
+
+import argparse
+import threading
+import time
+
+from benchmarks._legacy import LegacyCacheManager
+from core.cache.cache_manager import CacheManager
+
+THREAD_COUNTS = (1, 4, 16)
+
+
+def _worker(cache, keys, ops, start_barrier):
+    key_count = len(keys)
+    start_barrier.wait()
+    for i in range(ops):
+        key = keys[i % key_count]
+        if i % 10 == 0:
+            cache.set(key, i, 300)
+        else:
+            cache.get(key)
+
+
+def run(cache_factory, threads: int, total_ops: int, key_count: int) -> float:
+    """اجرای workload و برگرداندن throughput (ops/s)"""
+    cache = cache_factory()
+    keys = [f"get_weapon_attachments:assault_rifle_{i}:" for i in range(key_count)]
+    for key in keys:
+        cache.set(key, key, 300)
+
+    ops_per_thread = total_ops // threads
+    barrier = threading.Barrier(threads + 1)
+    workers = [
+        threading.Thread(target=_worker, args=(cache, keys[t::threads] or keys, ops_per_thread, barrier))
+        for t in range(threads)
+    ]
+    for worker in workers:
+        worker.start()
+
+    barrier.wait()
+    started = time.perf_counter()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+    return (ops_per_thread * threads) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--ops', type=int, default=200_000)
+    parser.add_argument('--keys', type=int, default=2_000)
+    args = parser.parse_args()
+
+    implementations = (
+        ('legacy (global RLock)', LegacyCacheManager),
+        ('sharded', CacheManager),
+    )
+
+    print(f"{'implementation':<24}" + ''.join(f"{f'{n} threads':>16}" for n in THREAD_COUNTS))
+    for name, factory in implementations:
+        row = [run(factory, n, args.ops, args.keys) for n in THREAD_COUNTS]
+        print(f"{name:<24}" + ''.join(f"{ops:>12,.0f} op/s" for ops in row))
+
+
+if __name__ == '__main__':
+    main()
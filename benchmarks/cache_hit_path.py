@@ -0,0 +1,63 @@
+"""
+Benchmark هزینه یک cache hit (ns/op) در یک thread
+
+مسیر get قبلی (f-string برای logger.debug و log_cache_access / محاسبه hit rate
+در هر فراخوانی) با مسیر فعلی (شمارنده per-thread و log تنبل) مقایسه می‌شود.
+سطح log مثل production روی INFO است، یعنی debug غیرفعال است.
+
+اجرا:
+    python -m benchmarks.cache_hit_path [--ops 500000]
+"""
+
+import argparse
+import logging
+import time
+
+from benchmarks._legacy import EagerLoggingCacheManager, EagerStatsSmartCacheManager
+from core.cache.cache_manager import CacheManager
+from core.cache.keys import make_key
+from core.cache.smart_cache import SmartCacheManager
+
+KEY_COUNT = 1000
+
+
+def _keys():
+    return [make_key('DatabaseAdapter.get_weapon_attachments', ('assault_rifle', f"W{i}", 'mp'), {})
+            for i in range(KEY_COUNT)]
+
+
+def measure(get, keys, ops: int) -> float:
+    """میانگین زمان هر get (ns)"""
+    started = time.perf_counter_ns()
+    for i in range(ops):
+        get(keys[i % KEY_COUNT])
+    return (time.perf_counter_ns() - started) / ops
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--ops', type=int, default=500_000)
+    args = parser.parse_args()
+
+    logging.getLogger('cache').setLevel(logging.INFO)
+    logging.getLogger('smart_cache').setLevel(logging.INFO)
+    keys = _keys()
+
+    pairs = (
+        ('CacheManager', EagerLoggingCacheManager, CacheManager, lambda c, k: c.set(k, k, 3600)),
+        ('SmartCacheManager', EagerStatsSmartCacheManager, SmartCacheManager,
+         lambda c, k: c.set(k, k, 'default', 3600)),
+    )
+
+    print(f"{'cache':<20}{'before':>12}{'after':>12}")
+    for name, before_factory, after_factory, fill in pairs:
+        results = []
+        for factory in (before_factory, after_factory):
+            cache = factory()
+            for key in keys:
+                fill(cache, key)
+            results.append(measure(cache.get, keys, args.ops))
+        print(f"{name:<20}{results[0]:>9,.0f} ns{results[1]:>9,.0f} ns")
+
+if __name__ == '__main__':
+    main()
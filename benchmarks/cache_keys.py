@@ -0,0 +1,85 @@
+"""
+Benchmark ساخت cache key
+
+هزینه ساخت key برای هر فراخوانی (ns/op) بین روش‌های قبلی و core.cache.keys
+مقایسه می‌شود:
+
+- str-join: روش قبلی cached (چسباندن str() آرگومان‌ها)
+- json+md5: روش قبلی SmartCacheManager._make_key
+- tuple:    make_key فعلی (tuple hashable)
+
+ستون lookup هزینه ساخت key به علاوه یک dict.get روی cache پر را نشان می‌دهد.
+
+اجرا:
+    python -m benchmarks.cache_keys [--ops 200000]
+"""
+
+import argparse
+import hashlib
+import json
+import time
+
+from core.cache.keys import make_key
+
+FUNC = 'DatabaseAdapter.get_weapon_attachments'
+
+CALLS = (
+    ('positional', ('assault_rifle', 'M4', 'mp'), {}),
+    ('kwargs', ('assault_rifle',), {'weapon': 'M4', 'mode': 'br', 'limit': 10}),
+    ('unhashable', ('smg', ['mp', 'br']), {'filters': {'season': 7}}),
+)
+
+
+def str_join_key(func_id, args, kwargs):
+    args_str = '_'.join(str(arg) for arg in args)
+    kwargs_str = '_'.join(f"{k}={v}" for k, v in sorted(kwargs.items()))
+    return f"{func_id}:{args_str}:{kwargs_str}"
+
+
+def json_md5_key(func_id, args, kwargs):
+    key_data = {
+        'func': func_id,
+        'args': str(args),
+        'kwargs': str(sorted(kwargs.items())),
+        'type': 'attachments'
+    }
+    key_str = json.dumps(key_data, sort_keys=True, default=str)
+    return hashlib.md5(key_str.encode()).hexdigest()
+
+
+def measure(builder, args, kwargs, ops: int, lookup: bool) -> float:
+    """میانگین زمان هر عملیات (ns)"""
+    store = {builder(FUNC, (i,) + args[1:], kwargs): i for i in range(1000)}
+    store[builder(FUNC, args, kwargs)] = True
+    get = store.get
+    started = time.perf_counter_ns()
+    if lookup:
+        for _ in range(ops):
+            get(builder(FUNC, args, kwargs))
+    else:
+        for _ in range(ops):
+            builder(FUNC, args, kwargs)
+    return (time.perf_counter_ns() - started) / ops
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--ops', type=int, default=200_000)
+    args = parser.parse_args()
+
+    builders = (
+        ('str-join', str_join_key),
+        ('json+md5', json_md5_key),
+        ('tuple', make_key),
+    )
+
+    print(f"{'call':<12}{'builder':<12}{'build':>14}{'lookup':>14}")
+    for call_name, call_args, call_kwargs in CALLS:
+        for name, builder in builders:
+            build = measure(builder, call_args, call_kwargs, args.ops, lookup=False)
+            lookup = measure(builder, call_args, call_kwargs, args.ops, lookup=True)
+            print(f"{call_name:<12}{name:<12}{build:>11,.0f} ns{lookup:>11,.0f} ns")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+"""
+Benchmark رتبه‌بندی top سلاح‌ها و کاربران روی user_attachments مصنوعی
+
+مسیر قبلی get_top_weapons / get_top_users (دو GROUP BY روی کل جدول در هر
+خواندن بعد از انقضای cache) با IncrementalTopK مقایسه می‌شود. جدول در sqlite
+درون حافظه ساخته می‌شود (همان query ها بدون ویژگی‌های Postgres)، پس عدد
+مطلق GROUP BY با Postgres فرق دارد ولی رشد آن با تعداد ردیف‌ها همان است.
+
+گزارش:
+    group_by     زمان هر خواندن با GROUP BY (ms)
+    build        ساخت رتبه‌بندی از نتیجه GROUP BY کامل (ms، یک بار در startup/reconcile)
+    event        هزینه اعمال هر رویداد approve / reject (ns)
+    read         زمان هر خواندن top از حافظه (µs)
+
+در پایان رتبه‌بندی افزایشی با شمارش کامل مستقل (Counter) مقایسه می‌شود.
+
+اجرا:
+    python -m benchmarks.ua_topk [--rows 1000000] [--events 200000]
+"""
+
+import argparse
+import random
+import sqlite3
+import time
+from collections import Counter
+
+from core.cache.topk import IncrementalTopK
+
+WEAPONS = 120
+USERS = 50_000
+MODES = ('br', 'mp')
+LIMIT = 10
+
+WEAPONS_QUERY = """
+    SELECT custom_weapon_name, mode, COUNT(*) AS attachment_count
+    FROM user_attachments
+    WHERE status = 'approved' AND custom_weapon_name IS NOT NULL
+    GROUP BY custom_weapon_name, mode
+    ORDER BY attachment_count DESC
+    LIMIT ?
+"""
+
+USERS_QUERY = """
+    SELECT user_id, COUNT(*) AS approved_count, COALESCE(SUM(like_count), 0) AS total_likes
+    FROM user_attachments
+    WHERE status = 'approved'
+    GROUP BY user_id
+    ORDER BY approved_count DESC
+    LIMIT ?
+"""
+
+
+def _rows(count: int, rng: random.Random):
+    # توزیع غیر یکنواخت مثل داده واقعی: چند سلاح و کاربر بیشتر اتچمنت دارند
+    weapons = [f"W{i}" for i in range(WEAPONS)]
+    weapon_weights = [1 / (i + 1) for i in range(WEAPONS)]
+    for _ in range(count):
+        status = rng.choices(('approved', 'pending', 'rejected'), (70, 20, 10))[0]
+        yield (
+            int(rng.paretovariate(1.2) * 10) % USERS,
+            rng.choices(weapons, weapon_weights)[0],
+            rng.choice(MODES),
+            status,
+            rng.randint(0, 50) if status == 'approved' else 0,
+        )
+
+
+def build_table(rows: int, rng: random.Random) -> sqlite3.Connection:
+    conn = sqlite3.connect(':memory:')
+    conn.execute(
+        "CREATE TABLE user_attachments (user_id INTEGER, custom_weapon_name TEXT, mode TEXT, "
+        "status TEXT, like_count INTEGER)"
+    )
+    conn.executemany("INSERT INTO user_attachments VALUES (?, ?, ?, ?, ?)", _rows(rows, rng))
+    conn.commit()
+    return conn
+
+
+def full_counts(conn: sqlite3.Connection):
+    """نتیجه کامل دو GROUP BY (بدون LIMIT) - همان کار reconcile_rankings"""
+    by_mode = {mode: Counter() for mode in MODES}
+    for weapon, mode, count in conn.execute(WEAPONS_QUERY.replace('LIMIT ?', '')):
+        by_mode[mode][weapon] = count
+    users = Counter({user: count for user, count, _ in conn.execute(USERS_QUERY.replace('LIMIT ?', ''))})
+    return by_mode, users
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--events', type=int, default=200_000)
+    parser.add_argument('--reads', type=int, default=10_000)
+    args = parser.parse_args()
+    rng = random.Random(42)
+
+    started = time.perf_counter()
+    conn = build_table(args.rows, rng)
+    print(f"table: {args.rows:,} rows in {time.perf_counter() - started:.1f}s")
+
+    started = time.perf_counter()
+    reads = 3
+    for _ in range(reads):
+        conn.execute(WEAPONS_QUERY, (LIMIT,)).fetchall()
+        conn.execute(USERS_QUERY, (LIMIT,)).fetchall()
+    group_by_ms = (time.perf_counter() - started) * 1000 / reads
+
+    started = time.perf_counter()
+    weapon_counts, user_counts = full_counts(conn)
+    weapons = {mode: IncrementalTopK.from_counts(counts.items()) for mode, counts in weapon_counts.items()}
+    users = IncrementalTopK.from_counts(user_counts.items())
+    build_ms = (time.perf_counter() - started) * 1000
+
+    # رویدادها: approve اتچمنت جدید و (کمتر) reject اتچمنت approve شده
+    events = []
+    for _ in range(args.events):
+        user = int(rng.paretovariate(1.2) * 10) % USERS
+        weapon, mode = f"W{rng.randrange(WEAPONS)}", rng.choice(MODES)
+        if rng.random() < 0.9:
+            delta = 1
+        elif user_counts[user] > 0 and weapon_counts[mode][weapon] > 0:
+            delta = -1
+        else:
+            continue
+        user_counts[user] += delta
+        weapon_counts[mode][weapon] += delta
+        events.append((user, weapon, mode, delta))
+
+    started = time.perf_counter()
+    for user, weapon, mode, delta in events:
+        weapons[mode].add(weapon, delta)
+        users.add(user, delta)
+    event_ns = (time.perf_counter() - started) * 1e9 / len(events)
+
+    started = time.perf_counter()
+    for _ in range(args.reads):
+        for topk in weapons.values():
+            topk.top(LIMIT)
+        users.top(LIMIT)
+    read_us = (time.perf_counter() - started) * 1e6 / args.reads
+
+    print(f"{'group_by':<12}{group_by_ms:>12,.1f} ms/read")
+    print(f"{'build':<12}{build_ms:>12,.1f} ms")
+    print(f"{'event':<12}{event_ns:>12,.0f} ns/event")
+    print(f"{'read':<12}{read_us:>12,.1f} µs/read  ({group_by_ms * 1000 / read_us:,.0f}x)")
+
+    # درستی: امتیازهای top با شمارش کامل مستقل یکی هستند (ترتیب item های هم‌امتیاز آزاد است)
+    checks = [(weapons[mode], weapon_counts[mode]) for mode in MODES] + [(users, user_counts)]
+    matches = all(
+        [score for _, score in topk.top(LIMIT)] == [score for _, score in counts.most_common(LIMIT)]
+        and all(counts[item] == score for item, score in topk.top(LIMIT))
+        for topk, counts in checks
+    )
+    print(f"ranking matches full count: {matches} (rebuilds after reject: {users.rebuilds - 1})")
+
+
+if __name__ == '__main__':
+    main()
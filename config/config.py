@@ -116,7 +116,7 @@ def build_category_keyboard(categories_dict: dict, callback_prefix: str, show_co
                 counts = cached_counts
             else:
                 counts = db.get_all_category_counts()
-                cache.set(cache_key, counts, ttl=1800)
+                cache.set(cache_key, counts, ttl=1800, tags=(cache_key,))
         except Exception:
             # در صورت خطا در کش، مستقیم از دیتابیس می‌گیریم
             counts = db.get_all_category_counts()
@@ -43,8 +43,24 @@ CACHE_TTL_CHANNEL_MEMBER = 1800  # 30 minutes (for members)
 CACHE_TTL_CHANNEL_NON_MEMBER = 120  # 2 minutes (for non-members)
 CACHE_TTL_CATEGORY_COUNTS = 1800  # 30 minutes
 
-# Cache Limits
+# Cache Limits (applied to the 'default' cache region by BotApplicationFactory)
 CACHE_MAX_SIZE = 10000  # Maximum cache entries (LRU eviction)
+CACHE_MAX_BYTES = 64 * 1024 * 1024  # 64 MB - estimated deep size of cached values
+CACHE_EVICTION_POLICY = 'lru'  # lru / lfu / tinylfu
+
+# Cache Warm Up (startup replay of the hottest cached calls)
+CACHE_WARMUP_FILE = 'data/cache_hot_keys.json'
+CACHE_WARMUP_MAX_KEYS = 500
+CACHE_WARMUP_WORKERS = 8
+CACHE_WARMUP_TIME_BUDGET = 20.0  # seconds
+CACHE_HOT_KEYS_SAVE_INTERVAL = 300  # 5 minutes
+
+# Cache Snapshot (on-disk copy of cached entries, enabled with CACHE_SNAPSHOT_ENABLED=true)
+CACHE_SNAPSHOT_FILE = 'data/cache_snapshot.bin'
+CACHE_SNAPSHOT_INTERVAL = 600  # 10 minutes
+
+# User Attachments stats and rankings (updated incrementally, recomputed in the background by UARefresher)
+UA_STATS_RECONCILE_INTERVAL = 900  # 15 minutes
 
 # ====================================
 # Performance Thresholds
@@ -1,5 +1,6 @@
 """Cache management modules"""
 
 from .cache_manager import CacheManager, cache_cleanup_task
+from .engine import CacheEngine, get_engine
 
-__all__ = ['CacheManager', 'cache_cleanup_task']
+__all__ = ['CacheManager', 'CacheEngine', 'cache_cleanup_task', 'get_engine']
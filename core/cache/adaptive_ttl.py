@@ -0,0 +1,130 @@
+"""
+یادگیری TTL برای هر data type
+
+TTL_CONFIG در SmartCacheManager برای هر data type یک عدد ثابت است، چه داده
+هر دقیقه عوض شود و چه هفته‌ها دست نخورد. AdaptiveTTL در هر دوره (پنجره)
+تعداد invalidation و hit/miss هر data type را بررسی می‌کند:
+
+- اگر در پنجره invalidation ای نبود ولی miss داشتیم (entry ها فقط به خاطر
+  انقضا از بین رفته‌اند)، TTL با ضریب GROWTH بزرگ می‌شود
+- اگر invalidation داشتیم، فاصله متوسط بین تغییرات تخمین زده می‌شود و TTL
+  حداکثر با ضریب SHRINK به سمت آن کوچک می‌شود (داده پرتغییر نباید طولانی‌تر
+  از فاصله تغییراتش cache شود، مخصوصاً برای تغییراتی که invalidate نمی‌شوند)
+- اگر ترافیکی نبود TTL تغییر نمی‌کند
+
+TTL همیشه داخل بازه [min, max] تنظیم شده برای آن data type می‌ماند.
+"""
+
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+
+class _TypeState:
+    """وضعیت یادگیری یک data type"""
+
+    __slots__ = ('ttl', 'window_start', 'hits', 'misses', 'invalidations',
+                 'hit_rate', 'change_interval', 'adjustments')
+
+    def __init__(self, ttl: float, now: float):
+        self.ttl = ttl
+        self.window_start = now
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.hit_rate: Optional[float] = None
+        self.change_interval: Optional[float] = None
+        self.adjustments = 0
+
+
+class AdaptiveTTL:
+    """
+    TTL یادگرفته شده به ازای هر data type
+
+    Args:
+        base: TTL اولیه هر data type (معمولاً TTL_CONFIG)
+        bounds: بازه (min, max) هر data type؛ data type های بدون بازه تطبیق داده نمی‌شوند
+    """
+
+    GROWTH = 1.5
+    SHRINK = 0.5
+
+    def __init__(self, base: Dict[str, int], bounds: Dict[str, Tuple[int, int]]):
+        self._base = dict(base)
+        self._bounds = dict(bounds)
+        self._lock = threading.Lock()
+        now = time.monotonic()
+        self._states: Dict[str, _TypeState] = {
+            data_type: _TypeState(self._clamp(data_type, self._base.get(data_type, self._base['default'])), now)
+            for data_type in self._bounds
+        }
+
+    def _clamp(self, data_type: str, ttl: float) -> float:
+        low, high = self._bounds[data_type]
+        return min(max(ttl, low), high)
+
+    def ttl(self, data_type: str) -> int:
+        """TTL فعلی data type (برای data type های بدون بازه همان TTL پایه)"""
+        state = self._states.get(data_type)
+        if state is None:
+            return self._base.get(data_type, self._base['default'])
+        return int(state.ttl)
+
+    def observe(self, data_type: str, counts: Dict[str, int], now: Optional[float] = None) -> Optional[int]:
+        """
+        بستن پنجره فعلی data type با شمارنده‌های تجمعی region آن و تنظیم TTL
+
+        Args:
+            counts: شمارنده‌های تجمعی (hits / misses / invalidations) - اختلاف با
+                مقدار قبلی، فعالیت این پنجره است
+
+        Returns:
+            TTL جدید یا None اگر data type تطبیقی نیست
+        """
+        state = self._states.get(data_type)
+        if state is None:
+            return None
+        now = time.monotonic() if now is None else now
+
+        with self._lock:
+            hits = counts.get('hits', 0) - state.hits
+            misses = counts.get('misses', 0) - state.misses
+            invalidations = counts.get('invalidations', 0) - state.invalidations
+            elapsed = now - state.window_start
+            state.hits += hits
+            state.misses += misses
+            state.invalidations += invalidations
+            state.window_start = now
+
+            if hits + misses:
+                state.hit_rate = hits / (hits + misses) * 100
+
+            ttl = state.ttl
+            if invalidations > 0:
+                state.change_interval = elapsed / invalidations
+                if state.change_interval < ttl:
+                    ttl = max(ttl * self.SHRINK, state.change_interval)
+            elif misses > 0:
+                ttl = ttl * self.GROWTH
+
+            ttl = self._clamp(data_type, ttl)
+            if ttl != state.ttl:
+                state.ttl = ttl
+                state.adjustments += 1
+            return int(ttl)
+
+    def get_stats(self) -> Dict[str, Dict[str, Optional[float]]]:
+        """TTL یادگرفته شده و ورودی‌های آن برای هر data type"""
+        with self._lock:
+            return {
+                data_type: {
+                    'ttl': int(state.ttl),
+                    'base_ttl': self._base.get(data_type, self._base['default']),
+                    'min_ttl': self._bounds[data_type][0],
+                    'max_ttl': self._bounds[data_type][1],
+                    'hit_rate': None if state.hit_rate is None else round(state.hit_rate, 1),
+                    'change_interval': None if state.change_interval is None else round(state.change_interval, 1),
+                    'adjustments': state.adjustments,
+                }
+                for data_type, state in self._states.items()
+            }
@@ -0,0 +1,671 @@
+"""
+backend های L2 پشت region های CacheManager
+
+region های l2=True در REGIONS روی miss قبل از اجرای تابع در backend جستجو
+می‌کنند و هر set را به آن هم می‌نویسند (write-through)؛ موتور invalidation های
+همین region ها و عملیات کل موتور را با on_invalidate روی backend اعمال می‌کند
+(region های بدون l2 مثل 'ua' به backend نمی‌رسند). هر backend رابط
+CacheBackend را پیاده می‌کند:
+
+    get / mget       (value, ttl باقیمانده, grace باقیمانده, tags) یا None
+    set / mset       نوشتن با TTL، grace و tag ها
+    delete           حذف یک key
+    invalidate_tag   حذف entry های یک tag (namespace ها هم tag هستند)
+    clear            حذف entry های یک region یا همه
+
+پیاده‌سازی‌ها:
+
+- MemoryBackend: dict داخل همین process (برای تست و اجرای تک process)
+- SharedL2 (core.cache.shared_l2): حافظه مشترک بین process های یک سرور
+- RedisBackend: سرور Redis یا هر سرور سازگار با پروتکل RESP، برای به اشتراک
+  گذاشتن داده بین چند سرور. client پروتکل در همین ماژول است (وابستگی جدید
+  ندارد) و core.cache.fake_redis یک سرور RESP محلی برای تست دارد.
+
+backend با CACHE_BACKEND انتخاب می‌شود (backend_from_env). L1 هر سرور همچنان
+محلی است؛ برای invalidate شدن L1 سرورهای دیگر InvalidationBus با transport
+postgres لازم است.
+
+⚠️ مقادیر با pickle سریال می‌شوند؛ سرور Redis فقط باید در دسترس خود bot باشد
+"""
+
+import hashlib
+import os
+import socket
+import threading
+import time
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Sequence, Tuple
+from urllib.parse import unquote, urlparse
+
+from utils.logger import get_logger
+from .serialization import dumps, loads
+
+logger = get_logger('cache', 'cache.log')
+
+# (value, ttl باقیمانده, grace باقیمانده, tags)
+BackendHit = Tuple[Any, float, float, Tuple[str, ...]]
+# (key, value, ttl, grace, tags)
+BackendItem = Tuple[Hashable, Any, float, float, Tuple[str, ...]]
+
+
+class CacheBackend:
+    """
+    رابط backend های L2
+
+    mget و mset پیش‌فرض get و set را تکرار می‌کنند؛ backend های شبکه‌ای آنها را
+    با یک رفت و برگشت پیاده می‌کنند.
+    """
+
+    name = 'backend'
+    # process هایی که همین داده را می‌بینند: 'process' / 'host' / 'global'
+    scope = 'process'
+
+    def get(self, region: str, key: Hashable) -> Optional[BackendHit]:
+        raise NotImplementedError
+
+    def mget(self, region: str, keys: Sequence[Hashable]) -> List[Optional[BackendHit]]:
+        return [self.get(region, key) for key in keys]
+
+    def set(self, region: str, key: Hashable, value: Any, ttl: float, grace: float = 0,
+            tags: Tuple[str, ...] = ()) -> bool:
+        raise NotImplementedError
+
+    def mset(self, region: str, items: Iterable[BackendItem]) -> int:
+        """
+        Returns:
+            تعداد entry های ذخیره شده
+        """
+        return sum(1 for key, value, ttl, grace, tags in items if self.set(region, key, value, ttl, grace, tags))
+
+    def delete(self, region: str, key: Hashable) -> bool:
+        raise NotImplementedError
+
+    def invalidate_tag(self, tag: str) -> int:
+        raise NotImplementedError
+
+    def clear(self, region: Optional[str] = None) -> int:
+        raise NotImplementedError
+
+    def shared_with(self, host: str) -> bool:
+        """
+        آیا process ای روی host به همین backend وصل است؟
+
+        invalidation دریافتی از bus که فرستنده‌اش همین backend را دارد قبلاً
+        اینجا اعمال شده و دوباره اجرا نمی‌شود.
+        """
+        if self.scope == 'global':
+            return True
+        return self.scope == 'host' and host == socket.gethostname()
+
+    @staticmethod
+    def actions_for(kind: str, value: Any, region: Optional[str]) -> List[tuple]:
+        """
+        عملیات backend برای یک invalidation موتور: ('tag', tag) / ('key', region, key) / ('clear', region)
+
+        tag و namespace و pattern هم‌نام یک عملیات می‌شوند تا موتور بتواند
+        عملیات تکراری یک رویداد را حذف کند.
+        """
+        if kind in ('tag', 'pattern'):
+            # key ها در backend قابل جستجوی substring نیستند؛ pattern های
+            # invalidate_cache_on_write نام تابع هستند و entry ها زیر نام تابع tag
+            # شده‌اند، پس pattern روی tag set های خود backend resolve می‌شود.
+            # pattern ای که tag نباشد در backend اثری ندارد (TTL آن را پاک می‌کند)
+            return [('tag', value)]
+        if kind == 'namespace':
+            # entry ها زیر namespace هایشان هم tag شده‌اند
+            return [('tag', namespace) for namespace in value]
+        if kind == 'key':
+            return [('key', region, value)]
+        if kind == 'clear':
+            return [('clear', region)]
+        return []
+
+    def apply_actions(self, actions: Iterable[tuple]):
+        """اجرای عملیات actions_for"""
+        for action in actions:
+            if action[0] == 'tag':
+                self.invalidate_tag(action[1])
+            elif action[0] == 'key':
+                self.delete(action[1], action[2])
+            elif action[0] == 'clear':
+                self.clear(action[1])
+
+    def on_invalidate(self, kind: str, value: Any, region: Optional[str]):
+        """اعمال یک invalidation موتور cache روی backend"""
+        self.apply_actions(self.actions_for(kind, value, region))
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {'name': self.name}
+
+    def close(self):
+        pass
+
+
+class MemoryBackend(CacheBackend):
+    """backend داخل process (مقادیر بدون سریال شدن نگه داشته می‌شوند)"""
+
+    name = 'memory'
+    # هر چند set یک بار entry های منقضی و عضویت tag های یتیم حذف می‌شوند
+    PURGE_EVERY = 1024
+
+    def __init__(self):
+        # (region, key) -> (value, expiry, stale_until, tags)
+        self._entries: Dict[Tuple[str, Hashable], Tuple[Any, float, float, Tuple[str, ...]]] = {}
+        self._tags: Dict[str, set] = {}
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'sets': 0, 'invalidated': 0}
+
+    def get(self, region: str, key: Hashable) -> Optional[BackendHit]:
+        found = self._entries.get((region, key))
+        now = time.monotonic()
+        if found is None or found[2] <= now:
+            self._stats['misses'] += 1
+            return None
+        value, expiry, stale_until, tags = found
+        self._stats['hits'] += 1
+        return value, expiry - now, stale_until - expiry, tags
+
+    def set(self, region: str, key: Hashable, value: Any, ttl: float, grace: float = 0,
+            tags: Tuple[str, ...] = ()) -> bool:
+        expiry = time.monotonic() + ttl
+        tags = tuple(tags)
+        with self._lock:
+            self._entries[(region, key)] = (value, expiry, expiry + grace, tags)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add((region, key))
+            self._stats['sets'] += 1
+            if self._stats['sets'] % self.PURGE_EVERY == 0:
+                self._purge_locked()
+        return True
+
+    def _purge_locked(self):
+        now = time.monotonic()
+        for member in [member for member, found in self._entries.items() if found[2] <= now]:
+            del self._entries[member]
+        for tag in list(self._tags):
+            members = self._tags[tag]
+            members.intersection_update(self._entries)
+            if not members:
+                del self._tags[tag]
+
+    def delete(self, region: str, key: Hashable) -> bool:
+        with self._lock:
+            removed = self._entries.pop((region, key), None) is not None
+        self._stats['invalidated'] += removed
+        return removed
+
+    def invalidate_tag(self, tag: str) -> int:
+        with self._lock:
+            removed = sum(1 for member in self._tags.pop(tag, ()) if self._entries.pop(member, None) is not None)
+        self._stats['invalidated'] += removed
+        return removed
+
+    def clear(self, region: Optional[str] = None) -> int:
+        with self._lock:
+            if region is None:
+                removed = len(self._entries)
+                self._entries.clear()
+                self._tags.clear()
+            else:
+                members = [member for member in self._entries if member[0] == region]
+                for member in members:
+                    del self._entries[member]
+                removed = len(members)
+        self._stats['invalidated'] += removed
+        return removed
+
+    def get_stats(self) -> Dict[str, Any]:
+        return dict(self._stats, name=self.name, entries=len(self._entries), tags=len(self._tags))
+
+
+# ---- پروتکل RESP ----
+
+class RespError(Exception):
+    """پاسخ خطای سرور (-ERR ...)"""
+
+
+def encode_command(args: Sequence[Any]) -> bytes:
+    """سریال کردن یک دستور به صورت آرایه‌ای از bulk string ها"""
+    parts = [b'*%d\r\n' % len(args)]
+    for arg in args:
+        if isinstance(arg, str):
+            arg = arg.encode('utf-8')
+        elif not isinstance(arg, (bytes, bytearray, memoryview)):
+            arg = str(arg).encode('ascii')
+        parts.append(b'$%d\r\n' % len(arg))
+        parts.append(bytes(arg))
+        parts.append(b'\r\n')
+    return b''.join(parts)
+
+
+def read_reply(stream) -> Any:
+    """
+    خواندن یک پاسخ RESP از stream (فایل باینری)
+
+    خطاها به صورت RespError برگردانده می‌شوند (raise نمی‌شوند) تا پاسخ بقیه
+    دستورات pipeline خوانده شود.
+    """
+    line = stream.readline()
+    if not line.endswith(b'\r\n'):
+        raise ConnectionError("Connection closed by cache server")
+    prefix, rest = line[:1], line[1:-2]
+    if prefix == b'+':
+        return rest.decode('utf-8')
+    if prefix == b'-':
+        return RespError(rest.decode('utf-8', 'replace'))
+    if prefix == b':':
+        return int(rest)
+    if prefix == b'$':
+        length = int(rest)
+        if length < 0:
+            return None
+        data = stream.read(length + 2)
+        if len(data) != length + 2:
+            raise ConnectionError("Connection closed by cache server")
+        return data[:-2]
+    if prefix == b'*':
+        length = int(rest)
+        if length < 0:
+            return None
+        return [read_reply(stream) for _ in range(length)]
+    raise ConnectionError(f"Invalid RESP reply {line[:32]!r}")
+
+
+class RespClient:
+    """
+    client حداقلی RESP با یک اتصال (درخواست‌ها با lock سریالی می‌شوند)
+
+    pipeline همه دستورات را با یک sendall می‌فرستد و پاسخ‌ها را به همان ترتیب
+    می‌خواند. هر خطای شبکه اتصال را می‌بندد؛ درخواست بعدی دوباره وصل می‌شود.
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 6379, db: int = 0,
+                 password: Optional[str] = None, username: Optional[str] = None, timeout: float = 0.25):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.password = password
+        self.username = username
+        self.timeout = timeout
+        self._sock: Optional[socket.socket] = None
+        self._stream = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_url(cls, url: str, timeout: float = 0.25) -> 'RespClient':
+        """redis://[[user]:password@]host[:port][/db]"""
+        parsed = urlparse(url)
+        if parsed.scheme != 'redis':
+            raise ValueError(f"Unsupported cache server URL scheme '{parsed.scheme}'")
+        db = parsed.path.lstrip('/')
+        return cls(
+            parsed.hostname or '127.0.0.1',
+            parsed.port or 6379,
+            int(db) if db else 0,
+            unquote(parsed.password) if parsed.password else None,
+            unquote(parsed.username) if parsed.username else None,
+            timeout,
+        )
+
+    def _connect_locked(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._sock = sock
+        self._stream = sock.makefile('rb')
+        setup = []
+        if self.password:
+            setup.append(('AUTH', self.username, self.password) if self.username else ('AUTH', self.password))
+        if self.db:
+            setup.append(('SELECT', self.db))
+        for reply in self._round_trip_locked(setup):
+            if isinstance(reply, RespError):
+                self._close_locked()
+                raise reply
+
+    def _round_trip_locked(self, commands: Sequence[Sequence[Any]]) -> List[Any]:
+        if not commands:
+            return []
+        self._sock.sendall(b''.join(encode_command(command) for command in commands))
+        return [read_reply(self._stream) for _ in commands]
+
+    def pipeline(self, commands: Sequence[Sequence[Any]]) -> List[Any]:
+        """
+        اجرای چند دستور با یک رفت و برگشت
+
+        Returns:
+            پاسخ هر دستور (خطاهای سرور به صورت RespError)
+
+        Raises:
+            OSError / ConnectionError در صورت قطع اتصال
+        """
+        with self._lock:
+            try:
+                if self._sock is None:
+                    self._connect_locked()
+                return self._round_trip_locked(commands)
+            except (OSError, ValueError):
+                # ValueError: پاسخ نامعتبر - وضعیت stream دیگر قابل اعتماد نیست
+                self._close_locked()
+                raise
+
+    def execute(self, *args) -> Any:
+        reply = self.pipeline([args])[0]
+        if isinstance(reply, RespError):
+            raise reply
+        return reply
+
+    def _close_locked(self):
+        if self._sock is not None:
+            try:
+                self._stream.close()
+                self._sock.close()
+            except OSError:
+                pass
+        self._sock = self._stream = None
+
+    def close(self):
+        with self._lock:
+            self._close_locked()
+
+
+class RedisBackend(CacheBackend):
+    """
+    backend روی سرور RESP
+
+    ساختار key ها:
+
+        {prefix}{region}:{blake2b(key سریال شده)}   مقدار: (value, tags, expiry, stale_until)
+        {prefix}#{tag}                              sorted set: key entry -> زمان انقضای آن (ms)
+
+    entry ها با PX به اندازه ttl + grace منقضی می‌شوند. هر نوشتن عضوهای منقضی
+    tag های خودش را با ZREMRANGEBYSCORE حذف می‌کند، پس اندازه set یک tag پرکاربرد
+    به تعداد entry های زنده آن محدود است؛ entry بازنویسی شده فقط امتیازش عوض
+    می‌شود و entry حذف شده با رسیدن زمانش از set بیرون می‌رود. TTL خود set با
+    PEXPIRE NX / GT برابر طولانی‌ترین عمر عضوهایش می‌ماند و بعد از آن تمدید
+    نمی‌شود (Redis 7 یا بالاتر).
+
+    خطای شبکه هیچوقت به caller نمی‌رسد: خواندن miss و نوشتن نادیده حساب می‌شود
+    و تا RETRY_AFTER ثانیه درخواستی ارسال نمی‌شود. invalidation هایی که ارسال
+    نشده‌اند نگه داشته و قبل از اولین درخواست بعد از وصل شدن دوباره اعمال
+    می‌شوند تا entry های نامعتبر بعد از قطعی سرو نشوند.
+
+    Args:
+        url: آدرس سرور (redis://host:port/db)
+        prefix: پیشوند همه key ها (چند bot می‌توانند یک سرور را به اشتراک بگذارند)
+        timeout: timeout اتصال و هر درخواست (ثانیه) - miss های L1 منتظر آن می‌مانند
+    """
+
+    name = 'redis'
+    scope = 'global'
+    RETRY_AFTER = 5.0
+    SCAN_COUNT = 500
+
+    def __init__(self, url: str = 'redis://127.0.0.1:6379/0', prefix: str = 'codm:', timeout: float = 0.25):
+        self.url = url
+        self.prefix = prefix
+        self.client = RespClient.from_url(url, timeout)
+        self._down_until = 0.0
+        # invalidation های ارسال نشده به ترتیب ثبت: ('tag', tag) / ('clear', region) / ('key', redis_key)
+        self._pending: Dict[Tuple[str, Any], None] = {}
+        self._pending_lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'sets': 0, 'invalidated': 0, 'round_trips': 0,
+                       'errors': 0, 'unserializable': 0}
+
+    # ---- key ها ----
+
+    def _key(self, region: str, key: Hashable) -> Optional[str]:
+        try:
+            key_blob = dumps(key)
+        except Exception:
+            self._stats['unserializable'] += 1
+            return None
+        return f"{self.prefix}{region}:{hashlib.blake2b(key_blob, digest_size=16).hexdigest()}"
+
+    def _tag_key(self, tag: str) -> str:
+        return f"{self.prefix}#{tag}"
+
+    # ---- ارتباط با سرور ----
+
+    def _ready(self) -> bool:
+        """False در بازه RETRY_AFTER بعد از خطا یا اگر invalidation های معوق اعمال نشوند"""
+        if self._down_until and time.monotonic() < self._down_until:
+            return False
+        return not self._pending or self._flush_pending()
+
+    def _call(self, commands: Sequence[Sequence[Any]]) -> Optional[List[Any]]:
+        """اجرای pipeline؛ None اگر سرور در دسترس نباشد"""
+        return self._send(commands) if self._ready() else None
+
+    def _send(self, commands: Sequence[Sequence[Any]]) -> Optional[List[Any]]:
+        try:
+            replies = self.client.pipeline(commands)
+        except (OSError, ValueError) as e:
+            self._stats['errors'] += 1
+            if not self._down_until:
+                logger.warning(f"Cache server {self.client.host}:{self.client.port} unavailable: {e}")
+            self._down_until = time.monotonic() + self.RETRY_AFTER
+            return None
+        self._stats['round_trips'] += 1
+        if self._down_until:
+            logger.info(f"Cache server {self.client.host}:{self.client.port} reachable again")
+            self._down_until = 0.0
+        for reply in replies:
+            if isinstance(reply, RespError):
+                self._stats['errors'] += 1
+                logger.error(f"Cache server error: {reply}")
+                break
+        return replies
+
+    def _flush_pending(self) -> bool:
+        with self._pending_lock:
+            pending = list(self._pending)
+            self._pending.clear()
+        for index, (kind, value) in enumerate(pending):
+            if kind == 'tag':
+                ok = self._invalidate_tag_now(value) is not None
+            elif kind == 'clear':
+                ok = self._clear_now(value) is not None
+            else:
+                ok = self._send([('DEL', value)]) is not None
+            if not ok:
+                self._defer(pending[index:])
+                return False
+        if pending:
+            logger.info(f"Replayed {len(pending)} cache invalidations after server outage")
+        return True
+
+    def _defer(self, operations: Iterable[Tuple[str, Any]]):
+        with self._pending_lock:
+            for operation in operations:
+                self._pending[operation] = None
+
+    # ---- خواندن ----
+
+    def _decode(self, blob: Optional[bytes], now: float) -> Optional[BackendHit]:
+        if blob is None:
+            return None
+        try:
+            value, tags, expiry, stale_until = loads(blob)
+        except Exception:
+            return None
+        if stale_until <= now:
+            return None
+        return value, expiry - now, stale_until - expiry, tags
+
+    def get(self, region: str, key: Hashable) -> Optional[BackendHit]:
+        return self.mget(region, (key,))[0]
+
+    def mget(self, region: str, keys: Sequence[Hashable]) -> List[Optional[BackendHit]]:
+        """همه key ها با یک MGET"""
+        redis_keys = [self._key(region, key) for key in keys]
+        lookup = [redis_key for redis_key in redis_keys if redis_key is not None]
+        replies = self._call([['MGET'] + lookup]) if lookup else None
+        blobs = iter(replies[0]) if replies and isinstance(replies[0], list) else None
+        now = time.time()
+        results: List[Optional[BackendHit]] = []
+        for redis_key in redis_keys:
+            hit = self._decode(next(blobs), now) if blobs is not None and redis_key is not None else None
+            self._stats['hits' if hit is not None else 'misses'] += 1
+            results.append(hit)
+        return results
+
+    # ---- نوشتن ----
+
+    def _set_commands(self, region: str, key: Hashable, value: Any, ttl: float, grace: float,
+                      tags: Tuple[str, ...], now: float) -> Optional[List[Tuple[Any, ...]]]:
+        redis_key = self._key(region, key)
+        if redis_key is None:
+            return None
+        tags = tuple(tags)
+        try:
+            blob = dumps((value, tags, now + ttl, now + ttl + grace))
+        except Exception:
+            self._stats['unserializable'] += 1
+            return None
+        lifetime = max(1, int((ttl + grace) * 1000))
+        now_ms = int(now * 1000)
+        commands = [('SET', redis_key, blob, 'PX', lifetime)]
+        for tag in tags:
+            tag_key = self._tag_key(tag)
+            commands.extend((
+                ('ZADD', tag_key, now_ms + lifetime, redis_key),
+                ('ZREMRANGEBYSCORE', tag_key, '-inf', now_ms),
+                # set جدید TTL ندارد (NX)؛ set موجود فقط تا عمر این entry تمدید می‌شود (GT)
+                ('PEXPIRE', tag_key, lifetime, 'NX'),
+                ('PEXPIRE', tag_key, lifetime, 'GT'),
+            ))
+        return commands
+
+    def set(self, region: str, key: Hashable, value: Any, ttl: float, grace: float = 0,
+            tags: Tuple[str, ...] = ()) -> bool:
+        return self.mset(region, ((key, value, ttl, grace, tags),)) == 1
+
+    def mset(self, region: str, items: Iterable[BackendItem]) -> int:
+        """همه entry ها (SET با PX و عضویت tag ها) در یک pipeline"""
+        now = time.time()
+        commands = []
+        stored = 0
+        for key, value, ttl, grace, tags in items:
+            entry_commands = self._set_commands(region, key, value, ttl, grace, tags, now)
+            if entry_commands is not None:
+                commands.extend(entry_commands)
+                stored += 1
+        if not commands or self._call(commands) is None:
+            return 0
+        self._stats['sets'] += stored
+        return stored
+
+    # ---- invalidation ----
+
+    def delete(self, region: str, key: Hashable) -> bool:
+        redis_key = self._key(region, key)
+        if redis_key is None:
+            return False
+        replies = self._call([('DEL', redis_key)])
+        if replies is None:
+            self._defer([('key', redis_key)])
+            return False
+        removed = replies[0] == 1
+        self._stats['invalidated'] += removed
+        return removed
+
+    def _invalidate_tag_now(self, tag: str) -> Optional[int]:
+        tag_key = self._tag_key(tag)
+        # خواندن و حذف set در یک تراکنش تا key هایی که همزمان اضافه می‌شوند گم نشوند
+        now_ms = int(time.time() * 1000)
+        replies = self._send([('MULTI',), ('ZRANGEBYSCORE', tag_key, now_ms, '+inf'), ('DEL', tag_key), ('EXEC',)])
+        if replies is None or not isinstance(replies[3], list) or not isinstance(replies[3][0], list):
+            return None
+        members = replies[3][0]
+        if not members:
+            return 0
+        replies = self._send([['DEL'] + list(members)])
+        if replies is None:
+            return None
+        self._stats['invalidated'] += replies[0]
+        return replies[0]
+
+    def invalidate_tag(self, tag: str) -> int:
+        removed = self._invalidate_tag_now(tag) if self._ready() else None
+        if removed is None:
+            self._defer([('tag', tag)])
+            return 0
+        return removed
+
+    def _clear_now(self, region: Optional[str]) -> Optional[int]:
+        pattern = f"{self.prefix}{region}:*" if region is not None else f"{self.prefix}*"
+        cursor = b'0'
+        removed = 0
+        while True:
+            replies = self._send([('SCAN', cursor, 'MATCH', pattern, 'COUNT', self.SCAN_COUNT)])
+            if replies is None or not isinstance(replies[0], list):
+                return None
+            cursor, keys = replies[0]
+            if keys:
+                replies = self._send([['DEL'] + list(keys)])
+                if replies is None:
+                    return None
+                removed += replies[0]
+            if cursor in (b'0', '0'):
+                break
+        self._stats['invalidated'] += removed
+        return removed
+
+    def clear(self, region: Optional[str] = None) -> int:
+        removed = self._clear_now(region) if self._ready() else None
+        if removed is None:
+            self._defer([('clear', region)])
+            return 0
+        return removed
+
+    def get_stats(self) -> Dict[str, Any]:
+        return dict(
+            self._stats, name=self.name, server=f"{self.client.host}:{self.client.port}",
+            available=not self._down_until, pending_invalidations=len(self._pending),
+        )
+
+    def close(self):
+        self.client.close()
+
+
+def backend_from_env() -> Optional[CacheBackend]:
+    """
+    backend بر اساس CACHE_BACKEND (redis / shared / memory / خالی = غیرفعال)
+
+    redis از CACHE_REDIS_URL و CACHE_REDIS_PREFIX و shared از CACHE_L2_NAME /
+    CACHE_L2_SLOTS / CACHE_L2_SLOT_BYTES استفاده می‌کند.
+    """
+    kind = os.getenv('CACHE_BACKEND', '').lower()
+    if kind == 'redis':
+        return RedisBackend(
+            os.getenv('CACHE_REDIS_URL', 'redis://127.0.0.1:6379/0'),
+            os.getenv('CACHE_REDIS_PREFIX', 'codm:'),
+            float(os.getenv('CACHE_REDIS_TIMEOUT', '0.25')),
+        )
+    if kind == 'shared':
+        from .shared_l2 import SharedL2
+
+        return SharedL2(
+            os.getenv('CACHE_L2_NAME', 'codm_cache_l2'),
+            int(os.getenv('CACHE_L2_SLOTS', '4096')),
+            int(os.getenv('CACHE_L2_SLOT_BYTES', str(16 * 1024))),
+        )
+    if kind == 'memory':
+        return MemoryBackend()
+    return None
+
+
+def attach_backend(backend: Optional[CacheBackend] = None, engine=None) -> Optional[CacheBackend]:
+    """
+    فعال کردن backend برای region های l2=True موتور cache
+
+    Returns:
+        backend متصل شده (None اگر CACHE_BACKEND تنظیم نشده باشد)
+    """
+    from .engine import get_engine
+
+    backend = backend or backend_from_env()
+    if backend is None:
+        return None
+    (engine or get_engine()).attach_l2(backend)
+    logger.info(f"Cache backend attached: {backend.name}")
+    return backend
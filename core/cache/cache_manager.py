@@ -4,26 +4,105 @@
 """
 
 import time
-from typing import Any, Optional, Dict, Callable
+import asyncio
+import inspect
+import logging
+from typing import Any, Optional, Dict, Callable, Hashable, Iterable, List, Tuple
 from functools import wraps
 import threading
+from collections import OrderedDict
+from itertools import islice
 from utils.logger import get_logger
 from utils.metrics import get_metrics, log_cache_access
+from .tag_index import TagIndex
+from .eviction import EvictionPolicy, get_policy
+from .sizing import estimate_size
+from .expiry import ExpiryHeap
+from .single_flight import SingleFlight, AsyncSingleFlight
+from .revalidate import BackgroundRefresher
+from .negative import NEGATIVE
+from .keys import make_key as make_call_key, render_key
+from .counters import StripedCounters
+from .engine import get_engine
+from .namespaces import as_namespaces
+from .dependencies import ATTACHMENT_NAMESPACE, DB_NAMESPACE, get_dependency_graph
+from .warming import function_id, get_tracker, register_function
 
 logger = get_logger('cache', 'cache.log')
 
+# اندیس شمارنده‌های per-thread در CacheManager
+HITS, MISSES, STALE_HITS, NEGATIVE_HITS, NEGATIVE_SETS, INVALIDATIONS, L2_HITS = range(7)
+_COUNTER_NAMES = ('hits', 'misses', 'stale_hits', 'negative_hits', 'negative_sets', 'invalidations', 'l2_hits')
+
+
+def _accepts_count(func: Callable) -> bool:
+    try:
+        return 'count' in inspect.signature(func).parameters
+    except (TypeError, ValueError):
+        return False
+
+
+# log_cache_access(hit, count=n) یک فراخوانی به ازای هر flush؛ بدون پارامتر count
+# حداکثر METRICS_FLUSH_MAX فراخوانی در هر flush و باقیمانده به flush بعدی می‌رود
+_BULK_CACHE_ACCESS = _accepts_count(log_cache_access)
+METRICS_FLUSH_MAX = 1000
+
 
 class CacheEntry:
-    """یک entry در cache با TTL"""
+    """
+    یک entry در cache با TTL (زمان‌ها بر اساس time.monotonic)
+    
+    بعد از expiry، entry تا stale_until (expiry + grace) فقط برای حالت
+    stale-while-revalidate نگه داشته می‌شود.
+    """
+    
+    __slots__ = ('value', 'expiry', 'stale_until', 'tags', 'size', 'last_access', 'hits')
     
-    def __init__(self, value: Any, ttl: int):
+    def __init__(self, value: Any, ttl: int, tags: Tuple[str, ...] = (), size: int = 0, grace: int = 0):
         self.value = value
         # تبدیل TTL به int اگر string باشد
         ttl_int = int(ttl) if isinstance(ttl, str) else ttl
-        self.expiry = time.time() + ttl_int
+        now = time.monotonic()
+        self.expiry = now + ttl_int
+        self.stale_until = self.expiry + grace
+        self.tags = tags
+        self.size = size
+        # برای eviction policy (بدون lock به‌روز می‌شوند)
+        self.last_access = now
+        self.hits = 0
+    
+    def is_expired(self, now: Optional[float] = None) -> bool:
+        return (time.monotonic() if now is None else now) > self.expiry
+
+
+class _CacheSegment:
+    """
+    یک shard از cache با lock مستقل
+    
+    هر segment فقط key هایی را نگه می‌دارد که hash آنها به این shard می‌رسد،
+    بنابراین نوشتن روی key های نامرتبط روی یک lock منتظر نمی‌ماند.
+    """
+    
+    __slots__ = ('entries', 'tags', 'expiry', 'lock', 'bytes', 'evictions', 'rejections')
+    
+    def __init__(self):
+        # OrderedDict: move_to_end جابجایی CLOCK را بدون حذف موقت key انجام می‌دهد
+        self.entries: 'OrderedDict[Hashable, CacheEntry]' = OrderedDict()
+        self.tags = TagIndex()
+        self.expiry = ExpiryHeap()
+        self.lock = threading.Lock()
+        self.bytes = 0
+        self.evictions = 0
+        self.rejections = 0
     
-    def is_expired(self) -> bool:
-        return time.time() > self.expiry
+    def remove_locked(self, key: Hashable) -> Optional[CacheEntry]:
+        """حذف entry و tag های آن - caller باید lock را داشته باشد"""
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry.size
+            if entry.tags:
+                self.tags.discard(key, entry.tags)
+        return entry
 
 
 class CacheManager:
@@ -34,84 +113,628 @@ class CacheManager:
     - کمتر تغییر می‌کنند (مثل لیست سلاح‌ها، دسته‌بندی‌ها)
     - خواندن‌شون گران است (query به دیتابیس)
     - برای همه کاربران یکسان است
+    
+    داده‌ها در چند segment (shard) با lock مستقل نگهداری می‌شوند و segment
+    بر اساس hash کلید انتخاب می‌شود. مسیر خواندن (get) بدون lock است:
+    dict.get در CPython اتمیک است و فقط حذف entry منقضی شده lock می‌گیرد.
+    
+    هر entry می‌تواند زیر چند tag ثبت شود (نام تابع، دسته، سلاح، mode) تا
+    invalidate_tag فقط key های تحت تاثیر را حذف کند.
+    
+    حجم cache با تعداد entry و بایت محدود است (بودجه بین segment ها تقسیم
+    می‌شود) و در صورت پر شدن، eviction policy (lru / lfu / tinylfu) victim را
+    انتخاب می‌کند.
     """
     
-    def __init__(self):
-        self._cache: Dict[str, CacheEntry] = {}
-        self._lock = threading.RLock()
+    DEFAULT_SHARDS = 16
+    # پیش‌فرض تا زمان configure؛ CACHE_MAX_SIZE / CACHE_MAX_BYTES / CACHE_EVICTION_POLICY در
+    # config.constants با CacheEngine.configure_region از BotApplicationFactory اعمال می‌شوند
+    # (config خودش cache_manager را import می‌کند، پس اینجا قابل import نیست)
+    DEFAULT_MAX_ENTRIES = 10000
+    DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+    DEFAULT_POLICY = 'lru'
+    # تعداد entry هایی که برای انتخاب victim بررسی می‌شوند
+    EVICTION_SAMPLES = 5
+    # حداکثر تعداد entry منقضی که در هر بار نگه داشتن lock یک segment حذف می‌شود
+    SWEEP_BATCH = 256
+    
+    def __init__(self, shards: int = DEFAULT_SHARDS, max_entries: Optional[int] = DEFAULT_MAX_ENTRIES,
+                 max_bytes: Optional[int] = DEFAULT_MAX_BYTES, policy=DEFAULT_POLICY, name: str = 'default',
+                 l2: bool = False):
+        """
+        Args:
+            shards: تعداد segment ها
+            max_entries: حداکثر تعداد entry (None = نامحدود)
+            max_bytes: حداکثر حجم تخمینی مقادیر به بایت (None = بدون محاسبه حجم)
+            policy: نام policy (lru / lfu / tinylfu) یا یک EvictionPolicy
+            name: نام region در CacheEngine (برای آمار)
+            l2: استفاده از backend L2 (SharedL2 / RedisBackend، اگر CacheEngine.attach_l2 صدا زده شود)
+        """
+        self.name = name
+        self._shard_count = max(1, int(shards))
+        self._segments = tuple(_CacheSegment() for _ in range(self._shard_count))
+        self.configure(max_entries, max_bytes, policy)
+        # یکی کردن محاسبه همزمان یک key در decorator ها
+        self.single_flight = SingleFlight()
+        self.async_flight = AsyncSingleFlight()
+        # refresh پس‌زمینه برای حالت stale-while-revalidate
+        self.refresher = BackgroundRefresher()
+        # شمارنده‌های مسیر داغ (per-thread)؛ فقط در get_stats / flush_metrics جمع می‌شوند
+        self._counters = StripedCounters(_COUNTER_NAMES)
+        # مقادیری که تا الان به metrics مرکزی ارسال شده‌اند
+        self._flushed = {'hits': 0, 'misses': 0}
+        self._flush_lock = threading.Lock()
+        # سطح DEBUG یک بار بررسی می‌شود و در flush_metrics به‌روز می‌شود
+        # تا get/set برای log غیرفعال هیچ رشته‌ای نسازند
+        self._debug = logger.isEnabledFor(logging.DEBUG)
         # استفاده از metrics centralized به جای internal tracking
         self._metrics = get_metrics()
+        # callback(kind, value, region) برای invalidation ها - توسط CacheEngine تنظیم می‌شود
+        self.on_invalidate: Optional[Callable[[str, Any, Optional[str]], None]] = None
+        # backend L2 مشترک (core.cache.backends) - فقط در مسیر miss و set استفاده می‌شود
+        self.l2_enabled = l2
+        self.l2 = None
     
+    def configure(self, max_entries: Optional[int] = DEFAULT_MAX_ENTRIES, max_bytes: Optional[int] = DEFAULT_MAX_BYTES,
+                  policy=DEFAULT_POLICY):
+        """
+        تنظیم بودجه و eviction policy (در زمان اجرا هم قابل صدا زدن است)
+        
+        entry های موجود با set های بعدی در بودجه جدید جا می‌شوند؛ حجم entry هایی
+        که قبل از فعال شدن max_bytes ذخیره شده‌اند صفر حساب می‌شود.
+        """
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._segment_max_entries = -(-max_entries // self._shard_count) if max_entries else None
+        self._segment_max_bytes = -(-max_bytes // self._shard_count) if max_bytes else None
+        self._policy: EvictionPolicy = get_policy(policy)
+        self._track_access = self._policy.tracks_access
     
-    def get(self, key: str) -> Optional[Any]:
-        """دریافت مقدار از cache"""
-        with self._lock:
-            if key in self._cache:
-                entry = self._cache[key]
-                if not entry.is_expired():
-                    log_cache_access(hit=True)
-                    logger.debug(f"Cache HIT: {key}")
-                    return entry.value
-                else:
-                    # پاک کردن entry منقضی شده
-                    del self._cache[key]
-                    self._metrics.cache_metrics.record_eviction()
+    def _segment_for(self, key: Hashable) -> _CacheSegment:
+        """انتخاب segment مربوط به key"""
+        return self._segments[hash(key) % self._shard_count]
+    
+    def get(self, key: Hashable, remote: bool = True) -> Optional[Any]:
+        """
+        دریافت مقدار از cache
+        
+        هیچوقت منتظر lock segment نمی‌ماند؛ ولی miss در L1 با remote=True در L2
+        جستجو می‌شود (flock در SharedL2، رفت و برگشت شبکه در RedisBackend)، پس در
+        event loop باید get_async استفاده شود.
+        
+        Args:
+            remote: False = فقط L1 (miss در این حالت شمرده نمی‌شود؛ get_async آن را
+                بعد از جستجوی L2 می‌شمارد)
+        """
+        segment = self._segments[hash(key) % self._shard_count]
+        # خواندن بدون lock - فقط reference به entry گرفته می‌شود
+        entry = segment.entries.get(key)
+        if self._track_access:
+            self._policy.on_access(key)
+        if entry is not None:
+            now = time.monotonic()
+            if now <= entry.expiry:
+                entry.last_access = now
+                entry.hits += 1
+                self._counters.cell()[HITS] += 1
+                if self._debug:
+                    logger.debug("Cache HIT: %s", key)
+                return entry.value
             
-            log_cache_access(hit=False)
-            logger.debug(f"Cache MISS: {key}")
+            # پاک کردن entry منقضی شده (فقط اگر در این فاصله جایگزین نشده باشد)؛
+            # اگر segment مشغول باشد، حذف به sweep بعدی سپرده می‌شود.
+            # entry های داخل بازه grace برای get_stale نگه داشته می‌شوند.
+            if now > entry.stale_until and segment.lock.acquire(blocking=False):
+                try:
+                    if segment.entries.get(key) is entry:
+                        segment.remove_locked(key)
+                        self._metrics.cache_metrics.record_eviction()
+                finally:
+                    segment.lock.release()
+        
+        if self.l2 is not None:
+            if not remote:
+                return None
+            return self._lookup_l2(key, allow_stale=False)[0]
+        
+        self._counters.cell()[MISSES] += 1
+        if self._debug:
+            logger.debug("Cache MISS: %s", key)
+        return None
+    
+    def get_stale(self, key: Hashable, remote: bool = True) -> Tuple[Optional[Any], bool]:
+        """
+        دریافت مقدار برای حالت stale-while-revalidate (remote مثل get)
+        
+        Returns:
+            (value, False) برای entry تازه، (value, True) برای entry منقضی شده
+            داخل بازه grace و (None, False) در صورت نبودن entry
+        """
+        entry = self._segments[hash(key) % self._shard_count].entries.get(key)
+        if entry is not None:
+            now = time.monotonic()
+            if now <= entry.stale_until:
+                stale = now > entry.expiry
+                if stale:
+                    self._counters.cell()[STALE_HITS] += 1
+                else:
+                    entry.last_access = now
+                    entry.hits += 1
+                    self._counters.cell()[HITS] += 1
+                if self._debug:
+                    logger.debug("Cache %s: %s", 'STALE' if stale else 'HIT', key)
+                return entry.value, stale
+        
+        if self.l2 is not None:
+            if not remote:
+                return None, False
+            return self._lookup_l2(key, allow_stale=True)
+        
+        self._counters.cell()[MISSES] += 1
+        if self._debug:
+            logger.debug("Cache MISS: %s", key)
+        return None, False
+    
+    async def get_async(self, key: Hashable) -> Optional[Any]:
+        """get برای event loop: L1 بدون انتظار و جستجوی L2 در thread"""
+        value = self.get(key, remote=False)
+        if value is None and self.l2 is not None:
+            value = (await asyncio.to_thread(self._lookup_l2, key, False))[0]
+        return value
+    
+    async def get_stale_async(self, key: Hashable) -> Tuple[Optional[Any], bool]:
+        """get_stale برای event loop: L1 بدون انتظار و جستجوی L2 در thread"""
+        value, stale = self.get_stale(key, remote=False)
+        if value is None and self.l2 is not None:
+            return await asyncio.to_thread(self._lookup_l2, key, True)
+        return value, stale
+    
+    def _lookup_l2(self, key: Hashable, allow_stale: bool) -> Tuple[Optional[Any], bool]:
+        """جستجوی miss L1 در L2؛ miss نهایی اینجا شمرده می‌شود"""
+        found = self._from_l2(key)
+        if found is not None and (allow_stale or not found[1]):
+            return found
+        self._counters.cell()[MISSES] += 1
+        if self._debug:
+            logger.debug("Cache MISS: %s", key)
+        return None, False
+    
+    def _from_l2(self, key: Hashable) -> Optional[Tuple[Any, bool]]:
+        """
+        جستجوی miss در L2 و برگرداندن entry به L1 با TTL باقیمانده
+        
+        Returns:
+            (value, stale) یا None
+        """
+        found = self.l2.get(self.name, key)
+        if found is None:
             return None
+        value, ttl, grace, tags = found
+        self._store(key, value, ttl, tags, grace, blocking=False, share=False)
+        self._counters.cell()[L2_HITS] += 1
+        if self._debug:
+            logger.debug("Cache L2 HIT: %s", key)
+        return value, ttl <= 0
+    
+    def get_many(self, keys: Iterable[Hashable]) -> Dict[Hashable, Any]:
+        """
+        دریافت چند key با هم (مثلاً همه key های لازم برای یک update)
+        
+        key هایی که در L1 نیستند با یک mget از L2 خوانده می‌شوند (برای
+        RedisBackend یک رفت و برگشت به جای یکی به ازای هر key).
+        
+        Returns:
+            dict از key های موجود به مقدار (key های miss در آن نیستند)
+        """
+        found: Dict[Hashable, Any] = {}
+        missing = []
+        counters = self._counters.cell()
+        now = time.monotonic()
+        for key in keys:
+            entry = self._segments[hash(key) % self._shard_count].entries.get(key)
+            if self._track_access:
+                self._policy.on_access(key)
+            if entry is not None and now <= entry.expiry:
+                entry.last_access = now
+                entry.hits += 1
+                found[key] = entry.value
+            else:
+                missing.append(key)
+        local = len(found)
+        counters[HITS] += local
+        
+        if missing and self.l2 is not None:
+            remote = 0
+            for key, hit in zip(missing, self.l2.mget(self.name, missing)):
+                if hit is not None and hit[1] > 0:
+                    value, ttl, grace, tags = hit
+                    self._store(key, value, ttl, tags, grace, blocking=False, share=False)
+                    found[key] = value
+                    remote += 1
+            counters[L2_HITS] += remote
+            counters[MISSES] += len(missing) - remote
+        else:
+            counters[MISSES] += len(missing)
+        if self._debug:
+            logger.debug("Cache GET_MANY: %d local, %d L2, %d missing", local, len(found) - local,
+                         local + len(missing) - len(found))
+        return found
     
-    def set(self, key: str, value: Any, ttl: int = 300):
-        """ذخیره مقدار در cache با TTL (پیش‌فرض 5 دقیقه)"""
-        with self._lock:
-            self._cache[key] = CacheEntry(value, ttl)
-            logger.debug(f"Cache SET: {key} (TTL={ttl}s)")
+    def set_many(self, items: Dict[Hashable, Any], ttl: int = 300, tags: Optional[Iterable[str]] = None,
+                 grace: int = 0):
+        """
+        ذخیره چند مقدار با TTL و tag های یکسان (write-through به L2 با یک mset)
+        """
+        tags = tuple(tags) if tags else ()
+        for key, value in items.items():
+            self._store(key, value, ttl, tags, grace, blocking=True, share=False)
+        if self.l2 is not None and items:
+            self.l2.mset(self.name, [(key, value, ttl, grace, tags) for key, value in items.items()])
     
-    def delete(self, key: str):
+    def set(self, key: Hashable, value: Any, ttl: int = 300, tags: Optional[Iterable[str]] = None, grace: int = 0):
+        """
+        ذخیره مقدار در cache با TTL (پیش‌فرض 5 دقیقه)
+        
+        Args:
+            key: کلید
+            value: مقدار
+            ttl: مدت اعتبار (ثانیه)
+            tags: tag هایی که entry زیر آنها ثبت می‌شود (برای invalidate_tag)
+            grace: مدتی (ثانیه) بعد از انقضا که مقدار هنوز از get_stale قابل سرو است
+        """
+        self._store(key, value, ttl, tags, grace, blocking=True)
+    
+    def set_nowait(self, key: Hashable, value: Any, ttl: int = 300, tags: Optional[Iterable[str]] = None,
+                   grace: int = 0) -> bool:
+        """
+        مثل set ولی بدون انتظار برای lock segment و بدون write-through به L2
+        (برای استفاده در event loop؛ set_async هر دو را بدون بلاک کردن loop انجام می‌دهد)
+        
+        Returns:
+            False اگر segment مشغول بود و چیزی ذخیره نشد
+        """
+        return self._store(key, value, ttl, tags, grace, blocking=False, share=False)
+    
+    async def set_async(self, key: Hashable, value: Any, ttl: int = 300, tags: Optional[Iterable[str]] = None,
+                        grace: int = 0):
+        """set برای event loop: L1 بدون انتظار (در thread اگر segment مشغول باشد) و write-through L2 در thread"""
+        tags = tuple(tags) if tags else ()
+        if not self.set_nowait(key, value, ttl, tags, grace):
+            await asyncio.to_thread(self._store, key, value, ttl, tags, grace, True, False)
+        if self.l2 is not None:
+            await asyncio.to_thread(self.l2.set, self.name, key, value, ttl, grace, tags)
+    
+    def _store(self, key: Hashable, value: Any, ttl: int, tags: Optional[Iterable[str]], grace: int,
+               blocking: bool, share: bool = True) -> bool:
+        size = estimate_size(value) if self._max_bytes else 0
+        entry = CacheEntry(value, ttl, tuple(tags) if tags else (), size, grace)
+        segment = self._segments[hash(key) % self._shard_count]
+        if not segment.lock.acquire(blocking):
+            return False
+        try:
+            # entry قبلی اول حذف می‌شود تا بودجه برای اندازه جدید بررسی شود
+            segment.remove_locked(key)
+            if not self._make_room_locked(segment, key, size):
+                segment.rejections += 1
+                if self._debug:
+                    logger.debug("Cache REJECT: %s (size=%dB)", key, size)
+                return True
+            segment.entries[key] = entry
+            segment.bytes += size
+            segment.expiry.push(entry.stale_until, key)
+            if entry.tags:
+                segment.tags.add(key, entry.tags)
+        finally:
+            segment.lock.release()
+        if share and self.l2 is not None:
+            # write-through تا process های دیگر از L2 بخوانند
+            self.l2.set(self.name, key, value, ttl, grace, entry.tags)
+        if self._debug:
+            logger.debug("Cache SET: %s (TTL=%ss)", key, ttl)
+        return True
+    
+    def restore(self, key: Hashable, entry: CacheEntry) -> bool:
+        """
+        قرار دادن یک entry آماده (مثلاً خوانده شده از snapshot) در cache
+
+        entry موجود با همین key بازنویسی نمی‌شود (مقدار تازه‌تر است). بودجه
+        region و eviction policy مثل set اعمال می‌شوند.
+
+        Returns:
+            True اگر entry اضافه شد
+        """
+        segment = self._segments[hash(key) % self._shard_count]
+        with segment.lock:
+            if key in segment.entries or not self._make_room_locked(segment, key, entry.size):
+                return False
+            segment.entries[key] = entry
+            segment.bytes += entry.size
+            segment.expiry.push(entry.stale_until, key)
+            if entry.tags:
+                segment.tags.add(key, entry.tags)
+        return True
+
+    def items(self) -> List[Tuple[Hashable, CacheEntry]]:
+        """کپی (key, entry) همه entry ها - lock هر segment فقط حین کپی گرفته می‌شود"""
+        items = []
+        for segment in self._segments:
+            with segment.lock:
+                items.extend(segment.entries.items())
+        return items
+
+    def _over_budget(self, segment: _CacheSegment, size: int) -> bool:
+        if self._segment_max_entries and len(segment.entries) >= self._segment_max_entries:
+            return True
+        return bool(self._segment_max_bytes) and segment.bytes + size > self._segment_max_bytes
+    
+    def _make_room_locked(self, segment: _CacheSegment, key: str, size: int) -> bool:
+        """
+        آزاد کردن جا برای یک key جدید در segment (caller باید lock را داشته باشد)
+        
+        Returns:
+            False اگر key پذیرفته نشود (بزرگتر از بودجه segment یا رد شده توسط policy)
+        """
+        if self._segment_max_bytes and size > self._segment_max_bytes:
+            return False
+        
+        while segment.entries and self._over_budget(segment, size):
+            victim = self._select_victim_locked(segment)
+            if not self._policy.admit(key, victim):
+                return False
+            segment.remove_locked(victim)
+            segment.evictions += 1
+            self._metrics.cache_metrics.record_eviction()
+        return True
+    
+    def _select_victim_locked(self, segment: _CacheSegment) -> str:
+        """
+        انتخاب victim از بین چند entry ابتدای segment
+        
+        entry های منقضی شده بلافاصله انتخاب می‌شوند. بقیه نمونه‌ها با
+        move_to_end به انتهای segment منتقل می‌شوند (مثل عقربه CLOCK) تا دفعه
+        بعد entry های دیگری بررسی شوند؛ key هیچوقت از entries بیرون نمی‌رود، پس
+        get بدون lock miss کاذب نمی‌بیند.
+        """
+        now = time.monotonic()
+        sample = list(islice(segment.entries.items(), self.EVICTION_SAMPLES))
+        for key, entry in sample:
+            if entry.stale_until < now:
+                return key
+        
+        score = self._policy.score
+        victim = min(sample, key=lambda item: score(item[1]))[0]
+        for key, entry in sample:
+            if key != victim:
+                segment.entries.move_to_end(key)
+                self._policy.on_skip(entry)
+        return victim
+    
+    def delete(self, key: Hashable):
         """حذف یک key از cache"""
-        with self._lock:
-            if key in self._cache:
-                del self._cache[key]
-                logger.debug(f"Cache DELETE: {key}")
+        segment = self._segment_for(key)
+        with segment.lock:
+            removed = segment.remove_locked(key) is not None
+        if removed:
+            self._counters.cell()[INVALIDATIONS] += 1
+            logger.debug(f"Cache DELETE: {key}")
+        if self.on_invalidate is not None and isinstance(key, str):
+            # فقط key های رشته‌ای قابل ارسال به process های دیگر هستند
+            self.on_invalidate('key', key, self.name)
+    
+    def has_tag(self, tag: str) -> bool:
+        """آیا entry ای زیر این tag ثبت شده است؟"""
+        return any(tag in segment.tags for segment in self._segments)
+    
+    def count_tag(self, tag: str) -> int:
+        """تعداد entry های ثبت شده زیر tag (بدون حذف - برای dry run)"""
+        count = 0
+        for segment in self._segments:
+            if tag in segment.tags:
+                with segment.lock:
+                    count += len(segment.tags.keys_for(tag))
+        return count
+    
+    def invalidate_tag(self, tag: str) -> int:
+        """
+        حذف همه entry های ثبت شده زیر یک tag
+        
+        هزینه O(تعداد key های تحت تاثیر) است، نه O(کل cache).
+        
+        Returns:
+            تعداد entry های حذف شده
+        """
+        if self.on_invalidate is not None:
+            self.on_invalidate('tag', tag, self.name)
+        removed = 0
+        for segment in self._segments:
+            if tag not in segment.tags:
+                continue
+            with segment.lock:
+                for key in segment.tags.pop(tag):
+                    if segment.remove_locked(key) is not None:
+                        removed += 1
+        
+        if removed:
+            self._counters.cell()[INVALIDATIONS] += 1
+            logger.info(f"Cache INVALIDATE: {removed} keys with tag '{tag}'")
+        return removed
+    
+    def invalidate_tags(self, tags: Iterable[str]) -> int:
+        """حذف entry های چند tag"""
+        return sum(self.invalidate_tag(tag) for tag in tags)
     
     def invalidate_pattern(self, pattern: str):
-        """حذف همه key هایی که pattern در آنها وجود دارد"""
-        with self._lock:
-            # تغییر از startswith به in برای پیدا کردن pattern در هر جایی از key
-            keys_to_delete = [k for k in self._cache.keys() if pattern in k]
-            for key in keys_to_delete:
-                del self._cache[key]
-            
-            if keys_to_delete:
-                logger.info(f"Cache INVALIDATE: {len(keys_to_delete)} keys with pattern '{pattern}'")
+        """
+        حذف همه key هایی که pattern در آنها وجود دارد
+        
+        اگر pattern یک tag ثبت شده باشد از index استفاده می‌شود؛ در غیر این
+        صورت (مسیر کند) همه key ها برای substring بررسی می‌شوند.
+        """
+        if self.has_tag(pattern):
+            self.invalidate_tag(pattern)
+            return
+        if self.on_invalidate is not None:
+            self.on_invalidate('pattern', pattern, self.name)
+        
+        removed = 0
+        for segment in self._segments:
+            with segment.lock:
+                # تغییر از startswith به in برای پیدا کردن pattern در هر جایی از key
+                # (key های tuple با قالب رشته‌ای قبلی مقایسه می‌شوند)
+                keys_to_delete = [k for k in segment.entries if pattern in render_key(k)]
+                for key in keys_to_delete:
+                    segment.remove_locked(key)
+            removed += len(keys_to_delete)
+        
+        if removed:
+            self._counters.cell()[INVALIDATIONS] += 1
+            logger.info(f"Cache INVALIDATE: {removed} keys with pattern '{pattern}' (scan)")
     
     def clear(self):
         """پاک کردن کل cache"""
-        with self._lock:
-            count = len(self._cache)
-            self._cache.clear()
-            logger.info(f"Cache CLEAR: {count} entries removed")
-    
-    def cleanup_expired(self):
-        """پاک کردن entry های منقضی شده"""
-        with self._lock:
-            expired_keys = [k for k, v in self._cache.items() if v.is_expired()]
-            for key in expired_keys:
-                del self._cache[key]
-            
-            if expired_keys:
-                logger.debug(f"Cache CLEANUP: {len(expired_keys)} expired entries removed")
+        if self.on_invalidate is not None:
+            self.on_invalidate('clear', None, self.name)
+        count = 0
+        for segment in self._segments:
+            with segment.lock:
+                count += len(segment.entries)
+                segment.entries.clear()
+                segment.tags.clear()
+                segment.expiry.clear()
+                segment.bytes = 0
+        logger.info(f"Cache CLEAR: {count} entries removed")
+    
+    def cleanup_expired(self, batch_size: Optional[int] = None) -> int:
+        """
+        پاک کردن entry های منقضی شده
+        
+        از heap انقضای هر segment استفاده می‌کند، پس هزینه متناسب با تعداد
+        entry های منقضی است. lock هر segment حداکثر برای batch_size رکورد
+        نگه داشته می‌شود و بین batch ها آزاد می‌شود.
+        
+        Returns:
+            تعداد entry های حذف شده
+        """
+        batch_size = batch_size or self.SWEEP_BATCH
+        now = time.monotonic()
+        removed = 0
+        for segment in self._segments:
+            while True:
+                with segment.lock:
+                    batch = segment.expiry.pop_expired(now, batch_size)
+                    for expiry, key in batch:
+                        entry = segment.entries.get(key)
+                        # رکورد کهنه (entry بازنویسی یا حذف شده) نادیده گرفته می‌شود
+                        if entry is not None and entry.stale_until == expiry:
+                            segment.remove_locked(key)
+                            removed += 1
+                    if segment.expiry.needs_compaction(len(segment.entries)):
+                        segment.expiry.rebuild((e.stale_until, k) for k, e in segment.entries.items())
+                if len(batch) < batch_size:
+                    break
+        
+        if removed:
+            logger.debug(f"Cache CLEANUP: {removed} expired entries removed")
+        return removed
     
+    def __len__(self) -> int:
+        return sum(len(segment.entries) for segment in self._segments)
+    
+    @property
+    def total_bytes(self) -> int:
+        """مجموع حجم تخمینی entry ها (running total، بدون پیمایش entry ها)"""
+        return sum(segment.bytes for segment in self._segments)
+    
+    @property
+    def max_bytes(self) -> Optional[int]:
+        return self._max_bytes
+    
+    @property
+    def capacity_evictions(self) -> int:
+        """تعداد entry هایی که برای آزاد کردن جا (نه انقضا) حذف شده‌اند"""
+        return sum(segment.evictions for segment in self._segments)
+    
+    def counts(self) -> Dict[str, int]:
+        """
+        شمارنده‌های lookup و invalidation این region (hits / misses / stale_hits /
+        negative_hits / negative_sets / invalidations)
+        
+        invalidations تعداد رویدادهای invalidate/delete است که حداقل یک entry حذف کرده‌اند.
+        """
+        return self._counters.snapshot()
     
-    def get_stats(self) -> Dict[str, int]:
+    def record_negative_hit(self):
+        self._counters.cell()[NEGATIVE_HITS] += 1
+    
+    def record_negative_set(self):
+        self._counters.cell()[NEGATIVE_SETS] += 1
+    
+    def flush_metrics(self) -> Dict[str, int]:
+        """
+        ارسال hit/miss های جمع شده از آخرین flush به metrics مرکزی
+        
+        به جای صدا زدن log_cache_access در هر get، شمارنده‌های per-thread
+        به صورت دوره‌ای (cache_cleanup_task) و در get_stats جمع و ارسال می‌شوند؛
+        هزینه هر flush محدود است (_BULK_CACHE_ACCESS / METRICS_FLUSH_MAX).
+        سطح log هم اینجا دوباره خوانده می‌شود.
+        
+        Returns:
+            snapshot شمارنده‌ها
+        """
+        self._debug = logger.isEnabledFor(logging.DEBUG)
+        counts = self._counters.snapshot()
+        with self._flush_lock:
+            hits = counts['hits'] + counts['stale_hits'] - self._flushed['hits']
+            misses = counts['misses'] - self._flushed['misses']
+            if not _BULK_CACHE_ACCESS:
+                hits, misses = min(hits, METRICS_FLUSH_MAX), min(misses, METRICS_FLUSH_MAX)
+            self._flushed['hits'] += hits
+            self._flushed['misses'] += misses
+        if _BULK_CACHE_ACCESS:
+            if hits:
+                log_cache_access(hit=True, count=hits)
+            if misses:
+                log_cache_access(hit=False, count=misses)
+        else:
+            for _ in range(hits):
+                log_cache_access(hit=True)
+            for _ in range(misses):
+                log_cache_access(hit=False)
+        return counts
+    
+    def get_stats(self) -> Dict[str, Any]:
         """دریافت آمار cache از metrics مرکزی"""
+        counts = self.flush_metrics()
         cache_stats = self._metrics.cache_metrics.get_stats()
-        cache_stats['entries'] = len(self._cache)
+        # hit/miss همین region (metrics مرکزی مجموع همه region هاست)
+        lookups = counts['hits'] + counts['stale_hits'] + counts['misses']
+        cache_stats['hits'] = counts['hits']
+        cache_stats['misses'] = counts['misses']
+        cache_stats['hit_rate'] = (counts['hits'] + counts['stale_hits']) / lookups * 100 if lookups else 0.0
+        cache_stats['region'] = self.name
+        cache_stats['entries'] = len(self)
+        cache_stats['shards'] = self._shard_count
+        cache_stats['tags'] = sum(len(segment.tags) for segment in self._segments)
+        cache_stats['bytes'] = self.total_bytes
+        cache_stats['max_entries'] = self._max_entries
+        cache_stats['max_bytes'] = self._max_bytes
+        cache_stats['policy'] = self._policy.name
+        cache_stats['capacity_evictions'] = self.capacity_evictions
+        cache_stats['rejections'] = sum(segment.rejections for segment in self._segments)
+        cache_stats.update(self.single_flight.get_stats())
+        cache_stats.update(self.async_flight.get_stats())
+        cache_stats.update(self.refresher.get_stats())
+        cache_stats['stale_hits'] = counts['stale_hits']
+        cache_stats['negative_hits'] = counts['negative_hits']
+        cache_stats['negative_sets'] = counts['negative_sets']
+        cache_stats['invalidations'] = counts['invalidations']
+        cache_stats['l2_hits'] = counts['l2_hits']
         return cache_stats
 
 
 # Instance سراسری
-_cache = CacheManager()
+# Instance سراسری - region 'default' از موتور cache مشترک
+_cache = get_engine().region('default')
 
 
 def get_cache() -> CacheManager:
@@ -119,36 +742,54 @@ def get_cache() -> CacheManager:
     return _cache
 
 
+def attachment_tags(category: str = None, weapon: str = None, mode: str = None) -> list:
+    """
+    ساخت tag های استاندارد برای داده‌های یک دسته/سلاح/mode
+    
+    برای استفاده در پارامتر tags یا namespaces از decorator ``cached``:
+        @cached(ttl=300, tags=lambda self, category, weapon, mode=None: attachment_tags(category, weapon, mode))
+    
+    ATTACHMENT_NAMESPACE همیشه اول است تا رویدادی بدون دسته/سلاح مشخص فقط
+    داده‌های اتچمنت را کنار بگذارد.
+    """
+    if not (category or weapon or mode):
+        return []
+    tags = [ATTACHMENT_NAMESPACE]
+    if category:
+        tags.append(f"category:{category}")
+        if weapon:
+            tags.append(f"weapon:{category}:{weapon}")
+    if mode:
+        tags.append(f"mode:{mode}")
+    return tags
+
+
 def invalidate_attachment_caches(category: str = None, weapon: str = None) -> None:
     """
     پاک کردن تمام cache های مربوط به اتچمنت‌ها
     
-    این تابع برای استفاده بعد از افزودن/ویرایش/حذف اتچمنت است.
+    این تابع برای استفاده بعد از افزودن/ویرایش/حذف اتچمنت است. داده‌های
+    وابسته (سلاح، دسته، شمارش‌ها، season_top، suggested، statistics) از
+    گراف وابستگی core.cache.dependencies گرفته می‌شوند.
     
     Args:
         category: نام دسته (اختیاری)
         weapon: نام سلاح (اختیاری)
     """
-    patterns = [
-        "get_all_attachments",
-        "get_weapon_attachments",
-        "get_top_attachments",
-        "category_counts",
-    ]
-    
-    if category and weapon:
-        patterns.append(f"_{category}_{weapon}")
-    
-    for pattern in patterns:
-        _cache.invalidate_pattern(pattern)
-    
-    # حذف key های خاص
-    _cache.delete("category_counts")
-    
-    logger.info(f"Attachment caches invalidated (category={category}, weapon={weapon})")
+    get_dependency_graph().invalidate('attachment', category=category, weapon=weapon)
+
+
+def _function_tags(func: Callable) -> Tuple[str, ...]:
+    """tag های پیش‌فرض یک تابع: qualname، نام تابع و نام کلاس (برای متدها)"""
+    tags = [func.__qualname__]
+    if func.__name__ != func.__qualname__:
+        tags.append(func.__name__)
+        tags.append(func.__qualname__.rsplit('.', 1)[0])
+    return tuple(tags)
 
 
-def cached(ttl_or_key = 300, key_func: Optional[Callable] = None, ttl: Optional[int] = None):
+def cached(ttl_or_key = 300, key_func: Optional[Callable] = None, ttl: Optional[int] = None,
+           tags = None, stale_while_revalidate: int = 0, negative_ttl: int = 0, namespaces = None):
     """
     Decorator برای cache کردن خروجی توابع
     
@@ -156,6 +797,27 @@ def cached(ttl_or_key = 300, key_func: Optional[Callable] = None, ttl: Optional[
         ttl_or_key: مدت زمان cache (ثانیه) یا cache key (string)
         key_func: تابع برای ساخت cache key (اختیاری)
         ttl: مدت زمان cache (keyword argument برای backward compatibility)
+        tags: tag های اضافه برای entry - لیست ثابت یا تابعی با همان آرگومان‌های
+            تابع اصلی که لیست tag برمی‌گرداند (مثلاً attachment_tags)
+        stale_while_revalidate: بازه grace (ثانیه) - بعد از انقضا تا این مدت
+            مقدار قدیمی برگردانده می‌شود و refresh در پس‌زمینه انجام می‌شود.
+            بعد از این بازه (حداکثر staleness) محاسبه همزمان انجام می‌شود.
+            پیش‌فرض 0 یعنی غیرفعال
+        negative_ttl: مدت cache کردن خروجی None (ثانیه) - برای lookup هایی که
+            اغلب برای داده ناموجود صدا زده می‌شوند. پیش‌فرض 0 یعنی None cache نمی‌شود
+        namespaces: namespace های نسخه‌دار entry - لیست ثابت یا تابعی با همان
+            آرگومان‌های تابع اصلی (مثلاً attachment_tags). generation آنها داخل
+            key قرار می‌گیرد و bump_namespace همه entry های namespace را با
+            هزینه ثابت غیرقابل دسترس می‌کند
+    
+    هر entry به صورت خودکار زیر نام تابع، qualname و نام کلاس ثبت می‌شود.
+    متدها علاوه بر namespaces در namespace نام کلاس خود (مثلاً 'DatabaseAdapter')
+    هم هستند. key های ثابت (cache key رشته‌ای یا key_func) namespace ندارند.
+    در زمان miss، فراخوانی‌های همزمان با همان key یکی می‌شوند (single-flight)
+    و تابع فقط یکبار اجرا می‌شود.
+    
+    برای توابع async (مثل handler ها) نتیجه await شده cache می‌شود و
+    awaiter های همزمان روی یک Task منتظر می‌مانند.
     
     مثال:
         @cached(ttl=600)
@@ -179,76 +841,224 @@ def cached(ttl_or_key = 300, key_func: Optional[Callable] = None, ttl: Optional[
         cache_ttl = ttl_or_key if isinstance(ttl_or_key, int) else 300
     
     def decorator(func):
-        @wraps(func)
-        def wrapper(*args, **kwargs):
+        base_tags = _function_tags(func)
+        func_id = func.__qualname__
+        warm_id = function_id(func)
+        hot_keys = get_tracker()
+        versions = get_engine().namespaces
+        owner = (func.__qualname__.rsplit('.', 1)[0],) if '.' in func.__qualname__ else ()
+        static_namespaces = owner + (as_namespaces(namespaces) if namespaces and not callable(namespaces) else ())
+        if owner and not (cache_key_prefix or key_func):
+            # متدهای بدون namespaces فقط با bump کل کلاس invalidate می‌شوند (NamespaceVersions.widen)
+            versions.register_method(owner[0], func.__qualname__, bool(namespaces))
+        
+        def make_key(args, kwargs):
             # ساخت cache key
             if cache_key_prefix:
                 # استفاده از cache key ثابت
-                cache_key = cache_key_prefix
-            elif key_func:
-                cache_key = key_func(*args, **kwargs)
-            else:
-                # ساخت key پیش‌فرض از نام تابع و آرگومان‌ها
-                func_name = func.__qualname__
-                args_str = '_'.join(str(arg) for arg in args)
-                kwargs_str = '_'.join(f"{k}={v}" for k, v in sorted(kwargs.items()))
-                cache_key = f"{func_name}:{args_str}:{kwargs_str}"
-            
-            # بررسی cache
-            cached_value = _cache.get(cache_key)
-            if cached_value is not None:
-                return cached_value
-            
-            # اجرای تابع و ذخیره در cache
-            result = func(*args, **kwargs)
-            _cache.set(cache_key, result, cache_ttl)
-            
-            return result
+                return cache_key_prefix
+            if key_func:
+                return key_func(*args, **kwargs)
+            # key پیش‌فرض: tuple (qualname, args, kwargs[, generations]) بدون serialization
+            key_namespaces = namespaces_for(args, kwargs)
+            return make_call_key(func_id, args, kwargs, versions.stamp(key_namespaces) if key_namespaces else ())
+        
+        def namespaces_for(args, kwargs):
+            if callable(namespaces):
+                return static_namespaces + as_namespaces(namespaces(*args, **kwargs))
+            return static_namespaces
+        
+        def make_tags(args, kwargs):
+            # namespace ها هم tag می‌شوند تا bump بتواند entry های L2 مشترک را هم حذف کند
+            entry_tags = base_tags + tuple(ns for ns in namespaces_for(args, kwargs) if ns not in base_tags)
+            if not tags:
+                return entry_tags
+            extra = tags(*args, **kwargs) if callable(tags) else tags
+            return entry_tags + tuple(extra)
+        
+        def lookup(cache_key):
+            # بررسی cache - (value, stale)؛ get هیچوقت منتظر lock نمی‌ماند
+            if stale_while_revalidate:
+                return _cache.get_stale(cache_key)
+            return _cache.get(cache_key), False
+        
+        async def lookup_async(cache_key):
+            # مثل lookup ولی جستجوی L2 در thread تا event loop بلاک نشود
+            if stale_while_revalidate:
+                return await _cache.get_stale_async(cache_key)
+            return await _cache.get_async(cache_key), False
+        
+        def unwrap(value):
+            # تبدیل sentinel به None برای caller
+            if value is NEGATIVE:
+                _cache.record_negative_hit()
+                return None
+            return value
+        
+        def entry_for(result):
+            # (value, ttl, grace) برای ذخیره، یا None اگر نباید cache شود
+            if result is None:
+                if not negative_ttl:
+                    return None
+                _cache.record_negative_set()
+                return NEGATIVE, negative_ttl, 0
+            return result, cache_ttl, stale_while_revalidate
+        
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def wrapper(*args, **kwargs):
+                cache_key = make_key(args, kwargs)
+                cached_value, stale = await lookup_async(cache_key)
+                if cached_value is not None and not stale:
+                    return unwrap(cached_value)
+                
+                async def load():
+                    # نتیجه await شده cache می‌شود، نه خود coroutine
+                    hot_keys.record(warm_id, args, kwargs)
+                    result = await func(*args, **kwargs)
+                    entry = entry_for(result)
+                    if entry is not None:
+                        value, entry_ttl, grace = entry
+                        # segment مشغول و write-through به L2 در thread تا event loop بلاک نشود
+                        await _cache.set_async(cache_key, value, entry_ttl, make_tags(args, kwargs), grace)
+                    return result
+                
+                if cached_value is not None:
+                    # مقدار stale فوراً برگردانده می‌شود و refresh روی event loop انجام می‌شود
+                    _cache.refresher.submit_async(cache_key, lambda: _cache.async_flight.do(cache_key, load))
+                    return unwrap(cached_value)
+                
+                # awaiter های همزمان روی یک Task منتظر می‌مانند
+                return await _cache.async_flight.do(cache_key, load)
+        else:
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                cache_key = make_key(args, kwargs)
+                cached_value, stale = lookup(cache_key)
+                if cached_value is not None and not stale:
+                    return unwrap(cached_value)
+                
+                def load():
+                    # اجرای تابع و ذخیره در cache
+                    hot_keys.record(warm_id, args, kwargs)
+                    result = func(*args, **kwargs)
+                    entry = entry_for(result)
+                    if entry is not None:
+                        value, entry_ttl, grace = entry
+                        _cache.set(cache_key, value, entry_ttl, make_tags(args, kwargs), grace)
+                    return result
+                
+                if cached_value is not None:
+                    # مقدار stale فوراً برگردانده می‌شود و refresh در thread pool انجام می‌شود
+                    _cache.refresher.submit(cache_key, lambda: _cache.single_flight.do(cache_key, load))
+                    return unwrap(cached_value)
+                
+                # فقط یک caller تابع را اجرا می‌کند؛ بقیه callers همزمان همان نتیجه را می‌گیرند
+                return _cache.single_flight.do(cache_key, load)
         
         # اضافه کردن متد برای پاک کردن cache این تابع
-        wrapper.cache_clear = lambda: _cache.invalidate_pattern(func.__qualname__)
+        wrapper.cache_clear = lambda: _cache.invalidate_tag(func.__qualname__)
+        # قابل replay در warm up بعد از restart
+        register_function(func, wrapper)
         
         return wrapper
     return decorator
 
 
-def invalidate_cache_on_write(patterns: list):
+def bump_namespace(*names: str):
+    """
+    invalidate کردن namespace ها با هزینه ثابت (entry های قبلی به تدریج حذف می‌شوند)
+    
+    مثال:
+        bump_namespace(*attachment_tags(category, weapon))
+    """
+    generations = get_engine().namespaces.bump(*names)
+    logger.debug(f"Cache namespaces bumped: {generations}")
+    return generations
+
+
+def _write_namespaces(arguments: Dict[str, Any]) -> Tuple[str, ...]:
+    """
+    namespace های محدود یک write از آرگومان‌های category / weapon / mode آن
+    
+    با دسته و سلاح فقط namespace همان سلاح، در غیر این صورت namespace های
+    attachment_tags بدون namespace ریشه.
+    """
+    category, weapon, mode = (arguments.get(name) for name in ('category', 'weapon', 'mode'))
+    if category and weapon:
+        return (f"weapon:{category}:{weapon}",)
+    return tuple(ns for ns in attachment_tags(category, None, mode) if ns != ATTACHMENT_NAMESPACE)
+
+
+def invalidate_cache_on_write(patterns: list, namespaces = None):
     """
     Decorator برای invalidate کردن cache بعد از write operations
     
+    Args:
+        patterns: نام توابع/pattern هایی که پاک می‌شوند (entry ها زیر نام تابع tag شده‌اند)
+        namespaces: namespace هایی که bump می‌شوند - لیست ثابت یا تابعی با همان
+            آرگومان‌های تابع write (مثلاً attachment_tags). بدون آن namespace ها از
+            آرگومان‌های category / weapon / mode تابع write ساخته می‌شوند
+            (_write_namespaces) و تا وقتی متدی از DatabaseAdapter بدون namespaces
+            cache شده باشد کل namespace 'DatabaseAdapter' هم bump می‌شود
+    
     مثال:
         @invalidate_cache_on_write(['get_weapons_in_category', 'get_all_attachments'])
         def add_weapon(category, name):
             # بعد از اجرا، cache مربوط به این توابع پاک می‌شود
             ...
     """
-    def decorator(func):
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            result = func(*args, **kwargs)
-            
-            # اگر عملیات موفق بود، cache را پاک کن
-            if result:  # فقط اگر update/add/delete موفق بود
-                # Invalidate cache patterns
-                for pattern in patterns:
-                    _cache.invalidate_pattern(pattern)
-                    logger.debug(f"Invalidated cache pattern: {pattern}")
-                
-                # برای اطمینان بیشتر، همه cache های مربوط به database را پاک کن
-                if 'attachments' in str(patterns):  # اگر مربوط به attachments بود
-                    _cache.invalidate_pattern('DatabaseAdapter')
-                    logger.info("Cleared all DatabaseAdapter cache due to attachment change")
+    def namespaces_for(signature, args, kwargs):
+        if namespaces:
+            return namespaces(*args, **kwargs) if callable(namespaces) else namespaces
+        try:
+            names = _write_namespaces(signature.bind_partial(*args, **kwargs).arguments)
+        except TypeError:
+            names = ()
+        if names or 'attachments' in str(patterns):
+            return get_engine().namespaces.widen(DB_NAMESPACE, names)
+        return names
+    
+    def invalidate(result, signature, args, kwargs):
+        # اگر عملیات موفق بود، cache را پاک کن
+        if not result:  # فقط اگر update/add/delete موفق بود
+            return
+        with get_engine().operation():
+            # Invalidate cache patterns
+            for pattern in patterns:
+                _cache.invalidate_pattern(pattern)
+                logger.debug(f"Invalidated cache pattern: {pattern}")
             
-            return result
+            names = as_namespaces(namespaces_for(signature, args, kwargs))
+            if names:
+                bump_namespace(*names)
+                logger.debug(f"Invalidated cache namespaces: {names}")
+    
+    def decorator(func):
+        signature = inspect.signature(func)
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def wrapper(*args, **kwargs):
+                result = await func(*args, **kwargs)
+                invalidate(result, signature, args, kwargs)
+                return result
+        else:
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                result = func(*args, **kwargs)
+                invalidate(result, signature, args, kwargs)
+                return result
         return wrapper
     return decorator
 
 
 # Cleanup task برای پاک کردن خودکار expired entries
-import asyncio
-
 async def cache_cleanup_task():
-    """Task برای پاک کردن خودکار cache های منقضی شده"""
-    while True:
-        await asyncio.sleep(60)  # هر 1 دقیقه
-        _cache.cleanup_expired()
+    """
+    شروع نگهداری خودکار cache
+    
+    پاکسازی entry های منقضی (برای همه region ها) و ارسال metrics حالا در
+    MaintenanceScheduler موتور cache انجام می‌شود؛ این تابع فقط برای سازگاری
+    با کد راه‌اندازی قبلی باقی مانده و scheduler را (اگر متوقف شده باشد) شروع می‌کند.
+    """
+    get_engine().scheduler.start()
@@ -0,0 +1,497 @@
+"""
+bus هماهنگی cache بین process ها
+
+همه cache های core/cache داخل process هستند؛ اگر چند process از bot (یا یک
+worker ادمین جدا) اجرا شود، ویرایش در یکی تا پایان TTL در بقیه stale می‌ماند.
+
+InvalidationBus به عنوان listener روی CacheEngine ثبت می‌شود و هر invalidation
+محلی (tag / pattern / namespace / key رشته‌ای / clear) را جمع می‌کند. هر
+FLUSH_INTERVAL ثانیه عملیات جمع شده (بدون تکرار) در یک پیام JSON از طریق
+transport برای process های دیگر فرستاده می‌شود و آنها همان عملیات را روی
+cache خودشان اجرا می‌کنند. عملیاتی که از bus دریافت و اجرا می‌شود دوباره
+ارسال نمی‌شود.
+
+transport ها:
+
+- PostgresTransport: LISTEN/NOTIFY روی یک channel (production)
+- UnixSocketTransport: datagram socket برای هر process در یک پوشه مشترک
+  (چند process روی یک سرور، تست‌ها)
+- InProcessTransport: چند bus داخل یک process با یک LocalHub (تست‌ها)
+
+قالب پیام:
+
+    {"o": "<origin>", "ops": [["t", tag], ["p", pattern], ["n", namespace],
+                             ["k", region, key], ["c", region]]}
+"""
+
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+from utils.logger import get_logger
+from .engine import CacheEngine, get_engine
+
+logger = get_logger('cache', 'cache.log')
+
+# نوع invalidation در CacheEngine -> کد عملیات در پیام
+_OPS = {'tag': 't', 'pattern': 'p', 'namespace': 'n', 'key': 'k', 'clear': 'c'}
+
+
+class Transport:
+    """
+    کانال ارسال/دریافت پیام‌های bus
+
+    start(on_message) دریافت را شروع می‌کند؛ on_message با payload (bytes) هر
+    پیام process های دیگر صدا زده می‌شود. send نباید پیام را به همین process
+    برگرداند (bus در هر حال پیام‌های origin خودش را نادیده می‌گیرد).
+    """
+
+    # حداکثر حجم یک پیام - bus دسته‌های بزرگ‌تر را به چند پیام تقسیم می‌کند
+    MAX_PAYLOAD = 64 * 1024
+
+    def start(self, on_message: Callable[[bytes], None]):
+        raise NotImplementedError
+
+    def send(self, payload: bytes):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class LocalHub:
+    """نقطه اتصال InProcessTransport ها داخل یک process"""
+
+    def __init__(self):
+        self._subscribers: List['InProcessTransport'] = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, transport: 'InProcessTransport'):
+        with self._lock:
+            self._subscribers.append(transport)
+
+    def unsubscribe(self, transport: 'InProcessTransport'):
+        with self._lock:
+            if transport in self._subscribers:
+                self._subscribers.remove(transport)
+
+    def publish(self, sender: 'InProcessTransport', payload: bytes):
+        with self._lock:
+            subscribers = [t for t in self._subscribers if t is not sender]
+        for transport in subscribers:
+            transport.deliver(payload)
+
+
+class InProcessTransport(Transport):
+    """transport داخل process - پیام همزمان (در thread فرستنده) تحویل می‌شود"""
+
+    def __init__(self, hub: LocalHub):
+        self._hub = hub
+        self._on_message: Optional[Callable[[bytes], None]] = None
+
+    def start(self, on_message: Callable[[bytes], None]):
+        self._on_message = on_message
+        self._hub.subscribe(self)
+
+    def send(self, payload: bytes):
+        self._hub.publish(self, payload)
+
+    def deliver(self, payload: bytes):
+        if self._on_message is not None:
+            self._on_message(payload)
+
+    def close(self):
+        self._hub.unsubscribe(self)
+        self._on_message = None
+
+
+class UnixSocketTransport(Transport):
+    """
+    هر process یک datagram socket در directory دارد؛ send به همه socket های
+    دیگر آن پوشه می‌فرستد و socket های process های مرده حذف می‌شوند
+    """
+
+    def __init__(self, directory: str):
+        self._directory = directory
+        self._path = os.path.join(directory, f"{os.getpid()}-{uuid.uuid4().hex[:8]}.sock")
+        self._sock: Optional[socket.socket] = None
+        self._sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, on_message: Callable[[bytes], None]):
+        os.makedirs(self._directory, exist_ok=True)
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._sock.bind(self._path)
+        self._thread = threading.Thread(target=self._receive, args=(self._sock, on_message),
+                                        name='cache-bus-unix', daemon=True)
+        self._thread.start()
+
+    def _receive(self, sock: socket.socket, on_message: Callable[[bytes], None]):
+        while True:
+            try:
+                payload = sock.recv(self.MAX_PAYLOAD)
+            except OSError:
+                # socket بسته شده (close)
+                return
+            if payload:
+                on_message(payload)
+
+    def send(self, payload: bytes):
+        try:
+            names = os.listdir(self._directory)
+        except FileNotFoundError:
+            return
+        for name in names:
+            path = os.path.join(self._directory, name)
+            if path == self._path or not name.endswith('.sock'):
+                continue
+            try:
+                self._sender.sendto(payload, path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                # process صاحب socket دیگر وجود ندارد
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+
+    def close(self):
+        if self._sock is not None:
+            # shutdown لازم است تا recv در thread دریافت برگردد
+            try:
+                self._sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self._sock.close()
+            self._sock = None
+        self._sender.close()
+        try:
+            os.unlink(self._path)
+        except OSError:
+            pass
+
+
+class PostgresTransport(Transport):
+    """
+    LISTEN/NOTIFY روی channel
+
+    یک connection اختصاصی (autocommit) برای LISTEN و یکی برای NOTIFY باز
+    می‌شود؛ connection pool دیتابیس اشغال نمی‌شود. driver (psycopg2 یا psycopg)
+    فقط هنگام start import می‌شود.
+    """
+
+    # محدودیت payload در NOTIFY حدود 8000 بایت است
+    MAX_PAYLOAD = 7900
+    POLL_TIMEOUT = 1.0
+    RECONNECT_DELAY = 5.0
+
+    def __init__(self, dsn: str, channel: str = 'cache_invalidation'):
+        self._dsn = dsn
+        self._channel = channel
+        self._sender = None
+        self._send_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def _driver():
+        try:
+            import psycopg2
+            return psycopg2
+        except ImportError:
+            import psycopg
+            return psycopg
+
+    def _connect(self):
+        driver = self._driver()
+        if driver.__name__ == 'psycopg2':
+            conn = driver.connect(self._dsn)
+            conn.autocommit = True
+        else:
+            conn = driver.connect(self._dsn, autocommit=True)
+        return conn
+
+    def start(self, on_message: Callable[[bytes], None]):
+        self._sender = self._connect()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._listen, args=(on_message,),
+                                        name='cache-bus-pg', daemon=True)
+        self._thread.start()
+
+    def _listen(self, on_message: Callable[[bytes], None]):
+        while not self._stop.is_set():
+            try:
+                conn = self._connect()
+                try:
+                    conn.cursor().execute(f'LISTEN "{self._channel}"')
+                    self._poll(conn, on_message)
+                finally:
+                    conn.close()
+            except Exception as e:
+                if self._stop.is_set():
+                    return
+                logger.error(f"Cache bus LISTEN connection failed: {e}")
+                self._stop.wait(self.RECONNECT_DELAY)
+
+    def _poll(self, conn, on_message: Callable[[bytes], None]):
+        if hasattr(conn, 'poll'):
+            # psycopg2
+            import select
+            while not self._stop.is_set():
+                if select.select([conn], [], [], self.POLL_TIMEOUT) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    on_message(conn.notifies.pop(0).payload.encode('utf-8'))
+        else:
+            # psycopg 3
+            while not self._stop.is_set():
+                for notify in conn.notifies(timeout=self.POLL_TIMEOUT):
+                    on_message(notify.payload.encode('utf-8'))
+
+    def send(self, payload: bytes):
+        with self._send_lock:
+            try:
+                self._sender.cursor().execute("SELECT pg_notify(%s, %s)", (self._channel, payload.decode('utf-8')))
+            except Exception:
+                # یک بار تلاش دوباره با connection جدید
+                try:
+                    self._sender.close()
+                except Exception:
+                    pass
+                self._sender = self._connect()
+                self._sender.cursor().execute("SELECT pg_notify(%s, %s)", (self._channel, payload.decode('utf-8')))
+
+    def close(self):
+        self._stop.set()
+        if self._sender is not None:
+            try:
+                self._sender.close()
+            except Exception:
+                pass
+            self._sender = None
+
+
+class InvalidationBus:
+    """
+    ارسال دسته‌ای invalidation های محلی و اجرای invalidation های process های دیگر
+
+    Args:
+        transport: کانال پیام
+        engine: موتور cache (پیش‌فرض get_engine())
+        flush_interval: حداکثر تاخیر (ثانیه) قبل از ارسال عملیات جمع شده
+    """
+
+    FLUSH_INTERVAL = 0.05
+
+    def __init__(self, transport: Transport, engine: Optional[CacheEngine] = None,
+                 flush_interval: Optional[float] = None):
+        self.transport = transport
+        self.engine = engine or get_engine()
+        self.flush_interval = self.FLUSH_INTERVAL if flush_interval is None else flush_interval
+        self.origin = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        # عملیات در انتظار ارسال (dict به عنوان set مرتب)
+        self._pending: Dict[tuple, None] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        # عملیاتی که این thread از bus اجرا می‌کند دوباره ارسال نمی‌شود
+        self._applying = threading.local()
+        self._stats = {'published_ops': 0, 'sent_messages': 0, 'send_errors': 0,
+                       'received_messages': 0, 'applied_ops': 0, 'apply_errors': 0}
+
+    def start(self):
+        self.transport.start(self._on_message)
+        self.engine.add_listener(self._on_invalidate)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name='cache-bus', daemon=True)
+        self._thread.start()
+        logger.info(f"Cache invalidation bus started ({type(self.transport).__name__}, origin={self.origin})")
+
+    def stop(self):
+        """ارسال عملیات باقیمانده و بستن transport"""
+        self.engine.remove_listener(self._on_invalidate)
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self.flush()
+        self.transport.close()
+
+    # ---- ارسال ----
+
+    def _on_invalidate(self, kind: str, value: Any, region: Optional[str]):
+        if getattr(self._applying, 'active', False):
+            return
+        code = _OPS[kind]
+        if kind == 'namespace':
+            ops = [(code, namespace) for namespace in value]
+        elif kind == 'key':
+            ops = [(code, region, value)]
+        elif kind == 'clear':
+            ops = [(code, region)]
+        else:
+            ops = [(code, value)]
+        with self._lock:
+            for op in ops:
+                self._pending[op] = None
+        self._wakeup.set()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self._wakeup.wait()
+            if self._stop.is_set():
+                return
+            # چند میلی‌ثانیه صبر تا invalidation های پشت سر هم در یک پیام بروند
+            time.sleep(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self) -> int:
+        """
+        ارسال فوری عملیات جمع شده
+
+        Returns:
+            تعداد پیام‌های ارسال شده
+        """
+        with self._lock:
+            ops = list(self._pending)
+            self._pending.clear()
+        sent = 0
+        for payload in self._encode(ops):
+            try:
+                self.transport.send(payload)
+                sent += 1
+            except Exception as e:
+                self._stats['send_errors'] += 1
+                logger.error(f"Cache bus send failed ({len(payload)} bytes): {e}")
+        self._stats['published_ops'] += len(ops)
+        self._stats['sent_messages'] += sent
+        return sent
+
+    def _encode(self, ops: List[tuple]) -> List[bytes]:
+        """تقسیم عملیات به پیام‌هایی که از MAX_PAYLOAD transport بزرگ‌تر نیستند"""
+        limit = self.transport.MAX_PAYLOAD
+        prefix = json.dumps({'o': self.origin, 'ops': []}, ensure_ascii=False)[:-2]
+        payloads = []
+        chunk: List[str] = []
+        size = len(prefix.encode('utf-8')) + 2
+        for op in ops:
+            encoded = json.dumps(op, ensure_ascii=False)
+            op_size = len(encoded.encode('utf-8')) + 1
+            if chunk and size + op_size > limit:
+                payloads.append(f"{prefix}{','.join(chunk)}]}}".encode('utf-8'))
+                chunk = []
+                size = len(prefix.encode('utf-8')) + 2
+            chunk.append(encoded)
+            size += op_size
+        if chunk:
+            payloads.append(f"{prefix}{','.join(chunk)}]}}".encode('utf-8'))
+        return payloads
+
+    # ---- دریافت ----
+
+    def _on_message(self, payload: bytes):
+        try:
+            message = json.loads(payload)
+        except ValueError:
+            self._stats['apply_errors'] += 1
+            return
+        if message.get('o') == self.origin:
+            return
+        self._stats['received_messages'] += 1
+        self.apply(message.get('ops', []), message.get('o'))
+
+    def apply(self, ops: List[list], origin: Optional[str] = None):
+        """
+        اجرای عملیات دریافت شده روی cache این process (بدون ارسال دوباره)
+
+        Args:
+            origin: origin فرستنده (host:pid:id)؛ backend L2 ای که فرستنده هم به
+                آن وصل است دوباره invalidate نمی‌شود
+        """
+        engine = self.engine
+        namespaces = []
+        host = origin.rsplit(':', 2)[0] if origin else None
+        self._applying.active = True
+        try:
+            # L2 فقط یک بار برای کل پیام و نه روی backend مشترک با فرستنده
+            with engine.operation(host):
+                for op in ops:
+                    try:
+                        code = op[0]
+                        if code == 't':
+                            engine.invalidate_tag(op[1])
+                        elif code == 'p':
+                            engine.invalidate_pattern(op[1])
+                        elif code == 'n':
+                            # همه namespace ها با یک bump (یک lock) اعمال می‌شوند
+                            namespaces.append(op[1])
+                            continue
+                        elif code == 'k':
+                            engine.region(op[1]).delete(op[2])
+                        elif code == 'c':
+                            engine.region(op[1]).clear()
+                        else:
+                            continue
+                        self._stats['applied_ops'] += 1
+                    except Exception as e:
+                        self._stats['apply_errors'] += 1
+                        logger.error(f"Cache bus could not apply {op!r}: {e}")
+                if namespaces:
+                    engine.namespaces.bump(*namespaces)
+                    self._stats['applied_ops'] += len(namespaces)
+        finally:
+            self._applying.active = False
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            pending = len(self._pending)
+        return dict(self._stats, pending=pending, transport=type(self.transport).__name__)
+
+
+_bus: Optional[InvalidationBus] = None
+
+
+def start_bus(transport: Transport, engine: Optional[CacheEngine] = None,
+              flush_interval: Optional[float] = None) -> InvalidationBus:
+    """ساخت و شروع bus سراسری (bus قبلی متوقف می‌شود)"""
+    global _bus
+    if _bus is not None:
+        _bus.stop()
+    _bus = InvalidationBus(transport, engine, flush_interval)
+    _bus.start()
+    return _bus
+
+
+def stop_bus():
+    global _bus
+    if _bus is not None:
+        _bus.stop()
+        _bus = None
+
+
+def get_bus() -> Optional[InvalidationBus]:
+    return _bus
+
+
+def transport_from_env() -> Optional[Transport]:
+    """
+    transport بر اساس CACHE_BUS (postgres / unix / خالی = غیرفعال)
+
+    postgres از CACHE_BUS_DSN یا DATABASE_URL و unix از CACHE_BUS_SOCKET_DIR استفاده می‌کند.
+    """
+    kind = os.getenv('CACHE_BUS', '').lower()
+    if kind == 'postgres':
+        dsn = os.getenv('CACHE_BUS_DSN') or os.getenv('DATABASE_URL')
+        if not dsn:
+            logger.warning("CACHE_BUS=postgres but neither CACHE_BUS_DSN nor DATABASE_URL is set")
+            return None
+        return PostgresTransport(dsn, os.getenv('CACHE_BUS_CHANNEL', 'cache_invalidation'))
+    if kind == 'unix':
+        return UnixSocketTransport(os.getenv('CACHE_BUS_SOCKET_DIR', '/tmp/codm-cache-bus'))
+    return None
@@ -0,0 +1,82 @@
+"""
+شمارنده‌های per-thread برای مسیر داغ cache
+
+هر thread یک list از شمارنده‌ها (cell) دارد که فقط خودش در آن می‌نویسد، پس
+increment نه lock لازم دارد و نه در رقابت بین thread ها گم می‌شود. جمع cell ها
+فقط هنگام snapshot (مثلاً get_stats) محاسبه می‌شود.
+
+thread های کوتاه‌عمر (worker های asyncio.to_thread، کارهای refresher) زیاد
+ساخته می‌شوند؛ وقتی thread تمام شود مقدار cell آن به base اضافه و خود cell
+حذف می‌شود (weakref.finalize روی holder داخل threading.local)، پس تعداد cell ها
+به thread های زنده محدود است.
+
+استفاده در مسیر داغ:
+
+    HITS, MISSES = range(2)
+    counters = StripedCounters(('hits', 'misses'))
+    counters.cell()[HITS] += 1
+"""
+
+import threading
+import weakref
+from typing import Dict, Iterable, List
+
+
+class _Holder:
+    """نگهدارنده cell در threading.local - با پایان thread آزاد می‌شود"""
+
+    __slots__ = ('cell', '__weakref__')
+
+    def __init__(self, cell: List[int]):
+        self.cell = cell
+
+
+class StripedCounters:
+    """مجموعه‌ای از شمارنده‌های نام‌دار با یک cell به ازای هر thread"""
+
+    __slots__ = ('names', '_local', '_cells', '_base', '_lock')
+
+    def __init__(self, names: Iterable[str]):
+        self.names = tuple(names)
+        self._local = threading.local()
+        # id(cell) -> cell برای thread های زنده
+        self._cells: Dict[int, List[int]] = {}
+        # جمع cell های thread های تمام شده
+        self._base: List[int] = [0] * len(self.names)
+        # RLock: finalize ممکن است حین نگه داشتن lock در همین thread اجرا شود
+        self._lock = threading.RLock()
+
+    def cell(self) -> List[int]:
+        """cell مربوط به thread جاری (در اولین فراخوانی ساخته و ثبت می‌شود)"""
+        try:
+            return self._local.holder.cell
+        except AttributeError:
+            cell = [0] * len(self.names)
+            holder = _Holder(cell)
+            with self._lock:
+                self._cells[id(cell)] = cell
+            weakref.finalize(holder, self._retire, cell)
+            self._local.holder = holder
+            return cell
+
+    def _retire(self, cell: List[int]):
+        """انتقال مقدار cell یک thread تمام شده به base"""
+        with self._lock:
+            if self._cells.pop(id(cell), None) is not None:
+                self._base = [total + value for total, value in zip(self._base, cell)]
+
+    def add(self, name: str, amount: int = 1):
+        """increment با نام شمارنده (برای مسیرهای غیر داغ)"""
+        self.cell()[self.names.index(name)] += amount
+
+    def snapshot(self) -> Dict[str, int]:
+        """جمع همه cell ها - مقدار هر thread ممکن است چند increment عقب باشد"""
+        with self._lock:
+            cells = list(self._cells.values())
+            cells.append(self._base)
+        totals = [sum(column) for column in zip(*cells)]
+        return dict(zip(self.names, totals))
+
+    def __len__(self) -> int:
+        """تعداد cell های thread های زنده"""
+        return len(self._cells)
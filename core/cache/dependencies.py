@@ -0,0 +1,257 @@
+"""
+گراف وابستگی اعلانی برای invalidation
+
+قبلاً هر نقطه write خودش لیست pattern ها را می‌نوشت (invalidate_attachment_caches
+یا invalidate_on_change با substring دلخواه)؛ نتیجه هم invalidate بیش از حد بود
+و هم جا افتادن داده‌های مشتق مثل season_top و statistics.
+
+حالا موجودیت‌ها و داده‌های مشتق به صورت گره تعریف می‌شوند و هر گره می‌گوید
+کدام tag ها (نام تابع یا data type در SmartCacheManager)، namespace ها و key های
+ثابت به آن تعلق دارند. یک رویداد write روی موجودیت، گره خودش و همه گره‌های
+پایین‌دست را invalidate می‌کند:
+
+    attachment ─┬─> weapon ──> category ──> counts ──> statistics
+                ├─> top_attachments
+                ├─> season_top ──────────────────────> statistics
+                └─> suggested
+
+tag ها و namespace ها می‌توانند template باشند ('weapon:{category}:{weapon}') که
+با پارامترهای رویداد پر می‌شوند. اگر پارامتر لازم در رویداد نباشد، گره به جای
+template ها از fallback و fallback_namespaces (tag ها و namespace های کلی‌تر)
+استفاده می‌کند تا چیزی جا نیفتد.
+
+    get_dependency_graph().invalidate('attachment', category='AR', weapon='M4')
+    get_dependency_graph().invalidate('attachment', dry_run=True, category='AR')
+"""
+
+import inspect
+import threading
+from collections import deque
+from functools import wraps
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from utils.logger import get_logger
+from .engine import CacheEngine, get_engine
+
+logger = get_logger('cache', 'cache.log')
+
+# namespace ریشه همه داده‌هایی که با attachment_tags ثبت می‌شوند؛ رویدادی که
+# دسته/سلاح مشخص ندارد این namespace را bump می‌کند
+ATTACHMENT_NAMESPACE = 'attachment_data'
+# namespace کلاس لایه DB؛ تا وقتی همه متدهای cached شده آن namespace اعلام
+# نکرده‌اند هر bump محدود آن را هم bump می‌کند (NamespaceVersions.widen)
+DB_NAMESPACE = 'DatabaseAdapter'
+
+
+class _Node:
+    """یک موجودیت یا داده مشتق در گراف"""
+
+    __slots__ = ('name', 'tags', 'namespaces', 'keys', 'fallback', 'fallback_namespaces', 'dependents')
+
+    def __init__(self, name: str, tags: Iterable[str] = (), namespaces: Iterable[str] = (),
+                 keys: Iterable[str] = (), fallback: Iterable[str] = (), fallback_namespaces: Iterable[str] = ()):
+        self.name = name
+        self.tags = tuple(tags)
+        self.namespaces = tuple(namespaces)
+        self.keys = tuple(keys)
+        self.fallback = tuple(fallback)
+        self.fallback_namespaces = tuple(fallback_namespaces)
+        self.dependents: List[str] = []
+
+
+class _Unresolved(Exception):
+    pass
+
+
+def _fill(template: str, params: Dict[str, Any]) -> str:
+    try:
+        return template.format_map(params)
+    except KeyError:
+        raise _Unresolved(template)
+
+
+class DependencyGraph:
+    """
+    گراف وابستگی موجودیت‌ها و داده‌های cache شده
+
+    گره‌ها با node() تعریف می‌شوند؛ depends_on گره‌هایی است که تغییرشان این
+    گره را هم نامعتبر می‌کند.
+    """
+
+    def __init__(self):
+        self._nodes: Dict[str, _Node] = {}
+        self._lock = threading.Lock()
+
+    def node(self, name: str, tags: Iterable[str] = (), namespaces: Iterable[str] = (),
+             keys: Iterable[str] = (), fallback: Iterable[str] = (), fallback_namespaces: Iterable[str] = (),
+             depends_on: Iterable[str] = ()):
+        """
+        تعریف گره
+
+        Args:
+            tags: tag هایی که حذف می‌شوند (template مجاز)
+            namespaces: namespace هایی که bump می‌شوند (template مجاز)
+            keys: key های ثابت region 'default' که حذف می‌شوند
+            fallback: tag هایی که وقتی template ها با پارامترهای رویداد پر نمی‌شوند حذف می‌شوند
+            fallback_namespaces: namespace هایی که در همان حالت bump می‌شوند
+            depends_on: گره‌های بالادست
+        """
+        with self._lock:
+            node = _Node(name, tags, namespaces, keys, fallback, fallback_namespaces)
+            previous = self._nodes.get(name)
+            if previous is not None:
+                node.dependents = previous.dependents
+            self._nodes[name] = node
+            for parent in depends_on:
+                if parent not in self._nodes:
+                    self._nodes[parent] = _Node(parent)
+                if name not in self._nodes[parent].dependents:
+                    self._nodes[parent].dependents.append(name)
+        return self
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._nodes
+
+    def affected(self, entity: str) -> List[str]:
+        """گره entity و همه گره‌های پایین‌دست به ترتیب BFS"""
+        if entity not in self._nodes:
+            raise KeyError(f"Unknown cache entity '{entity}'")
+        seen = [entity]
+        queue = deque([entity])
+        while queue:
+            for dependent in self._nodes[queue.popleft()].dependents:
+                if dependent not in seen:
+                    seen.append(dependent)
+                    queue.append(dependent)
+        return seen
+
+    def plan(self, entity: str, **params) -> Dict[str, List[str]]:
+        """
+        target های invalidation برای رویداد روی entity
+
+        Returns:
+            nodes / tags / namespaces / keys / widened (گره‌هایی که به fallback رسیدند)
+        """
+        params = {name: value for name, value in params.items() if value is not None}
+        plan = {'nodes': self.affected(entity), 'tags': [], 'namespaces': [], 'keys': [], 'widened': []}
+        for name in plan['nodes']:
+            node = self._nodes[name]
+            try:
+                tags = [_fill(tag, params) for tag in node.tags]
+                namespaces = [_fill(namespace, params) for namespace in node.namespaces]
+            except _Unresolved:
+                tags = [tag for tag in node.tags if '{' not in tag] + list(node.fallback)
+                namespaces = [namespace for namespace in node.namespaces if '{' not in namespace]
+                namespaces += node.fallback_namespaces
+                plan['widened'].append(name)
+            for target, values in (('tags', tags), ('namespaces', namespaces), ('keys', node.keys)):
+                plan[target].extend(value for value in values if value not in plan[target])
+        return plan
+
+    def invalidate(self, entity: str, dry_run: bool = False, engine: Optional[CacheEngine] = None,
+                   **params) -> Dict[str, Any]:
+        """
+        invalidate کردن داده‌های وابسته به رویداد write روی entity
+
+        Args:
+            dry_run: فقط گزارش اینکه چه چیزی حذف می‌شد (چیزی حذف نمی‌شود)
+            params: پارامترهای رویداد برای template ها (category / weapon / mode / ...)
+
+        Returns:
+            plan به علاوه entries (تعداد entry های حذف شده یا قابل حذف به ازای هر tag)
+            و generations (generation فعلی هر namespace، در dry run قبل از bump)
+        """
+        engine = engine or get_engine()
+        plan = self.plan(entity, **params)
+        if plan['namespaces']:
+            plan['namespaces'] = list(engine.namespaces.widen(DB_NAMESPACE, plan['namespaces']))
+        default_region = engine.region('default')
+        report: Dict[str, Any] = dict(plan, event=entity, params=params, dry_run=dry_run)
+
+        if dry_run:
+            report['entries'] = {tag: engine.count_tag(tag) for tag in plan['tags']}
+            report['generations'] = {ns: engine.namespaces.generation(ns) for ns in plan['namespaces']}
+            return report
+
+        # یک عملیات: tag و namespace هم‌نام فقط یک بار به L2 می‌رسند
+        with engine.operation():
+            report['entries'] = {tag: engine.invalidate_tag(tag) for tag in plan['tags']}
+            report['generations'] = engine.namespaces.bump(*plan['namespaces']) if plan['namespaces'] else {}
+            for key in plan['keys']:
+                default_region.delete(key)
+        logger.info(
+            f"Cache dependency invalidation '{entity}' {params}: nodes={plan['nodes']} "
+            f"entries={sum(report['entries'].values())} namespaces={len(plan['namespaces'])}"
+        )
+        return report
+
+
+def default_graph() -> DependencyGraph:
+    """گراف موجودیت‌های bot (نام tag ها همان نام توابع و data type های SmartCacheManager)"""
+    graph = DependencyGraph()
+    # get_weapon_attachments همیشه حذف می‌شود چون همه متدهای DatabaseAdapter با
+    # attachment_tags ثبت نشده‌اند؛ متدهایی که namespaces دارند با bump محدود invalidate می‌شوند
+    # و بدون دسته/سلاح namespace ریشه داده‌های اتچمنت (ATTACHMENT_NAMESPACE) کنار گذاشته می‌شود.
+    # تا وقتی متدهای DatabaseAdapter بدون namespaces وجود دارند DB_NAMESPACE هم bump می‌شود
+    graph.node(
+        'attachment',
+        tags=['attachments', 'get_all_attachments', 'get_weapon_attachments', 'weapon:{category}:{weapon}'],
+        namespaces=['weapon:{category}:{weapon}'],
+        fallback_namespaces=[ATTACHMENT_NAMESPACE],
+    )
+    graph.node('weapon', tags=['weapon_list', 'get_weapons_in_category'], namespaces=['category:{category}'],
+               fallback_namespaces=[ATTACHMENT_NAMESPACE], depends_on=['attachment'])
+    graph.node('category', tags=['categories'], depends_on=['weapon'])
+    graph.node('counts', tags=['category_counts'], keys=['category_counts'], depends_on=['category'])
+    graph.node('top_attachments', tags=['top_attachments', 'get_top_attachments'], depends_on=['attachment'])
+    graph.node('season_top', tags=['season_top'], depends_on=['attachment'])
+    graph.node('suggested', tags=['get_suggested_attachments'], depends_on=['attachment'])
+    graph.node('statistics', tags=['statistics'], depends_on=['counts', 'season_top'])
+    return graph
+
+
+_graph: Optional[DependencyGraph] = None
+_graph_lock = threading.Lock()
+
+
+def get_dependency_graph() -> DependencyGraph:
+    global _graph
+    if _graph is None:
+        with _graph_lock:
+            if _graph is None:
+                _graph = default_graph()
+    return _graph
+
+
+def invalidates(entity: str, params: Optional[Callable[..., Dict[str, Any]]] = None):
+    """
+    Decorator برای توابع write: بعد از اجرای موفق، رویداد entity را invalidate می‌کند
+
+    Args:
+        params: تابعی با همان آرگومان‌های تابع write که پارامترهای رویداد را برمی‌گرداند
+
+    مثال:
+        @invalidates('attachment', params=lambda self, category, weapon, *a, **kw: {
+            'category': category, 'weapon': weapon})
+        def add_attachment(self, category, weapon, ...):
+            ...
+    """
+    def invalidate(result, args, kwargs):
+        if result:
+            get_dependency_graph().invalidate(entity, **(params(*args, **kwargs) if params else {}))
+
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def wrapper(*args, **kwargs):
+                result = await func(*args, **kwargs)
+                invalidate(result, args, kwargs)
+                return result
+        else:
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                result = func(*args, **kwargs)
+                invalidate(result, args, kwargs)
+                return result
+        return wrapper
+    return decorator
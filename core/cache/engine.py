@@ -0,0 +1,390 @@
+"""
+موتور واحد cache با region های نام‌دار
+
+قبلاً چهار cache جدا داشتیم (CacheManager، دو instance از SmartCacheManager
+هر کدام با thread پاکسازی خودش، UACache.memory_cache و dict های جداگانه
+cache_result) که نه بودجه حافظه مشترک داشتند، نه metrics و نه invalidation.
+
+حالا همه روی یک CacheEngine ساخته می‌شوند:
+
+- هر region یک CacheManager با ظرفیت و policy خودش است (برای هر data type
+  از SmartCacheManager یک region، به علاوه 'default' برای get_cache/cached و
+  'ua' برای UACache)
+- invalidate_tag / invalidate_pattern روی همه region ها اعمال می‌شود
+- generation namespace ها (NamespaceVersions) برای invalidation با هزینه ثابت
+  بین همه region ها مشترک است
+- هر invalidation (tag / pattern / namespace / key / clear) یک بار به listener های
+  موتور اطلاع داده می‌شود (مثلاً InvalidationBus برای هماهنگی بین process ها)؛
+  وقتی موتور خودش عملیات را روی region ها پخش می‌کند اطلاع region ها نادیده
+  گرفته می‌شود
+- operation() چند invalidation را یک عملیات می‌کند: عملیات L2 آنها بدون تکرار
+  در پایان اعمال می‌شوند و عملیاتی که از process دیگر (bus) رسیده روی backend
+  مشترکی که فرستنده قبلاً invalidate کرده دوباره اجرا نمی‌شود
+- یک MaintenanceScheduler (یک thread) همه کارهای دوره‌ای را اجرا می‌کند:
+  پاکسازی entry های منقضی، ارسال metrics و job هایی که ماژول‌های دیگر
+  ثبت می‌کنند
+
+get_cache()، cached، smart_cached و get_smart_cache() مثل قبل کار می‌کنند و
+فقط adapter هایی روی region های این موتور هستند.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+from utils.logger import get_logger
+from .namespaces import NamespaceVersions
+
+logger = get_logger('cache', 'cache.log')
+
+
+_MB = 1024 * 1024
+
+# تنظیمات region ها - کلیدها همان پارامترهای CacheManager هستند
+# (region هایی که اینجا نیستند با تنظیمات DEFAULT_REGION ساخته می‌شوند)
+#
+# region های l2=True (داده پرخواندن و کم‌تغییر) بعد از attach_l2 از backend
+# مشترک هم استفاده می‌کنند: حافظه مشترک بین process ها یا Redis بین سرورها
+# (core.cache.backends).
+#
+# هر data type بودجه بایت جداگانه دارد: حجم هر مقدار یک بار در set (deep size)
+# محاسبه و به مجموع region اضافه می‌شود و eviction هر region فقط entry های
+# خودش را حذف می‌کند، پس مثلاً موجی از search_results بزرگ categories را بیرون نمی‌کند.
+REGIONS: Dict[str, Dict[str, Any]] = {
+    # get_cache() / cached و data type پیش‌فرض smart_cached
+    'default': {'l2': True},
+    # data type های SmartCacheManager (مجموع ≈ MAX_CACHE_SIZE قبلی)
+    'categories': {'shards': 2, 'max_entries': 200, 'max_bytes': 1 * _MB, 'l2': True},
+    'weapon_list': {'shards': 4, 'max_entries': 500, 'max_bytes': 2 * _MB, 'l2': True},
+    'guides': {'shards': 4, 'max_entries': 300, 'max_bytes': 4 * _MB},
+    'attachments': {'shards': 8, 'max_entries': 3000, 'max_bytes': 16 * _MB, 'l2': True},
+    'top_attachments': {'shards': 8, 'max_entries': 1500, 'max_bytes': 8 * _MB},
+    'season_top': {'shards': 4, 'max_entries': 300, 'max_bytes': 2 * _MB},
+    'user_data': {'shards': 8, 'max_entries': 2000, 'max_bytes': 4 * _MB},
+    'search_results': {'shards': 4, 'max_entries': 1000, 'max_bytes': 8 * _MB},
+    'statistics': {'shards': 2, 'max_entries': 200, 'max_bytes': 1 * _MB},
+    'pending_count': {'shards': 1, 'max_entries': 100, 'max_bytes': _MB // 4},
+    'online_users': {'shards': 1, 'max_entries': 100, 'max_bytes': _MB // 4},
+    # UACache (آمار و رتبه‌بندی اتچمنت‌های کاربران)
+    'ua': {'shards': 4, 'max_entries': 1000, 'max_bytes': 4 * _MB},
+    # اطلاعات تک تک کاربران برای UACache.batch_get_users (key: 'user:{id}')
+    'ua_users': {'shards': 8, 'max_entries': 20000, 'max_bytes': 8 * _MB, 'policy': 'lru'},
+}
+
+DEFAULT_REGION: Dict[str, Any] = {'shards': 4, 'max_entries': 1000, 'max_bytes': 4 * _MB}
+
+
+class _Job:
+    """یک کار دوره‌ای در MaintenanceScheduler"""
+
+    __slots__ = ('name', 'interval', 'fn', 'next_run', 'runs', 'failures', 'last_duration')
+
+    def __init__(self, name: str, interval: float, fn: Callable[[], Any]):
+        self.name = name
+        self.interval = interval
+        self.fn = fn
+        self.next_run = time.monotonic() + interval
+        self.runs = 0
+        self.failures = 0
+        self.last_duration = 0.0
+
+
+class MaintenanceScheduler:
+    """
+    اجرای کارهای دوره‌ای cache در یک thread
+
+    هر job بازه اجرای خودش را دارد؛ thread هر TICK ثانیه job های سررسید را
+    به ترتیب اجرا می‌کند. خطای یک job فقط log می‌شود و بقیه را متوقف نمی‌کند.
+    """
+
+    TICK = 1.0
+
+    def __init__(self):
+        self._jobs: Dict[str, _Job] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def add_job(self, name: str, interval: float, fn: Callable[[], Any]):
+        """ثبت (یا جایگزینی) job با نام name که هر interval ثانیه اجرا می‌شود"""
+        with self._lock:
+            self._jobs[name] = _Job(name, interval, fn)
+
+    def remove_job(self, name: str):
+        with self._lock:
+            self._jobs.pop(name, None)
+
+    def run_pending(self, now: Optional[float] = None) -> int:
+        """
+        اجرای job های سررسید
+
+        Returns:
+            تعداد job های اجرا شده
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            due = [job for job in self._jobs.values() if job.next_run <= now]
+        for job in due:
+            started = time.perf_counter()
+            try:
+                job.fn()
+            except Exception as e:
+                job.failures += 1
+                logger.error(f"Cache maintenance job '{job.name}' failed: {e}")
+            job.runs += 1
+            job.last_duration = time.perf_counter() - started
+            job.next_run = now + job.interval
+        return len(due)
+
+    def start(self):
+        """شروع thread نگهداری (اگر در حال اجرا نباشد)"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name='cache-maintenance', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        while not self._stop.wait(self.TICK):
+            self.run_pending()
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return {
+            job.name: {
+                'interval': job.interval,
+                'runs': job.runs,
+                'failures': job.failures,
+                'last_duration_ms': round(job.last_duration * 1000, 3),
+            }
+            for job in jobs
+        }
+
+
+class CacheEngine:
+    """
+    مجموعه region های cache با invalidation، آمار و نگهداری مشترک
+
+    Args:
+        region_factory: سازنده region (CacheManager) که تنظیمات region را به
+            صورت keyword argument دریافت می‌کند
+        regions: تنظیمات region ها (پیش‌فرض REGIONS)
+    """
+
+    # هزینه هر sweep متناسب با entry های منقضی است، پس هر چند ثانیه اجرا می‌شود
+    SWEEP_INTERVAL = 10
+    METRICS_INTERVAL = 10
+
+    def __init__(self, region_factory: Callable[..., Any], regions: Optional[Dict[str, Dict[str, Any]]] = None):
+        self._region_factory = region_factory
+        self._config = dict(REGIONS if regions is None else regions)
+        self._regions: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self.namespaces = NamespaceVersions()
+        self.namespaces.on_bump = lambda namespaces: self._notify('namespace', namespaces, None)
+        # listener(kind, value, region) - kind: tag / pattern / namespace / key / clear
+        self._listeners: List[Callable[[str, Any, Optional[str]], None]] = []
+        self._l2 = None
+        # fanout.active: موتور در حال پخش یک عملیات روی region ها است
+        self._fanout = threading.local()
+        # operation.actions: عملیات L2 در انتظار، operation.origin: host فرستنده عملیات bus
+        self._operation = threading.local()
+        self.scheduler = MaintenanceScheduler()
+        self.scheduler.add_job('sweep', self.SWEEP_INTERVAL, self.cleanup_expired)
+        self.scheduler.add_job('metrics', self.METRICS_INTERVAL, self.flush_metrics)
+
+    def configure_region(self, name: str, **limits):
+        """
+        تغییر max_entries / max_bytes / policy یک region (ساخته شده یا نشده)
+
+        برای اعمال تنظیمات config بعد از import شدن کامل آن (BotApplicationFactory).
+        """
+        with self._lock:
+            self._config[name] = dict(self._config.get(name, DEFAULT_REGION), **limits)
+            region = self._regions.get(name)
+        if region is not None:
+            options = self._config[name]
+            region.configure(
+                options.get('max_entries', region.DEFAULT_MAX_ENTRIES),
+                options.get('max_bytes', region.DEFAULT_MAX_BYTES),
+                options.get('policy', region.DEFAULT_POLICY),
+            )
+        return region
+
+    def region(self, name: str):
+        """دریافت region با نام name (در اولین استفاده ساخته می‌شود)"""
+        region = self._regions.get(name)
+        if region is None:
+            with self._lock:
+                region = self._regions.get(name)
+                if region is None:
+                    options = self._config.get(name, DEFAULT_REGION)
+                    region = self._region_factory(name=name, **options)
+                    region.on_invalidate = self._region_notify
+                    if region.l2_enabled:
+                        region.l2 = self._l2
+                    self._regions[name] = region
+        return region
+
+    def regions(self) -> Dict[str, Any]:
+        """region های ساخته شده تا این لحظه"""
+        return dict(self._regions)
+
+    def attach_l2(self, l2):
+        """
+        فعال کردن backend L2 (core.cache.backends) برای region های l2=True
+
+        invalidation های همان region ها (و عملیات کل موتور) در _notify روی L2
+        هم اعمال می‌شوند.
+        """
+        with self._lock:
+            self._l2 = l2
+            for region in self._regions.values():
+                if region.l2_enabled:
+                    region.l2 = l2
+
+    def _uses_l2(self, region: Optional[str]) -> bool:
+        """آیا invalidation این region (None: کل موتور) به L2 مربوط است؟"""
+        if region is None:
+            return any(options.get('l2') for options in self._config.values())
+        return bool(self._config.get(region, DEFAULT_REGION).get('l2'))
+
+    def add_listener(self, listener: Callable[[str, Any, Optional[str]], None]):
+        """ثبت listener برای invalidation های همه region ها"""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[str, Any, Optional[str]], None]):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def _notify(self, kind: str, value: Any, region: Optional[str]):
+        for listener in self._listeners:
+            try:
+                listener(kind, value, region)
+            except Exception as e:
+                logger.error(f"Cache invalidation listener failed: {e}")
+        l2 = self._l2
+        # region های بدون l2 (مثل 'ua') چیزی در L2 ندارند
+        if l2 is None or not self._uses_l2(region):
+            return
+        origin = getattr(self._operation, 'origin', None)
+        if origin is not None and l2.shared_with(origin):
+            return
+        actions = l2.actions_for(kind, value, region)
+        pending = getattr(self._operation, 'actions', None)
+        if pending is not None:
+            pending.update(dict.fromkeys(actions))
+        else:
+            self._apply_l2(l2, actions)
+
+    @staticmethod
+    def _apply_l2(l2, actions):
+        try:
+            l2.apply_actions(actions)
+        except Exception as e:
+            logger.error(f"Cache L2 invalidation failed: {e}")
+
+    @contextmanager
+    def operation(self, origin: Optional[str] = None):
+        """
+        یک عملیات invalidation منطقی (رویداد گراف وابستگی، پیام bus، ...)
+
+        عملیات L2 همه invalidation های داخل آن یک بار و در پایان اعمال می‌شوند
+        (مثلاً tag و namespace هم‌نام یک invalidate_tag می‌شوند).
+
+        Args:
+            origin: host فرستنده برای عملیات دریافتی از InvalidationBus؛ اگر
+                backend با آن host مشترک باشد (CacheBackend.shared_with) L2 دست نمی‌خورد
+        """
+        state = self._operation
+        if getattr(state, 'actions', None) is not None:
+            # عملیات تودرتو بخشی از عملیات بیرونی است
+            yield
+            return
+        state.actions, state.origin = {}, origin
+        try:
+            yield
+        finally:
+            actions, state.actions, state.origin = state.actions, None, None
+            if actions and self._l2 is not None:
+                self._apply_l2(self._l2, list(actions))
+
+    def _region_notify(self, kind: str, value: Any, region: Optional[str]):
+        # عملیات خود موتور قبل از پخش یک بار اطلاع داده شده است
+        if not getattr(self._fanout, 'active', False):
+            self._notify(kind, value, region)
+
+    def _fan_out(self, operation: Callable[[Any], Any], regions) -> List[Any]:
+        previous = getattr(self._fanout, 'active', False)
+        self._fanout.active = True
+        try:
+            return [operation(region) for region in regions]
+        finally:
+            self._fanout.active = previous
+
+    def invalidate_tag(self, tag: str) -> int:
+        """حذف entry های tag در همه region ها"""
+        # listener ها حتی اگر هیچ region محلی این tag را نداشته باشد مطلع می‌شوند
+        self._notify('tag', tag, None)
+        regions = [region for region in self.regions().values() if region.has_tag(tag)]
+        return sum(self._fan_out(lambda region: region.invalidate_tag(tag), regions))
+
+    def count_tag(self, tag: str) -> int:
+        """تعداد entry های tag در همه region ها"""
+        return sum(region.count_tag(tag) for region in self.regions().values())
+
+    def invalidate_pattern(self, pattern: str):
+        """invalidate_pattern روی همه region ها"""
+        self._notify('pattern', pattern, None)
+        self._fan_out(lambda region: region.invalidate_pattern(pattern), self.regions().values())
+
+    def clear(self):
+        for region in self.regions().values():
+            region.clear()
+
+    def cleanup_expired(self) -> int:
+        return sum(region.cleanup_expired() for region in self.regions().values())
+
+    def flush_metrics(self):
+        for region in self.regions().values():
+            region.flush_metrics()
+
+    def get_stats(self) -> Dict[str, Any]:
+        from .snapshot import get_snapshot_stats
+
+        regions = {name: region.get_stats() for name, region in self.regions().items()}
+        return {
+            'entries': sum(stats['entries'] for stats in regions.values()),
+            'bytes': sum(stats['bytes'] for stats in regions.values()),
+            'max_bytes': sum(stats['max_bytes'] or 0 for stats in regions.values()),
+            'regions': regions,
+            'namespaces': self.namespaces.get_stats(),
+            'maintenance': self.scheduler.get_stats(),
+            'snapshot': get_snapshot_stats(),
+            'l2': self._l2.get_stats() if self._l2 is not None else None,
+        }
+
+
+# Instance سراسری
+_engine: Optional[CacheEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> CacheEngine:
+    """دریافت موتور cache سراسری (singleton) - thread نگهداری همراه آن شروع می‌شود"""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                # import داخل تابع: cache_manager خودش region 'default' را از این موتور می‌گیرد
+                from .cache_manager import CacheManager
+                engine = CacheEngine(CacheManager)
+                engine.scheduler.start()
+                _engine = engine
+    return _engine
@@ -0,0 +1,136 @@
+"""
+سیاست‌های eviction برای CacheManager
+
+انتخاب victim به صورت نمونه‌برداری (sampled) انجام می‌شود: چند entry از ابتدای
+segment بررسی می‌شوند و entry با کمترین امتیاز حذف می‌شود. به این ترتیب مسیر
+خواندن بدون lock باقی می‌ماند و فقط چند فیلد entry (last_access / hits) به‌روز
+می‌شوند.
+
+سیاست‌ها:
+- lru: کمترین زمان آخرین دسترسی
+- lfu: کمترین تعداد hit
+- tinylfu: victim مثل lru، ولی key جدید فقط وقتی پذیرفته می‌شود که تخمین
+  فرکانس آن (Count-Min Sketch) از victim بیشتر باشد
+"""
+
+from typing import Dict, Hashable, Type, Union
+
+
+class EvictionPolicy:
+    """کلاس پایه سیاست eviction"""
+
+    name = 'base'
+    # آیا policy نیاز به اطلاع از هر get (hit و miss) دارد؟
+    tracks_access = False
+
+    def on_access(self, key: Hashable):
+        """ثبت یک دسترسی (hit یا miss) - بدون lock صدا زده می‌شود"""
+
+    def score(self, entry):
+        """امتیاز قابل مقایسه entry؛ کمترین امتیاز حذف می‌شود"""
+        raise NotImplementedError("Subclasses must implement score()")
+
+    def on_skip(self, entry):
+        """entry نمونه‌برداری شد ولی حذف نشد"""
+
+    def admit(self, key: Hashable, victim_key: Hashable) -> bool:
+        """آیا key جدید به جای victim پذیرفته شود؟"""
+        return True
+
+
+class LRUPolicy(EvictionPolicy):
+    """Least Recently Used (تقریبی)"""
+
+    name = 'lru'
+
+    def score(self, entry) -> float:
+        return entry.last_access
+
+
+class LFUPolicy(EvictionPolicy):
+    """
+    Least Frequently Used (تقریبی)
+
+    aging جداگانه لازم نیست: TTL هر entry عمر شمارنده hits را محدود می‌کند.
+    در تساوی hits، entry قدیمی‌تر حذف می‌شود.
+    """
+
+    name = 'lfu'
+
+    def score(self, entry):
+        return (entry.hits, entry.last_access)
+
+
+class CountMinSketch:
+    """
+    Count-Min Sketch با شمارنده‌های اشباع‌شونده (حداکثر 15) و reset دوره‌ای
+
+    increment ها بدون lock انجام می‌شوند و ممکن است در رقابت چند thread
+    چند واحد گم شود؛ برای تخمین فرکانس این دقت کافی است.
+    """
+
+    DEPTH = 4
+    MAX_COUNT = 15
+    _SEEDS = (0x9E3779B1, 0x85EBCA77, 0xC2B2AE3D, 0x27D4EB2F)
+
+    def __init__(self, width: int = 4096):
+        self._width = max(64, int(width))
+        self._rows = [[0] * self._width for _ in range(self.DEPTH)]
+        self._additions = 0
+        self._sample_size = self._width * 10
+
+    def _indexes(self, key: Hashable):
+        h = hash(key)
+        width = self._width
+        return [((h ^ seed) * 0x01000193 & 0xFFFFFFFF) % width for seed in self._SEEDS]
+
+    def increment(self, key: Hashable):
+        for row, index in zip(self._rows, self._indexes(key)):
+            if row[index] < self.MAX_COUNT:
+                row[index] += 1
+        self._additions += 1
+        if self._additions >= self._sample_size:
+            self._reset()
+
+    def estimate(self, key: Hashable) -> int:
+        return min(row[index] for row, index in zip(self._rows, self._indexes(key)))
+
+    def _reset(self):
+        """نصف کردن همه شمارنده‌ها تا فرکانس‌های قدیمی کم‌اثر شوند"""
+        self._additions = 0
+        for row in self._rows:
+            for i, count in enumerate(row):
+                row[i] = count >> 1
+
+
+class TinyLFUPolicy(LRUPolicy):
+    """LRU برای انتخاب victim + فیلتر پذیرش TinyLFU"""
+
+    name = 'tinylfu'
+    tracks_access = True
+
+    def __init__(self, width: int = 4096):
+        self.sketch = CountMinSketch(width)
+
+    def on_access(self, key: Hashable):
+        self.sketch.increment(key)
+
+    def admit(self, key: Hashable, victim_key: Hashable) -> bool:
+        return self.sketch.estimate(key) > self.sketch.estimate(victim_key)
+
+
+POLICIES: Dict[str, Type[EvictionPolicy]] = {
+    LRUPolicy.name: LRUPolicy,
+    LFUPolicy.name: LFUPolicy,
+    TinyLFUPolicy.name: TinyLFUPolicy,
+}
+
+
+def get_policy(policy: Union[str, EvictionPolicy]) -> EvictionPolicy:
+    """ساخت policy از نام آن (lru / lfu / tinylfu) یا برگرداندن instance داده شده"""
+    if isinstance(policy, EvictionPolicy):
+        return policy
+    try:
+        return POLICIES[policy.lower()]()
+    except KeyError:
+        raise ValueError(f"Unknown eviction policy: {policy!r} (expected one of {sorted(POLICIES)})")
@@ -0,0 +1,69 @@
+"""
+Index انقضا (min-heap) برای پاکسازی تدریجی cache
+
+به جای پیمایش کل dictionary هر دقیقه، هر set یک رکورد (expiry, seq, key) در
+heap می‌گذارد و sweep فقط رکوردهای سر heap که زمانشان گذشته را برمی‌دارد؛
+هزینه متناسب با تعداد entry های منقضی شده است.
+
+حذف از heap به صورت lazy است: رکوردهای entry هایی که بازنویسی یا حذف شده‌اند
+در heap می‌مانند و caller هنگام pop با مقایسه expiry آنها را نادیده می‌گیرد.
+وقتی تعداد رکوردهای کهنه زیاد شود، heap از روی entry های زنده بازسازی می‌شود.
+
+زمان‌ها monotonic هستند (time.monotonic) و به تغییر ساعت سیستم حساس نیستند.
+
+⚠️ این کلاس thread-safe نیست؛ صاحب heap باید lock خودش را نگه دارد
+"""
+
+import heapq
+from itertools import count
+from typing import Hashable, Iterable, List, Tuple
+
+# حداقل رکورد اضافه قبل از بازسازی heap
+COMPACT_SLACK = 64
+
+
+class ExpiryHeap:
+    """min-heap زمان انقضا با حذف lazy"""
+
+    __slots__ = ('_heap', '_seq')
+
+    def __init__(self):
+        self._heap: List[Tuple[float, int, Hashable]] = []
+        self._seq = count()
+
+    def push(self, expiry: float, key: Hashable):
+        heapq.heappush(self._heap, (expiry, next(self._seq), key))
+
+    def pop_expired(self, now: float, limit: int) -> List[Tuple[float, Hashable]]:
+        """
+        برداشتن حداکثر limit رکورد که زمانشان تا now گذشته است
+
+        Returns:
+            لیست (expiry, key) - caller باید بررسی کند که entry فعلی key
+            همان expiry را دارد (در غیر این صورت رکورد کهنه است)
+        """
+        heap = self._heap
+        expired = []
+        while heap and len(expired) < limit and heap[0][0] <= now:
+            expiry, _, key = heapq.heappop(heap)
+            expired.append((expiry, key))
+        return expired
+
+    def needs_compaction(self, live_entries: int) -> bool:
+        return len(self._heap) > 2 * live_entries + COMPACT_SLACK
+
+    def rebuild(self, items: Iterable[Tuple[float, Hashable]]):
+        """بازسازی heap از (expiry, key) های entry های زنده"""
+        seq = self._seq
+        self._heap = [(expiry, next(seq), key) for expiry, key in items]
+        heapq.heapify(self._heap)
+
+    def next_expiry(self):
+        """نزدیک‌ترین زمان انقضا (یا None)"""
+        return self._heap[0][0] if self._heap else None
+
+    def clear(self):
+        self._heap.clear()
+
+    def __len__(self) -> int:
+        return len(self._heap)
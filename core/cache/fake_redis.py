@@ -0,0 +1,404 @@
+"""
+سرور RESP محلی برای تست RedisBackend بدون Redis واقعی
+
+زیرمجموعه‌ای از دستورات Redis که RedisBackend و ابزارهای debug استفاده
+می‌کنند را با یک dict داخل process پیاده می‌کند:
+
+    PING AUTH SELECT QUIT
+    GET SET(EX/PX/NX/XX) MGET MSET DEL EXISTS EXPIRE PEXPIRE(NX/XX/GT/LT) PTTL
+    SADD SREM SMEMBERS SCARD
+    ZADD ZREM ZCARD ZRANGEBYSCORE ZREMRANGEBYSCORE
+    SCAN(MATCH/COUNT) KEYS DBSIZE FLUSHDB FLUSHALL
+    MULTI EXEC DISCARD
+
+همه دستورات زیر یک lock اجرا می‌شوند، پس MULTI/EXEC اتمیک است. SCAN همه
+نتایج را در یک پاسخ (cursor صفر) برمی‌گرداند. commands تعداد اجرای هر دستور
+را نگه می‌دارد تا تست‌ها تعداد رفت و برگشت‌ها (مثلاً MGET به جای چند GET) را
+بررسی کنند.
+
+    with FakeRedisServer() as server:
+        backend = RedisBackend(server.url)
+"""
+
+import fnmatch
+import socketserver
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from .backends import RespError, read_reply
+
+
+def encode_reply(value: Any) -> bytes:
+    """سریال کردن پاسخ (str = simple string، bytes = bulk string)"""
+    if value is None:
+        return b'$-1\r\n'
+    if isinstance(value, RespError):
+        return b'-%s\r\n' % str(value).encode('utf-8')
+    if isinstance(value, bool):
+        value = int(value)
+    if isinstance(value, int):
+        return b':%d\r\n' % value
+    if isinstance(value, str):
+        return b'+%s\r\n' % value.encode('utf-8')
+    if isinstance(value, (bytes, bytearray)):
+        return b'$%d\r\n%s\r\n' % (len(value), bytes(value))
+    if isinstance(value, (list, tuple)):
+        return b'*%d\r\n' % len(value) + b''.join(encode_reply(item) for item in value)
+    raise TypeError(f"Cannot encode {type(value).__name__} as RESP")
+
+
+class _Store:
+    """داده‌های سرور: key -> (مقدار bytes، set یا dict (sorted set: member -> score)، زمان انقضا یا None)"""
+
+    def __init__(self):
+        self.data: Dict[bytes, Tuple[Any, Optional[float]]] = {}
+        self.lock = threading.Lock()
+
+    def lookup(self, key: bytes) -> Optional[Any]:
+        found = self.data.get(key)
+        if found is None:
+            return None
+        value, expires_at = found
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self.data[key]
+            return None
+        return value
+
+    def live_keys(self) -> List[bytes]:
+        return [key for key in list(self.data) if self.lookup(key) is not None]
+
+
+_WRONGTYPE = RespError('WRONGTYPE Operation against a key holding the wrong kind of value')
+
+
+def _number(arg: bytes) -> int:
+    return int(arg)
+
+
+def _score(arg: bytes) -> float:
+    value = arg.lower()
+    if value in (b'-inf', b'+inf', b'inf'):
+        return float(value.replace(b'+', b''))
+    return float(arg)
+
+
+class _Handler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        server: FakeRedisServer = self.server.owner
+        queued: Optional[List[List[bytes]]] = None
+        while True:
+            try:
+                command = read_reply(self.rfile)
+            except (ConnectionError, OSError, ValueError):
+                return
+            if not isinstance(command, list) or not command:
+                self.wfile.write(encode_reply(RespError('ERR invalid request')))
+                continue
+            name = command[0].decode('ascii', 'replace').upper()
+            server.commands[name] += 1
+            if name == 'QUIT':
+                self.wfile.write(encode_reply('OK'))
+                return
+            if name == 'MULTI':
+                reply = RespError('ERR MULTI calls can not be nested') if queued is not None else 'OK'
+                queued = [] if queued is None else queued
+            elif name == 'DISCARD':
+                reply = 'OK' if queued is not None else RespError('ERR DISCARD without MULTI')
+                queued = None
+            elif name == 'EXEC':
+                if queued is None:
+                    reply = RespError('ERR EXEC without MULTI')
+                else:
+                    with server.store.lock:
+                        reply = [server.execute(queued_command) for queued_command in queued]
+                    queued = None
+            elif queued is not None:
+                queued.append(command)
+                reply = 'QUEUED'
+            else:
+                with server.store.lock:
+                    reply = server.execute(command)
+            self.wfile.write(encode_reply(reply))
+
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class FakeRedisServer:
+    """
+    سرور RESP روی localhost در یک thread پس‌زمینه
+
+    Args:
+        port: پورت (صفر = یک پورت آزاد)
+        password: اگر داده شود، دستورات قبل از AUTH رد نمی‌شوند ولی AUTH بررسی می‌شود
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, password: Optional[str] = None):
+        self.password = password
+        self.store = _Store()
+        self.commands: Counter = Counter()
+        self._server = _TCPServer((host, port), _Handler, bind_and_activate=True)
+        self._server.owner = self
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        return self._server.server_address[:2]
+
+    @property
+    def url(self) -> str:
+        host, port = self.address
+        return f"redis://{host}:{port}/0"
+
+    def start(self) -> 'FakeRedisServer':
+        self._thread = threading.Thread(target=self._server.serve_forever, name='fake-redis', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def __enter__(self) -> 'FakeRedisServer':
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # ---- دستورات (زیر store.lock صدا زده می‌شود) ----
+
+    def execute(self, command: List[bytes]) -> Any:
+        name = command[0].decode('ascii', 'replace').upper()
+        handler = getattr(self, f"_cmd_{name.lower()}", None)
+        if handler is None:
+            return RespError(f"ERR unknown command '{name}'")
+        try:
+            return handler(*command[1:])
+        except (TypeError, ValueError):
+            return RespError(f"ERR wrong arguments for '{name}' command")
+
+    def _cmd_ping(self, message: Optional[bytes] = None):
+        return message if message is not None else 'PONG'
+
+    def _cmd_auth(self, *credentials: bytes):
+        if self.password is None or credentials[-1].decode('utf-8') == self.password:
+            return 'OK'
+        return RespError('WRONGPASS invalid username-password pair')
+
+    def _cmd_select(self, db: bytes):
+        _number(db)
+        return 'OK'
+
+    def _cmd_get(self, key: bytes):
+        value = self.store.lookup(key)
+        if value is not None and not isinstance(value, bytes):
+            return _WRONGTYPE
+        return value
+
+    def _cmd_set(self, key: bytes, value: bytes, *options: bytes):
+        expires_at = None
+        index = 0
+        only_new = only_existing = False
+        while index < len(options):
+            option = options[index].upper()
+            if option == b'EX':
+                expires_at = time.monotonic() + _number(options[index + 1])
+                index += 1
+            elif option == b'PX':
+                expires_at = time.monotonic() + _number(options[index + 1]) / 1000
+                index += 1
+            elif option == b'NX':
+                only_new = True
+            elif option == b'XX':
+                only_existing = True
+            else:
+                return RespError('ERR syntax error')
+            index += 1
+        exists = self.store.lookup(key) is not None
+        if (only_new and exists) or (only_existing and not exists):
+            return None
+        self.store.data[key] = (value, expires_at)
+        return 'OK'
+
+    def _cmd_mget(self, *keys: bytes):
+        values = [self.store.lookup(key) for key in keys]
+        return [value if isinstance(value, bytes) else None for value in values]
+
+    def _cmd_mset(self, *pairs: bytes):
+        if not pairs or len(pairs) % 2:
+            raise ValueError(pairs)
+        for index in range(0, len(pairs), 2):
+            self.store.data[pairs[index]] = (pairs[index + 1], None)
+        return 'OK'
+
+    def _cmd_del(self, *keys: bytes):
+        removed = 0
+        for key in keys:
+            if self.store.lookup(key) is not None:
+                del self.store.data[key]
+                removed += 1
+        return removed
+
+    def _cmd_exists(self, *keys: bytes):
+        return sum(1 for key in keys if self.store.lookup(key) is not None)
+
+    def _expire(self, key: bytes, seconds: float, options: Tuple[bytes, ...]) -> Any:
+        value = self.store.lookup(key)
+        if value is None:
+            return 0
+        expires_at = time.monotonic() + seconds
+        current = self.store.data[key][1]
+        # بدون TTL در مقایسه GT / LT بی‌نهایت حساب می‌شود (مثل Redis 7)
+        current_or_inf = current if current is not None else float('inf')
+        for option in (option.upper() for option in options):
+            if option == b'NX':
+                allowed = current is None
+            elif option == b'XX':
+                allowed = current is not None
+            elif option == b'GT':
+                allowed = expires_at > current_or_inf
+            elif option == b'LT':
+                allowed = expires_at < current_or_inf
+            else:
+                return RespError('ERR Unsupported option')
+            if not allowed:
+                return 0
+        self.store.data[key] = (value, expires_at)
+        return 1
+
+    def _cmd_expire(self, key: bytes, seconds: bytes, *options: bytes):
+        return self._expire(key, _number(seconds), options)
+
+    def _cmd_pexpire(self, key: bytes, milliseconds: bytes, *options: bytes):
+        return self._expire(key, _number(milliseconds) / 1000, options)
+
+    def _cmd_pttl(self, key: bytes):
+        if self.store.lookup(key) is None:
+            return -2
+        expires_at = self.store.data[key][1]
+        return -1 if expires_at is None else int((expires_at - time.monotonic()) * 1000)
+
+    def _set_for(self, key: bytes, create: bool) -> Any:
+        value = self.store.lookup(key)
+        if value is None:
+            if not create:
+                return set()
+            value = set()
+            self.store.data[key] = (value, None)
+        if not isinstance(value, set):
+            return _WRONGTYPE
+        return value
+
+    def _cmd_sadd(self, key: bytes, *members: bytes):
+        members_set = self._set_for(key, create=True)
+        if isinstance(members_set, RespError):
+            return members_set
+        before = len(members_set)
+        members_set.update(members)
+        return len(members_set) - before
+
+    def _cmd_srem(self, key: bytes, *members: bytes):
+        members_set = self._set_for(key, create=False)
+        if isinstance(members_set, RespError):
+            return members_set
+        removed = sum(1 for member in members if member in members_set)
+        members_set.difference_update(members)
+        if not members_set:
+            self.store.data.pop(key, None)
+        return removed
+
+    def _cmd_smembers(self, key: bytes):
+        members_set = self._set_for(key, create=False)
+        return members_set if isinstance(members_set, RespError) else sorted(members_set)
+
+    def _cmd_scard(self, key: bytes):
+        members_set = self._set_for(key, create=False)
+        return members_set if isinstance(members_set, RespError) else len(members_set)
+
+    def _zset_for(self, key: bytes, create: bool) -> Any:
+        value = self.store.lookup(key)
+        if value is None:
+            if not create:
+                return {}
+            value = {}
+            self.store.data[key] = (value, None)
+        if not isinstance(value, dict):
+            return _WRONGTYPE
+        return value
+
+    def _cmd_zadd(self, key: bytes, *pairs: bytes):
+        if not pairs or len(pairs) % 2:
+            raise ValueError(pairs)
+        members = self._zset_for(key, create=True)
+        if isinstance(members, RespError):
+            return members
+        added = 0
+        for index in range(0, len(pairs), 2):
+            member = pairs[index + 1]
+            added += member not in members
+            members[member] = _score(pairs[index])
+        return added
+
+    def _zremove(self, key: bytes, members: Dict[bytes, float], remove: List[bytes]) -> int:
+        for member in remove:
+            del members[member]
+        if not members:
+            self.store.data.pop(key, None)
+        return len(remove)
+
+    def _cmd_zrem(self, key: bytes, *remove: bytes):
+        members = self._zset_for(key, create=False)
+        if isinstance(members, RespError):
+            return members
+        return self._zremove(key, members, [member for member in set(remove) if member in members])
+
+    def _cmd_zcard(self, key: bytes):
+        members = self._zset_for(key, create=False)
+        return members if isinstance(members, RespError) else len(members)
+
+    def _in_range(self, key: bytes, low: bytes, high: bytes) -> Any:
+        members = self._zset_for(key, create=False)
+        if isinstance(members, RespError):
+            return members, []
+        low_score, high_score = _score(low), _score(high)
+        ordered = sorted(members.items(), key=lambda item: (item[1], item[0]))
+        return members, [member for member, score in ordered if low_score <= score <= high_score]
+
+    def _cmd_zrangebyscore(self, key: bytes, low: bytes, high: bytes):
+        members, found = self._in_range(key, low, high)
+        return members if isinstance(members, RespError) else found
+
+    def _cmd_zremrangebyscore(self, key: bytes, low: bytes, high: bytes):
+        members, found = self._in_range(key, low, high)
+        return members if isinstance(members, RespError) else self._zremove(key, members, found)
+
+    def _matching(self, pattern: bytes) -> List[bytes]:
+        glob = pattern.decode('latin-1')
+        return [key for key in self.store.live_keys() if fnmatch.fnmatchcase(key.decode('latin-1'), glob)]
+
+    def _cmd_scan(self, cursor: bytes, *options: bytes):
+        _number(cursor)
+        pattern = b'*'
+        for index in range(0, len(options) - 1, 2):
+            if options[index].upper() == b'MATCH':
+                pattern = options[index + 1]
+        return [b'0', self._matching(pattern)]
+
+    def _cmd_keys(self, pattern: bytes):
+        return self._matching(pattern)
+
+    def _cmd_dbsize(self):
+        return len(self.store.live_keys())
+
+    def _cmd_flushdb(self, *options: bytes):
+        self.store.data.clear()
+        return 'OK'
+
+    _cmd_flushall = _cmd_flushdb
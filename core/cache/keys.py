@@ -0,0 +1,105 @@
+"""
+ساخت cache key از فراخوانی تابع
+
+قبلاً cached برای هر فراخوانی آرگومان‌ها را با str() به هم می‌چسباند و
+SmartCacheManager هر بار json.dumps + MD5 اجرا می‌کرد. حالا key یک tuple
+hashable است:
+
+    (func_id, args, kwargs)
+
+که kwargs به صورت tuple مرتب شده (name, value) ذخیره می‌شود (توابعی که
+namespace دارند یک عضو چهارم هم دارند: generation namespace ها). در حالت معمول
+(آرگومان‌های hashable مثل str/int) هیچ serialization ای انجام نمی‌شود؛ فقط
+آرگومان‌های unhashable (list/dict/set) به معادل immutable تبدیل می‌شوند؛ نوع
+container در آن ثبت می‌شود ('__list__', ...) تا f([1, 2]) و f((1, 2)) یا
+f({'a': 1}) و f((('a', 1),)) key جدا داشته باشند.
+
+رشته قابل خواندن (render_key) فقط برای log، ذخیره روی دیسک و جستجوی substring
+در invalidate_pattern ساخته می‌شود و قالب آن همان قالب قبلی cached است:
+
+    func:arg1_arg2:k1=v1_k2=v2
+    func:arg1_arg2:k1=v1_k2=v2@gen1.gen2   (با namespace)
+
+⚠️ مثل هر key مبتنی بر hash، مقادیر برابر (1 و 1.0 و True) یک key می‌سازند
+"""
+
+from typing import Any, Dict, Hashable, Tuple
+
+CacheKey = Tuple[Hashable, ...]
+
+
+# انواع immutable رایج - بدون بررسی hash برگردانده می‌شوند
+_ATOMIC = frozenset((str, int, float, bool, bytes, type(None)))
+
+
+def _item_key(item):
+    return item[0]
+
+
+def _freeze(value: Any) -> Hashable:
+    """تبدیل بازگشتی مقدار unhashable به معادل immutable (list / dict / set با نوعشان)"""
+    if type(value) in _ATOMIC:
+        return value
+    if isinstance(value, tuple):
+        # همان شکلی که مسیر سریع make_key برای tuple های hashable نگه می‌دارد
+        return tuple(map(_freeze, value))
+    if isinstance(value, list):
+        return '__list__', tuple(map(_freeze, value))
+    if isinstance(value, dict):
+        items = [(k, _freeze(v)) for k, v in value.items()]
+        try:
+            items.sort(key=_item_key)
+        except TypeError:
+            # key های با نوع مختلف (مثلاً int و str) - مقایسه با repr
+            items.sort(key=lambda item: repr(item[0]))
+        return '__dict__', tuple(items)
+    if isinstance(value, set):
+        return '__set__', frozenset(map(_freeze, value))
+    if isinstance(value, frozenset):
+        return frozenset(map(_freeze, value))
+    try:
+        hash(value)
+    except TypeError:
+        return repr(value)
+    return value
+
+
+def make_key(func_id: Hashable, args: tuple, kwargs: Dict[str, Any],
+             generations: Tuple[int, ...] = ()) -> CacheKey:
+    """
+    ساخت key برای فراخوانی func_id(*args, **kwargs)
+
+    func_id معمولاً qualname تابع است (یک رشته ثابت که فقط یک بار ساخته می‌شود)
+
+    Args:
+        generations: generation namespace های تابع (NamespaceVersions.stamp)
+    """
+    kw = tuple(sorted(kwargs.items())) if kwargs else ()
+    try:
+        # مسیر سریع: همه آرگومان‌ها hashable هستند
+        hash(args)
+        hash(kw)
+    except TypeError:
+        args, kw = _freeze(args), _freeze(kw)
+    if generations:
+        return func_id, args, kw, generations
+    return func_id, args, kw
+
+
+def render_key(key: Hashable) -> str:
+    """
+    رشته پایدار و قابل خواندن برای key (برای log، persistence و pattern)
+
+    key های رشته‌ای (cache key ثابت یا خروجی key_func) بدون تغییر برگردانده می‌شوند.
+    """
+    if isinstance(key, str):
+        return key
+    if isinstance(key, tuple) and len(key) in (3, 4):
+        func_id, args, kw = key[:3]
+        args_str = '_'.join(str(arg) for arg in args)
+        kwargs_str = '_'.join(f"{k}={v}" for k, v in kw)
+        if len(key) == 4:
+            generations = '.'.join(str(generation) for generation in key[3])
+            return f"{func_id}:{args_str}:{kwargs_str}@{generations}"
+        return f"{func_id}:{args_str}:{kwargs_str}"
+    return str(key)
@@ -0,0 +1,113 @@
+"""
+namespace های نسخه‌دار برای invalidation با هزینه ثابت
+
+هر namespace (مثلاً 'DatabaseAdapter'، 'category:AR' یا 'weapon:AR:M4') یک
+شمارنده generation دارد. توابع cached شده generation namespace های خودشان را
+داخل key قرار می‌دهند:
+
+    (func_id, args, kwargs, (gen_1, gen_2, ...))
+
+invalidate کردن یک namespace فقط شمارنده را یک واحد زیاد می‌کند؛ از آن لحظه
+key های جدید با generation جدید ساخته می‌شوند و entry های قبلی دیگر قابل
+دسترسی نیستند. حذف واقعی آنها تنبل است (انقضای TTL یا eviction)، پس هزینه
+invalidation به تعداد entry های cache بستگی ندارد.
+
+مزیت دیگر: اگر namespace حین اجرای تابع bump شود، نتیجه با generation قدیمی
+ذخیره می‌شود و هیچوقت سرو نمی‌شود (race بین invalidate و محاسبه وجود ندارد).
+
+namespace های محدود (مثل 'weapon:AR:M4') فقط entry توابعی را کنار می‌گذارند که
+آنها را با cached(namespaces=...) اعلام کرده‌اند. widen() برای write ها namespace
+کلاس (مثلاً 'DatabaseAdapter') را هم اضافه می‌کند مگر همه متدهای cached شده آن
+کلاس namespace اعلام کرده باشند.
+
+⚠️ generation ها در snapshot ذخیره می‌شوند؛ بدون آن بعد از restart شمارنده‌ها
+از صفر شروع می‌شوند و entry های invalidate شده قبلی دوباره قابل دسترسی می‌شوند
+"""
+
+import threading
+from typing import Callable, Dict, Iterable, Optional, Set, Tuple
+
+
+class NamespaceVersions:
+    """شمارنده generation برای هر namespace (namespace های ثبت نشده generation صفر دارند)"""
+
+    def __init__(self):
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.bumps = 0
+        # کلاس -> متدهای cached شده و متدهایی که namespace اعلام نکرده‌اند
+        self._methods: Dict[str, Set[str]] = {}
+        self._unscoped: Dict[str, Set[str]] = {}
+        # callback(namespaces) بعد از هر bump (CacheEngine آن را به listener ها می‌رساند)
+        self.on_bump: Optional[Callable[[Tuple[str, ...]], None]] = None
+
+    def generation(self, namespace: str) -> int:
+        return self._generations.get(namespace, 0)
+
+    def stamp(self, namespaces: Tuple[str, ...]) -> Tuple[int, ...]:
+        """generation فعلی namespace ها به همان ترتیب (بدون lock - خواندن dict اتمیک است)"""
+        get = self._generations.get
+        return tuple([get(namespace, 0) for namespace in namespaces])
+
+    def bump(self, *namespaces: str) -> Dict[str, int]:
+        """
+        invalidate کردن namespace ها با افزایش generation
+
+        Returns:
+            generation جدید هر namespace
+        """
+        with self._lock:
+            for namespace in namespaces:
+                self._generations[namespace] = self._generations.get(namespace, 0) + 1
+            self.bumps += len(namespaces)
+            generations = {namespace: self._generations[namespace] for namespace in namespaces}
+        if self.on_bump is not None and namespaces:
+            self.on_bump(namespaces)
+        return generations
+
+    def register_method(self, owner: str, qualname: str, scoped: bool):
+        """ثبت متد cached شده کلاس owner (scoped: namespace های محدود اعلام کرده است)"""
+        with self._lock:
+            self._methods.setdefault(owner, set()).add(qualname)
+            unscoped = self._unscoped.setdefault(owner, set())
+            if scoped:
+                unscoped.discard(qualname)
+            else:
+                unscoped.add(qualname)
+
+    def widen(self, owner: str, namespaces: Iterable[str]) -> Tuple[str, ...]:
+        """
+        namespace هایی که یک write باید bump کند
+
+        namespace های محدود فقط وقتی کافی هستند که همه متدهای cached شده owner
+        آنها را اعلام کرده باشند؛ در غیر این صورت (یا اگر متدی ثبت نشده باشد)
+        owner هم bump می‌شود تا متدهای بدون namespace مقدار قدیمی سرو نکنند.
+        """
+        namespaces = as_namespaces(namespaces)
+        if owner in namespaces or (self._methods.get(owner) and not self._unscoped.get(owner)):
+            return namespaces
+        return (owner,) + namespaces
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._generations)
+
+    def restore(self, generations: Dict[str, int]):
+        """ادغام generation های ذخیره شده (هر namespace به بیشترین مقدار می‌رسد)"""
+        with self._lock:
+            for namespace, generation in generations.items():
+                if generation > self._generations.get(namespace, 0):
+                    self._generations[namespace] = generation
+
+    def __len__(self) -> int:
+        return len(self._generations)
+
+    def get_stats(self) -> Dict[str, int]:
+        return {'namespaces': len(self._generations), 'bumps': self.bumps}
+
+
+def as_namespaces(value: Iterable[str]) -> Tuple[str, ...]:
+    """نرمال کردن namespace ها به tuple (یک رشته تنها یک namespace است)"""
+    if isinstance(value, str):
+        return (value,)
+    return tuple(value)
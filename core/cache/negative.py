@@ -0,0 +1,27 @@
+"""
+Sentinel برای negative caching
+
+decorator ها قبلاً خروجی None را miss حساب می‌کردند، پس جستجوی سلاح/کد/کاربر
+ناموجود (غلط تایپی، دکمه‌های callback قدیمی) هر بار به دیتابیس می‌رفت. حالا
+به جای None مقدار NEGATIVE با TTL کوتاه جداگانه ذخیره می‌شود و در زمان hit
+دوباره به None تبدیل می‌شود.
+"""
+
+
+class _NegativeResult:
+    """نشانگر «نتیجه وجود ندارد» در cache"""
+
+    __slots__ = ()
+
+    def __repr__(self) -> str:
+        return 'NEGATIVE'
+
+    def __bool__(self) -> bool:
+        return False
+
+    def __reduce__(self):
+        # حفظ singleton بعد از pickle (مثلاً snapshot روی دیسک)
+        return 'NEGATIVE'
+
+
+NEGATIVE = _NegativeResult()
@@ -0,0 +1,103 @@
+"""
+Refresh پس‌زمینه برای حالت stale-while-revalidate
+
+وقتی یک entry منقضی شده ولی هنوز در بازه grace است، مقدار قدیمی بلافاصله
+برگردانده می‌شود و محاسبه مجدد در پس‌زمینه انجام می‌شود (thread pool برای
+توابع sync و Task روی event loop برای توابع async). برای هر key حداکثر یک
+refresh همزمان اجرا می‌شود.
+"""
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Set
+
+from utils.logger import get_logger
+
+logger = get_logger('cache', 'cache.log')
+
+
+class BackgroundRefresher:
+    """زمان‌بندی refresh پس‌زمینه با حذف درخواست‌های تکراری برای یک key"""
+
+    def __init__(self, max_workers: int = 4):
+        self._max_workers = max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._pending: Set[Hashable] = set()
+        # نگه داشتن reference به Task ها تا قبل از اتمام garbage collect نشوند
+        self._tasks: Set[asyncio.Task] = set()
+        self.scheduled = 0
+        self.skipped = 0
+        self.failures = 0
+
+    def _claim(self, key: Hashable) -> bool:
+        with self._lock:
+            if key in self._pending:
+                self.skipped += 1
+                return False
+            self._pending.add(key)
+            self.scheduled += 1
+            return True
+
+    def _release(self, key: Hashable):
+        with self._lock:
+            self._pending.discard(key)
+
+    def submit(self, key: Hashable, fn: Callable[[], Any]) -> bool:
+        """
+        اجرای fn در thread pool (اگر refresh دیگری برای key در جریان نباشد)
+
+        Returns:
+            True اگر refresh زمان‌بندی شد
+        """
+        if not self._claim(key):
+            return False
+
+        def run():
+            try:
+                fn()
+            except Exception as e:
+                self.failures += 1
+                logger.warning(f"Background refresh failed for {key}: {e}")
+            finally:
+                self._release(key)
+
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self._max_workers,
+                                                    thread_name_prefix='cache-refresh')
+        self._executor.submit(run)
+        return True
+
+    def submit_async(self, key: Hashable, coro_fn: Callable[[], Awaitable[Any]]) -> bool:
+        """
+        اجرای coro_fn به صورت Task روی event loop جاری
+
+        Returns:
+            True اگر refresh زمان‌بندی شد
+        """
+        if not self._claim(key):
+            return False
+
+        async def run():
+            try:
+                await coro_fn()
+            except Exception as e:
+                self.failures += 1
+                logger.warning(f"Background refresh failed for {key}: {e}")
+            finally:
+                self._release(key)
+
+        task = asyncio.get_running_loop().create_task(run())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return True
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            'swr_refreshes': self.scheduled,
+            'swr_skipped': self.skipped,
+            'swr_failures': self.failures,
+            'swr_pending': len(self._pending),
+        }
@@ -0,0 +1,36 @@
+"""
+serialization مشترک cache (snapshot روی دیسک و L2 حافظه مشترک)
+
+pickle با protocol آخر، به جز object های ثبت شده با register_target (مثل
+'db') که با نامشان ذخیره می‌شوند؛ بنابراین key متدهای DatabaseAdapter در
+process دیگر یا بعد از restart به instance همان process اشاره می‌کند.
+"""
+
+import io
+import pickle
+from typing import Any
+
+from .warming import get_target, target_name
+
+
+class _Pickler(pickle.Pickler):
+    def persistent_id(self, obj):
+        return target_name(obj)
+
+
+class _Unpickler(pickle.Unpickler):
+    def persistent_load(self, pid):
+        try:
+            return get_target(pid)
+        except KeyError:
+            raise pickle.UnpicklingError(f"unknown target {pid!r}")
+
+
+def dumps(obj: Any) -> bytes:
+    buffer = io.BytesIO()
+    _Pickler(buffer, pickle.HIGHEST_PROTOCOL).dump(obj)
+    return buffer.getvalue()
+
+
+def loads(data) -> Any:
+    return _Unpickler(io.BytesIO(data)).load()
@@ -0,0 +1,363 @@
+"""
+L2 cache در حافظه مشترک بین process های یک سرور
+
+وقتی چند worker روی یک سرور اجرا شوند، هر کدام نسخه خودش از لیست سلاح‌ها،
+اتچمنت‌ها و شمارش دسته‌ها را دارد و هر کدام جداگانه به Postgres می‌رود.
+SharedL2 یک hash table با اندازه ثابت در multiprocessing.shared_memory است که
+پشت region های CacheManager (با l2=True در REGIONS) قرار می‌گیرد:
+
+- miss در L1 قبل از اجرای تابع در L2 جستجو می‌شود و در صورت hit، مقدار با
+  TTL باقیمانده به L1 برگردانده می‌شود
+- هر set در region به L2 هم نوشته می‌شود (write-through)
+- invalidation های region های l2 و عملیات کل موتور (tag / namespace / key / clear / pattern)
+  با CacheBackend.on_invalidate روی L2 هم اعمال می‌شوند؛ با InvalidationBus هر process
+  invalidation های بقیه را هم دریافت می‌کند
+
+ساختار حافظه:
+
+    header   MAGIC، نسخه، تعداد slot، اندازه slot
+    slots    هر slot: seq، region، hash key، expiry، stale_until، تعداد tag ها،
+             طول key، طول مقدار، hash دقیق MAX_TAGS tag و سپس key و مقدار
+             pickle شده
+
+slot با hash key (blake2b روی key سریال شده، مستقل از PYTHONHASHSEED) انتخاب
+می‌شود و WAYS slot پشت سر هم بررسی می‌شوند. مقادیر بزرگ‌تر از slot در L2 ذخیره
+نمی‌شوند. زمان‌ها wall clock هستند چون monotonic بین process ها مشترک نیست.
+
+همزمانی: نویسنده‌ها با threading.Lock و flock روی یک فایل lock (بین process ها)
+سریالی می‌شوند. خواننده‌ها lock نمی‌گیرند (seqlock): نویسنده اول seq را فرد
+می‌کند، header و داده را می‌نویسد و seq زوج بعدی را آخر از همه جدا می‌نویسد؛
+خواننده seq قبل و بعد از خواندن را مقایسه می‌کند و در صورت تغییر، خواندن miss
+حساب می‌شود.
+
+hash ۶۴ بیتی هر tag (حداکثر MAX_TAGS، برای cached() معمولاً ۴ تا ۶) در header
+slot ذخیره می‌شود، پس invalidate_tag فقط entry های همان tag را حذف می‌کند؛
+entry با tag بیشتر در L2 نوشته نمی‌شود. invalidate_tag / clear همه header ها را
+بدون lock (مثل get) پیمایش می‌کنند و flock فقط برای بررسی دوباره و پاک کردن
+slot های پیدا شده گرفته می‌شود، تا پیمایش نویسنده‌های بقیه process ها را
+متوقف نکند.
+
+segment بعد از خروج process ها باقی می‌ماند (در /dev/shm) و process بعدی
+به آن وصل می‌شود؛ unlink() آن را حذف می‌کند.
+"""
+
+import fcntl
+import hashlib
+import os
+import struct
+import tempfile
+import threading
+import time
+import zlib
+from multiprocessing import shared_memory
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from utils.logger import get_logger
+from .backends import CacheBackend
+from .serialization import dumps, loads
+
+logger = get_logger('cache', 'cache.log')
+
+MAGIC = b'CDL2'
+FORMAT_VERSION = 2
+# magic, version, slot count, slot size
+_HEADER = struct.Struct('<4sHII')
+# seq, region id, key hash, expiry, stale_until, tag count, key length, value length
+_SLOT = struct.Struct('<IIQddIII')
+MAX_TAGS = 8
+_TAGS = struct.Struct(f'<{MAX_TAGS}Q')
+_SLOT_HEADER = _SLOT.size + _TAGS.size
+_DATA_OFFSET = 64
+_NO_TAGS = (0,) * MAX_TAGS
+
+
+def _region_id(region: str) -> int:
+    return zlib.crc32(region.encode('utf-8')) or 1
+
+
+def _tag_hash(tag: str) -> int:
+    return int.from_bytes(hashlib.blake2b(tag.encode('utf-8'), digest_size=8).digest(), 'little') or 1
+
+
+def _open_segment(name: str, size: int, create: bool) -> shared_memory.SharedMemory:
+    try:
+        return shared_memory.SharedMemory(name=name, create=create, size=size, track=False)
+    except TypeError:
+        # Python < 3.13: segment در resource_tracker ثبت می‌شود و با خروج process حذف می‌شود
+        segment = shared_memory.SharedMemory(name=name, create=create, size=size)
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(segment._name, 'shared_memory')
+        return segment
+
+
+class SharedL2(CacheBackend):
+    """
+    hash table با اندازه ثابت در حافظه مشترک (CacheBackend بین process های یک سرور)
+
+    Args:
+        name: نام segment (همه process های یک سرور با یک نام به یک L2 وصل می‌شوند)
+        slots: تعداد slot ها
+        slot_size: اندازه هر slot به بایت (حداکثر حجم key + مقدار سریال شده)
+    """
+
+    WAYS = 4
+    scope = 'host'
+
+    def __init__(self, name: str = 'codm_cache_l2', slots: int = 4096, slot_size: int = 16 * 1024):
+        self.name = name
+        self._lock = threading.Lock()
+        self._lock_file = open(os.path.join(tempfile.gettempdir(), f"{name}.lock"), 'a+b')
+        size = _DATA_OFFSET + slots * slot_size
+        with self._locked():
+            try:
+                self._segment = _open_segment(name, size, create=True)
+                _HEADER.pack_into(self._segment.buf, 0, MAGIC, FORMAT_VERSION, slots, slot_size)
+            except FileExistsError:
+                self._segment = _open_segment(name, 0, create=False)
+                magic, version, slots, slot_size = _HEADER.unpack_from(self._segment.buf, 0)
+                if magic != MAGIC or version != FORMAT_VERSION:
+                    self._segment.close()
+                    raise ValueError(f"Shared cache segment '{name}' has an incompatible layout")
+        self._buf = self._segment.buf
+        self.slots = slots
+        self.slot_size = slot_size
+        self._capacity = slot_size - _SLOT_HEADER
+        self._stats = {'hits': 0, 'misses': 0, 'sets': 0, 'too_large': 0, 'too_many_tags': 0,
+                       'unserializable': 0, 'replaced': 0, 'invalidated': 0, 'torn_reads': 0}
+
+    class _FileLock:
+        __slots__ = ('owner',)
+
+        def __init__(self, owner):
+            self.owner = owner
+
+        def __enter__(self):
+            self.owner._lock.acquire()
+            fcntl.flock(self.owner._lock_file, fcntl.LOCK_EX)
+
+        def __exit__(self, *exc):
+            fcntl.flock(self.owner._lock_file, fcntl.LOCK_UN)
+            self.owner._lock.release()
+
+    def _locked(self) -> '_FileLock':
+        return SharedL2._FileLock(self)
+
+    def _offset(self, index: int) -> int:
+        return _DATA_OFFSET + (index % self.slots) * self.slot_size
+
+    @staticmethod
+    def _hash(key_blob: bytes) -> int:
+        return int.from_bytes(hashlib.blake2b(key_blob, digest_size=8).digest(), 'little') or 1
+
+    # ---- خواندن ----
+
+    def get(self, region: str, key: Hashable) -> Optional[Tuple[Any, float, float, Tuple[str, ...]]]:
+        """
+        Returns:
+            (value, ttl باقیمانده, grace باقیمانده, tags) یا None
+        """
+        try:
+            key_blob = dumps(key)
+        except Exception:
+            self._stats['unserializable'] += 1
+            return None
+        key_hash = self._hash(key_blob)
+        region_id = _region_id(region)
+        buf = self._buf
+        now = time.time()
+        for way in range(self.WAYS):
+            offset = self._offset(key_hash + way)
+            seq, slot_region, slot_hash, expiry, stale_until, _, key_len, value_len = _SLOT.unpack_from(buf, offset)
+            if slot_hash != key_hash or slot_region != region_id or seq & 1:
+                continue
+            if stale_until <= now:
+                break
+            start = offset + _SLOT_HEADER
+            stored_key = bytes(buf[start:start + key_len])
+            data = bytes(buf[start + key_len:start + key_len + value_len])
+            if _SLOT.unpack_from(buf, offset)[0] != seq:
+                # نوشتن همزمان در process دیگر
+                self._stats['torn_reads'] += 1
+                break
+            if stored_key != key_blob:
+                continue
+            try:
+                value, tags = loads(data)
+            except Exception:
+                break
+            self._stats['hits'] += 1
+            return value, expiry - now, stale_until - expiry, tags
+        self._stats['misses'] += 1
+        return None
+
+    # ---- نوشتن ----
+
+    def set(self, region: str, key: Hashable, value: Any, ttl: float, grace: float = 0,
+            tags: Tuple[str, ...] = ()) -> bool:
+        """
+        نوشتن entry (مقادیر غیرقابل pickle یا بزرگ‌تر از slot نادیده گرفته می‌شوند)
+
+        Returns:
+            True اگر ذخیره شد
+        """
+        try:
+            key_blob = dumps(key)
+            data = dumps((value, tuple(tags)))
+        except Exception:
+            self._stats['unserializable'] += 1
+            return False
+        if len(key_blob) + len(data) > self._capacity:
+            self._stats['too_large'] += 1
+            return False
+        tag_hashes = tuple(dict.fromkeys(_tag_hash(tag) for tag in tags))
+        if len(tag_hashes) > MAX_TAGS:
+            # بدون hash همه tag ها invalidate_tag نمی‌تواند این entry را پیدا کند
+            self._stats['too_many_tags'] += 1
+            return False
+
+        key_hash = self._hash(key_blob)
+        region_id = _region_id(region)
+        now = time.time()
+        expiry = now + ttl
+        buf = self._buf
+        with self._locked():
+            # به ترتیب اولویت: همان key، slot خالی/منقضی، slot با کمترین زمان انقضا
+            match = free = oldest = None
+            oldest_expiry = float('inf')
+            for way in range(self.WAYS):
+                offset = self._offset(key_hash + way)
+                _, slot_region, slot_hash, _, stale_until, _, key_len, _ = _SLOT.unpack_from(buf, offset)
+                start = offset + _SLOT_HEADER
+                if (slot_hash == key_hash and slot_region == region_id
+                        and bytes(buf[start:start + key_len]) == key_blob):
+                    match = offset
+                    break
+                if not slot_hash or stale_until <= now:
+                    if free is None:
+                        free = offset
+                elif stale_until < oldest_expiry:
+                    oldest, oldest_expiry = offset, stale_until
+            target = match or free
+            if target is None:
+                target = oldest
+                self._stats['replaced'] += 1
+
+            seq = _SLOT.unpack_from(buf, target)[0]
+            # seq فرد: خواننده‌ها این slot را نادیده می‌گیرند
+            struct.pack_into('<I', buf, target, seq + 1)
+            _TAGS.pack_into(buf, target + _SLOT.size, *(tag_hashes + _NO_TAGS[len(tag_hashes):]))
+            start = target + _SLOT_HEADER
+            buf[start:start + len(key_blob)] = key_blob
+            buf[start + len(key_blob):start + len(key_blob) + len(data)] = data
+            _SLOT.pack_into(buf, target, seq + 1, region_id, key_hash, expiry, expiry + grace, len(tag_hashes),
+                            len(key_blob), len(data))
+            # seq زوج جدید آخر از همه و جدا نوشته می‌شود تا خواننده header نیمه‌کاره را نپذیرد
+            struct.pack_into('<I', buf, target, seq + 2)
+        self._stats['sets'] += 1
+        return True
+
+    def _clear_slot_locked(self, offset: int):
+        seq = _SLOT.unpack_from(self._buf, offset)[0]
+        struct.pack_into('<I', self._buf, offset, seq + 1)
+        _SLOT.pack_into(self._buf, offset, seq + 1, 0, 0, 0.0, 0.0, 0, 0, 0)
+        struct.pack_into('<I', self._buf, offset, seq + 2)
+
+    def delete(self, region: str, key: Hashable) -> bool:
+        try:
+            key_blob = dumps(key)
+        except Exception:
+            return False
+        key_hash = self._hash(key_blob)
+        region_id = _region_id(region)
+        with self._locked():
+            for way in range(self.WAYS):
+                offset = self._offset(key_hash + way)
+                _, slot_region, slot_hash, _, _, _, key_len, _ = _SLOT.unpack_from(self._buf, offset)
+                start = offset + _SLOT_HEADER
+                if (slot_hash == key_hash and slot_region == region_id
+                        and bytes(self._buf[start:start + key_len]) == key_blob):
+                    self._clear_slot_locked(offset)
+                    self._stats['invalidated'] += 1
+                    return True
+        return False
+
+    def _matches(self, offset: int, predicate) -> bool:
+        _, slot_region, slot_hash, _, _, tag_count, _, _ = _SLOT.unpack_from(self._buf, offset)
+        if not slot_hash:
+            return False
+        return predicate(slot_region, _TAGS.unpack_from(self._buf, offset + _SLOT.size)[:tag_count])
+
+    def _remove_where(self, predicate) -> int:
+        """
+        پیمایش بدون lock و پاک کردن slot های منطبق زیر flock
+
+        slot هایی که هنگام پیمایش در حال نوشتن هستند (seq فرد یا تغییر کرده) هم
+        کاندید می‌شوند و زیر lock دوباره بررسی می‌شوند.
+        """
+        buf = self._buf
+        candidates = []
+        for index in range(self.slots):
+            offset = self._offset(index)
+            seq = _SLOT.unpack_from(buf, offset)[0]
+            if seq & 1 or self._matches(offset, predicate) or _SLOT.unpack_from(buf, offset)[0] != seq:
+                candidates.append(offset)
+        if not candidates:
+            return 0
+        removed = 0
+        with self._locked():
+            for offset in candidates:
+                if self._matches(offset, predicate):
+                    self._clear_slot_locked(offset)
+                    removed += 1
+        self._stats['invalidated'] += removed
+        return removed
+
+    def invalidate_tag(self, tag: str) -> int:
+        """حذف entry هایی که tag را دارند (در همه region ها)"""
+        tag_hash = _tag_hash(tag)
+        return self._remove_where(lambda region_id, tag_hashes: tag_hash in tag_hashes)
+
+    def clear(self, region: Optional[str] = None) -> int:
+        """حذف entry های region (یا همه entry ها)"""
+        if region is None:
+            return self._remove_where(lambda region_id, tag_hashes: True)
+        target = _region_id(region)
+        return self._remove_where(lambda region_id, tag_hashes: region_id == target)
+
+    def get_stats(self) -> Dict[str, Any]:
+        used = 0
+        now = time.time()
+        for index in range(self.slots):
+            _, _, slot_hash, _, stale_until, _, _, _ = _SLOT.unpack_from(self._buf, self._offset(index))
+            if slot_hash and stale_until > now:
+                used += 1
+        return dict(self._stats, name=self.name, slots=self.slots, slot_size=self.slot_size, used_slots=used)
+
+    def close(self):
+        self._buf = None
+        self._segment.close()
+        self._lock_file.close()
+
+    def unlink(self):
+        """حذف segment از سیستم (process های متصل تا close به آن دسترسی دارند)"""
+        self._segment.unlink()
+
+
+def attach_shared_l2(engine=None, name: Optional[str] = None, slots: Optional[int] = None,
+                     slot_size: Optional[int] = None) -> SharedL2:
+    """
+    ساخت/اتصال به L2 و فعال کردن آن برای region های l2=True موتور cache
+
+    مقادیر پیش‌فرض از CACHE_L2_NAME / CACHE_L2_SLOTS / CACHE_L2_SLOT_BYTES
+    """
+    from .engine import get_engine
+
+    engine = engine or get_engine()
+    l2 = SharedL2(
+        name or os.getenv('CACHE_L2_NAME', 'codm_cache_l2'),
+        slots or int(os.getenv('CACHE_L2_SLOTS', '4096')),
+        slot_size or int(os.getenv('CACHE_L2_SLOT_BYTES', str(16 * 1024))),
+    )
+    engine.attach_l2(l2)
+    logger.info(f"Shared L2 cache attached: {l2.name} ({l2.slots} slots x {l2.slot_size} bytes)")
+    return l2
@@ -0,0 +1,122 @@
+"""
+Single-flight: یکی کردن فراخوانی‌های همزمان برای یک key
+
+وقتی یک key پرمصرف (مثل get_top_attachments) منقضی می‌شود، همه thread هایی
+که همزمان miss می‌خورند همان query را اجرا می‌کنند. با SingleFlight فقط اولین
+caller (leader) تابع را اجرا می‌کند و بقیه منتظر می‌مانند و همان نتیجه (یا همان
+exception) را دریافت می‌کنند.
+
+AsyncSingleFlight همین کار را برای coroutine ها روی event loop انجام می‌دهد.
+"""
+
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class _Call:
+    """یک فراخوانی در حال اجرا"""
+
+    __slots__ = ('event', 'result', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """اجرای حداکثر یک فراخوانی همزمان به ازای هر key"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """
+        اجرای fn برای key؛ اگر فراخوانی دیگری برای همین key در جریان باشد،
+        منتظر نتیجه آن می‌ماند
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                leader = True
+                self.executions += 1
+            else:
+                leader = False
+                self.coalesced += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            'flight_executions': self.executions,
+            'coalesced_calls': self.coalesced,
+            'in_flight': len(self._calls),
+        }
+
+
+class AsyncSingleFlight:
+    """
+    نسخه asyncio از SingleFlight
+
+    اولین coroutine یک Task می‌سازد و بقیه awaiter ها همان Task را await
+    می‌کنند. Task با asyncio.shield محافظت می‌شود تا cancel شدن یک awaiter
+    محاسبه مشترک را برای بقیه لغو نکند. هیچ lock ای گرفته نمی‌شود چون همه
+    عملیات روی یک event loop انجام می‌شود.
+    """
+
+    def __init__(self):
+        self._tasks: Dict[Hashable, asyncio.Task] = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, coro_fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        اجرای coro_fn برای key؛ اگر Task دیگری برای همین key روی همین loop
+        در جریان باشد، همان Task را await می‌کند
+        """
+        loop = asyncio.get_running_loop()
+        task = self._tasks.get(key)
+        if task is not None and not task.done() and task.get_loop() is loop:
+            self.coalesced += 1
+            return await asyncio.shield(task)
+
+        self.executions += 1
+        task = loop.create_task(coro_fn())
+        self._tasks[key] = task
+
+        def _forget(done_task, key=key):
+            if self._tasks.get(key) is done_task:
+                del self._tasks[key]
+
+        task.add_done_callback(_forget)
+        return await asyncio.shield(task)
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            'async_flight_executions': self.executions,
+            'async_coalesced_calls': self.coalesced,
+            'async_in_flight': len(self._tasks),
+        }
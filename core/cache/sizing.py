@@ -0,0 +1,73 @@
+"""
+تخمین حجم حافظه مقادیر cache
+
+sys.getsizeof فقط اندازه سطحی شیء را برمی‌گرداند و لیست اتچمنت‌های داخل
+یک مقدار را نمی‌بیند؛ این ماژول container ها را به صورت بازگشتی پیمایش می‌کند.
+estimate_size در هر set اجرا می‌شود، پس هزینه آن مستقل از اندازه مقدار محدود
+است: از container های بزرگ فقط SAMPLE_ITEMS عضو اول پیمایش و حجمشان به نسبت
+طول container بزرگ می‌شود (عضوهای یک لیست cache شده معمولاً هم‌شکل هستند)،
+و کل پیمایش حداکثر MAX_NODES گره است.
+"""
+
+import sys
+from itertools import islice
+from typing import Any
+
+# محدودیت پیمایش برای ثابت ماندن هزینه set روی مقادیر خیلی بزرگ
+MAX_DEPTH = 8
+MAX_NODES = 2_000
+# تعداد عضوهای نمونه از هر container
+SAMPLE_ITEMS = 32
+
+_CONTAINERS = (list, tuple, set, frozenset)
+
+
+def estimate_size(value: Any, max_depth: int = MAX_DEPTH, max_nodes: int = MAX_NODES,
+                  sample_items: int = SAMPLE_ITEMS) -> int:
+    """
+    تخمین حجم deep یک مقدار (بایت)
+
+    list/tuple/set/dict و اشیای دارای __dict__ پیمایش می‌شوند؛ اشیای تکراری
+    فقط یکبار شمرده می‌شوند. هر گره وزنی دارد (تعداد عضوهایی که نماینده آنهاست):
+    عضوهای نمونه یک container با n عضو وزن n / sample_items می‌گیرند. اگر تعداد
+    گره‌ها از max_nodes بیشتر شود، بقیه با میانگین گره‌های دیده شده تخمین زده می‌شوند.
+    """
+    seen = set()
+    total = 0.0
+    visited = 0
+    visited_weight = 0.0
+    pending_weight = 0.0
+    stack = [(value, 0, 1.0)]
+
+    while stack:
+        obj, depth, weight = stack.pop()
+        obj_id = id(obj)
+        if obj_id in seen:
+            continue
+        if visited >= max_nodes:
+            pending_weight += weight
+            continue
+        seen.add(obj_id)
+        visited += 1
+        visited_weight += weight
+        total += sys.getsizeof(obj) * weight
+
+        if depth >= max_depth:
+            continue
+        if isinstance(obj, dict):
+            count = len(obj)
+            child_weight = weight * max(1.0, count / sample_items)
+            for k, v in islice(obj.items(), sample_items):
+                stack.append((k, depth + 1, child_weight))
+                stack.append((v, depth + 1, child_weight))
+        elif isinstance(obj, _CONTAINERS):
+            count = len(obj)
+            child_weight = weight * max(1.0, count / sample_items)
+            for item in islice(obj, sample_items):
+                stack.append((item, depth + 1, child_weight))
+        elif hasattr(obj, '__dict__') and not isinstance(obj, type):
+            stack.append((obj.__dict__, depth + 1, weight))
+
+    if pending_weight and visited_weight:
+        total += pending_weight * (total / visited_weight)
+    return int(total)
@@ -4,16 +4,32 @@ Smart Cache System with Intelligent TTL Management
 """
 
 from functools import wraps
-from typing import Any, Dict, Optional, Callable
-import hashlib
-import json
-import time
+from typing import Any, Dict, Hashable, Optional, Iterable, List, Tuple
+import inspect
+import os
 import threading
-from collections import OrderedDict
 from utils.logger import get_logger
+from .cache_manager import CacheManager
+from .engine import CacheEngine, get_engine
+from .single_flight import SingleFlight, AsyncSingleFlight
+from .revalidate import BackgroundRefresher
+from .negative import NEGATIVE
+from .keys import make_key
+from .counters import StripedCounters
+from .adaptive_ttl import AdaptiveTTL
+from .dependencies import get_dependency_graph
+from .warming import function_id, get_tracker, register_function
 
 logger = get_logger('smart_cache', 'cache.log')
 
+# Indexes of the per-thread hot-path counters
+HITS, MISSES, STALE_HITS, SETS, NEGATIVE_HITS, NEGATIVE_SETS = range(6)
+_COUNTER_NAMES = ('hits', 'misses', 'stale_hits', 'sets', 'negative_hits', 'negative_sets')
+
+# Extra tag on every entry SmartCacheManager stores in the shared 'default'
+# region, so clear() can drop just those and leave get_cache()/cached() entries
+OWNED_TAG = 'smart_cache:owned'
+
 
 class SmartCacheManager:
     """
@@ -24,7 +40,12 @@ class SmartCacheManager:
     - Cache warming
     - Hit rate tracking
     - Thread-safe operations
-    - Memory-efficient (LRU Eviction)
+    - Memory-efficient (LRU eviction within a byte budget per data type)
+    - Tag index (data type, function name) for O(affected) invalidation
+    
+    Storage is an adapter over the shared CacheEngine: each data type has
+    its own region (capacity, eviction), sweeping is done by the engine's
+    maintenance scheduler, and invalidation applies to every region.
     """
     
     # TTL Configuration (in seconds)
@@ -52,188 +73,311 @@ class SmartCacheManager:
         'default': 300             # 5 min
     }
     
-    MAX_CACHE_SIZE = 10000  # Maximum number of entries
-    
-    def __init__(self):
-        self._cache: OrderedDict[str, Dict] = OrderedDict()
-        self._lock = threading.RLock()
-        self._stats = {
-            'hits': 0,
-            'misses': 0,
-            'sets': 0,
-            'evictions': 0,
-            'hit_rate': 0.0
-        }
+    # Negative TTL (in seconds) for None results of smart_cached functions:
+    # lookups for missing weapons/codes/users are cached briefly so repeated
+    # typos or stale callback buttons don't hit the database every time.
+    # Kept short so newly added data shows up quickly; 0 disables.
+    NEGATIVE_TTL_CONFIG = {
+        'categories': 60,
+        'weapon_list': 60,
+        'guides': 60,
+        'attachments': 30,
+        'top_attachments': 30,
+        'season_top': 30,
+        'user_data': 15,
+        'search_results': 30,
+        'default': 0
+    }
+    
+    # Adaptive TTL bounds (min, max) in seconds - only these data types are
+    # tuned; TTL_CONFIG is the starting point. Enabled with
+    # SMART_CACHE_ADAPTIVE_TTL=true (or adaptive_ttl=True)
+    ADAPTIVE_TTL_BOUNDS = {
+        'categories': (600, 6 * 3600),
+        'weapon_list': (300, 4 * 3600),
+        'guides': (300, 4 * 3600),
+        'attachments': (60, 3600),
+        'top_attachments': (120, 3600),
+        'season_top': (300, 2 * 3600),
+        'user_data': (30, 300),
+        'search_results': (60, 600),
+        'statistics': (60, 900),
+        'pending_count': (10, 60),
+        'online_users': (10, 30)
+    }
+    ADAPTIVE_INTERVAL = 60  # seconds per learning window
+    
+    def __init__(self, engine: Optional[CacheEngine] = None, adaptive_ttl: Optional[bool] = None):
+        # Entries live in the shared engine: one region per data type
+        # (unknown data types use the 'default' region)
+        self._engine = engine or get_engine()
+        self._default = self._engine.region('default')
+        # func_id -> region, filled by _key_id() so lookups never parse keys
+        self._routes: Dict[str, CacheManager] = {}
+        # Coalesces concurrent misses for the same key in smart_cached
+        self.single_flight = SingleFlight()
+        self.async_flight = AsyncSingleFlight()
+        # Background refreshes for stale-while-revalidate
+        self.refresher = BackgroundRefresher()
+        # Lookup counters are per-thread and only summed in get_stats()
+        self._counters = StripedCounters(_COUNTER_NAMES)
+        
+        # Adaptive TTL: learned from each data type region's hit/miss and
+        # invalidation counters once per ADAPTIVE_INTERVAL
+        if adaptive_ttl is None:
+            adaptive_ttl = os.getenv('SMART_CACHE_ADAPTIVE_TTL', 'false').lower() == 'true'
+        self.adaptive: Optional[AdaptiveTTL] = None
+        if adaptive_ttl:
+            self.adaptive = AdaptiveTTL(self.TTL_CONFIG, self.ADAPTIVE_TTL_BOUNDS)
+            self._engine.scheduler.add_job('adaptive_ttl', self.ADAPTIVE_INTERVAL, self._adapt_ttls)
+    
+    def get_ttl(self, data_type: str) -> int:
+        """
+        TTL used for a data type when none is given explicitly
+        """
+        if self.adaptive is not None:
+            return self.adaptive.ttl(data_type)
+        return self.TTL_CONFIG.get(data_type, self.TTL_CONFIG['default'])
+    
+    def _adapt_ttls(self):
+        """
+        Close the current learning window for every adaptive data type
+        """
+        regions = self._engine.regions()
+        for data_type in self.ADAPTIVE_TTL_BOUNDS:
+            region = regions.get(data_type)
+            if region is not None:
+                self.adaptive.observe(data_type, region.counts())
+    
+    def _region(self, data_type: Optional[str]) -> CacheManager:
+        """
+        Engine region holding a data type
+        """
+        if data_type in self.TTL_CONFIG:
+            return self._engine.region(data_type)
+        return self._default
+    
+    def _key_id(self, func_name: str, data_type: str = None) -> str:
+        """
+        Function part of the cache key (built once per decorated function)
         
-        # Start cleanup thread
-        self._start_cleanup_thread()
+        Also records which region keys with this func_id are routed to.
+        """
+        func_id = f"{func_name}@{data_type}" if data_type else func_name
+        if func_id not in self._routes:
+            self._routes[func_id] = self._region(data_type)
+        return func_id
     
-    def _make_key(self, func_name: str, args: tuple, kwargs: dict, data_type: str = None) -> str:
+    def _make_key(self, func_name: str, args: tuple, kwargs: dict, data_type: str = None) -> Hashable:
         """
         Generate unique cache key
+        
+        A hashable (func_id, args, kwargs) tuple - no json/MD5 per call.
+        render_key() gives the readable form used for logging and by
+        invalidate_pattern(), e.g. "get_weapons_in_category@weapon_list:smg:".
         """
-        key_data = {
-            'func': func_name,
-            'args': str(args),
-            'kwargs': str(sorted(kwargs.items())),
-            'type': data_type
-        }
-        key_str = json.dumps(key_data, sort_keys=True, default=str)
-        return hashlib.md5(key_str.encode()).hexdigest()
+        return make_key(self._key_id(func_name, data_type), args, kwargs)
+    
+    def _region_for(self, key: Hashable) -> CacheManager:
+        """
+        Region of a key: keys from _make_key are routed by their func_id,
+        any other key lives in the 'default' region
+        """
+        if type(key) is tuple:
+            region = self._routes.get(key[0])
+            if region is not None:
+                return region
+        return self._default
     
-    def get(self, key: str) -> Optional[Any]:
+    def get(self, key: Hashable) -> Optional[Any]:
         """
         Get value from cache
+        
+        Never waits for a lock (see CacheManager.get), but a local miss in
+        an l2 region goes to the L2 backend; use get_async() on the event loop.
         """
-        with self._lock:
-            if key in self._cache:
-                entry = self._cache[key]
-                
-                # Check expiry
-                if time.time() < entry['expires_at']:
-                    self._stats['hits'] += 1
-                    self._update_hit_rate()
-                    # Move to end (recently used)
-                    self._cache.move_to_end(key)
-                    logger.debug(f"Cache HIT: {key[:8]}... (TTL remaining: {entry['expires_at'] - time.time():.1f}s)")
-                    return entry['value']
-                else:
-                    # Expired - remove it
-                    del self._cache[key]
-                    self._stats['evictions'] += 1
-            
-            self._stats['misses'] += 1
-            self._update_hit_rate()
-            logger.debug(f"Cache MISS: {key[:8]}...")
-            return None
+        value = self._region_for(key).get(key)
+        self._counters.cell()[MISSES if value is None else HITS] += 1
+        return value
     
-    def set(self, key: str, value: Any, data_type: str = 'default', ttl: Optional[int] = None):
+    async def get_async(self, key: Hashable) -> Optional[Any]:
         """
-        Set value in cache with smart TTL and LRU eviction
+        get() for the event loop: the L2 lookup runs in a worker thread
         """
-        # Determine TTL
-        if ttl is None:
-            ttl = self.TTL_CONFIG.get(data_type, self.TTL_CONFIG['default'])
+        value = await self._region_for(key).get_async(key)
+        self._counters.cell()[MISSES if value is None else HITS] += 1
+        return value
+    
+    def get_many(self, keys: Iterable[Hashable]) -> Dict[Hashable, Any]:
+        """
+        Get several keys at once (e.g. everything one update needs)
         
-        with self._lock:
-            # LRU Eviction: If cache is full and key is new, remove oldest
-            if key not in self._cache and len(self._cache) >= self.MAX_CACHE_SIZE:
-                self._cache.popitem(last=False)  # Remove first (oldest) item
-                self._stats['evictions'] += 1
-                logger.debug("Cache full, evicted oldest entry")
-
-            self._cache[key] = {
-                'value': value,
-                'expires_at': time.time() + ttl,
-                'data_type': data_type,
-                'created_at': time.time()
-            }
-            # Move to end (recently used)
-            self._cache.move_to_end(key)
-            self._stats['sets'] += 1
-            
-        logger.debug(f"Cache SET: {key[:8]}... (type={data_type}, TTL={ttl}s)")
+        Keys are grouped by region so each region does a single L2 mget
+        for its local misses. Returns only the keys that were found.
+        """
+        by_region: Dict[int, Tuple[CacheManager, List[Hashable]]] = {}
+        for key in keys:
+            region = self._region_for(key)
+            by_region.setdefault(id(region), (region, []))[1].append(key)
+        found: Dict[Hashable, Any] = {}
+        requested = 0
+        for region, region_keys in by_region.values():
+            requested += len(region_keys)
+            found.update(region.get_many(region_keys))
+        cell = self._counters.cell()
+        cell[HITS] += len(found)
+        cell[MISSES] += requested - len(found)
+        return found
     
-    def delete(self, key: str):
+    def get_stale(self, key: Hashable) -> Tuple[Optional[Any], bool]:
         """
-        Delete specific key from cache
+        Lookup for stale-while-revalidate
+        
+        Returns (value, False) for a fresh entry, (value, True) for an
+        expired entry still inside its grace window, (None, False) otherwise.
         """
-        with self._lock:
-            if key in self._cache:
-                del self._cache[key]
-                logger.debug(f"Cache DELETE: {key[:8]}...")
+        value, stale = self._region_for(key).get_stale(key)
+        self._count_stale(value, stale)
+        return value, stale
     
-    def invalidate_pattern(self, pattern: str):
+    async def get_stale_async(self, key: Hashable) -> Tuple[Optional[Any], bool]:
         """
-        Invalidate all keys containing pattern
+        get_stale() for the event loop: the L2 lookup runs in a worker thread
         """
-        with self._lock:
-            keys_to_delete = []
-            
-            # Find matching keys
-            for key, entry in self._cache.items():
-                if pattern in entry.get('data_type', '') or pattern in key:
-                    keys_to_delete.append(key)
-            
-            # Delete them
-            for key in keys_to_delete:
-                del self._cache[key]
-            
-            if keys_to_delete:
-                logger.info(f"Cache INVALIDATE: {len(keys_to_delete)} keys with pattern '{pattern}'")
+        value, stale = await self._region_for(key).get_stale_async(key)
+        self._count_stale(value, stale)
+        return value, stale
     
-    def clear(self):
+    def _count_stale(self, value: Any, stale: bool):
+        if value is None:
+            self._counters.cell()[MISSES] += 1
+        else:
+            self._counters.cell()[STALE_HITS if stale else HITS] += 1
+    
+    def set(self, key: Hashable, value: Any, data_type: str = 'default', ttl: Optional[int] = None,
+            tags: Optional[Iterable[str]] = None, grace: int = 0):
         """
-        Clear entire cache
+        Set value in cache with smart TTL
+        
+        The entry is always indexed under its data_type; extra ``tags``
+        (e.g. the producing function name) can be given for invalidation.
+        ``grace`` keeps the value servable by get_stale() for that many
+        seconds after expiry. Capacity eviction is done by the region.
         """
-        with self._lock:
-            count = len(self._cache)
-            self._cache.clear()
-            logger.info(f"Cache CLEAR: {count} entries removed")
+        self._store(key, value, data_type, ttl, tags, grace, blocking=True)
     
-    def _cleanup_expired(self):
+    def set_nowait(self, key: Hashable, value: Any, data_type: str = 'default', ttl: Optional[int] = None,
+                   tags: Optional[Iterable[str]] = None, grace: int = 0) -> bool:
         """
-        Remove expired entries
+        Like set() but never waits for the lock and skips the L2 write-through
+        (for use on the event loop; set_async() does both without blocking it)
+        
+        Returns False when the lock was busy and nothing was stored.
         """
-        with self._lock:
-            current_time = time.time()
-            expired_keys = [
-                key for key, entry in self._cache.items()
-                if current_time >= entry['expires_at']
-            ]
-            
-            for key in expired_keys:
-                del self._cache[key]
-                self._stats['evictions'] += 1
-            
-            if expired_keys:
-                logger.debug(f"Cache CLEANUP: {len(expired_keys)} expired entries removed")
+        return self._store(key, value, data_type, ttl, tags, grace, blocking=False)
+    
+    async def set_async(self, key: Hashable, value: Any, data_type: str = 'default', ttl: Optional[int] = None,
+                        tags: Optional[Iterable[str]] = None, grace: int = 0):
+        """
+        set() for the event loop: a busy lock and the L2 write-through are
+        handled in a worker thread
+        """
+        if ttl is None:
+            ttl = self.get_ttl(data_type)
+        region = self._region_for(key)
+        await region.set_async(key, value, ttl, self._entry_tags(region, data_type, tags), grace)
+        self._counters.cell()[SETS] += 1
+    
+    def _entry_tags(self, region: CacheManager, data_type: str, tags: Optional[Iterable[str]]) -> Tuple[str, ...]:
+        entry_tags = (data_type,) + tuple(tags or ())
+        return entry_tags + (OWNED_TAG,) if region is self._default else entry_tags
+    
+    def _store(self, key: Hashable, value: Any, data_type: str, ttl: Optional[int],
+               tags: Optional[Iterable[str]], grace: int, blocking: bool) -> bool:
+        # Determine TTL
+        if ttl is None:
+            ttl = self.get_ttl(data_type)
+        region = self._region_for(key)
+        entry_tags = self._entry_tags(region, data_type, tags)
+        if blocking:
+            region.set(key, value, ttl, entry_tags, grace)
+        elif not region.set_nowait(key, value, ttl, entry_tags, grace):
+            return False
+        self._counters.cell()[SETS] += 1
+        return True
+    
+    def delete(self, key: Hashable):
+        """
+        Delete specific key from cache
+        """
+        self._region_for(key).delete(key)
     
-    def _start_cleanup_thread(self):
+    def invalidate_tag(self, tag: str) -> int:
+        """
+        Invalidate all entries registered under ``tag`` (in every region)
         """
-        Start background cleanup thread
+        return self._engine.invalidate_tag(tag)
+    
+    def invalidate_pattern(self, pattern: str):
         """
-        def cleanup_loop():
-            while True:
-                time.sleep(60)  # Cleanup every minute
-                try:
-                    self._cleanup_expired()
-                except Exception as e:
-                    logger.error(f"Cleanup error: {e}")
+        Invalidate all keys containing pattern (in every region)
         
-        thread = threading.Thread(target=cleanup_loop, daemon=True)
-        thread.start()
+        Exact tags (data types, function names) go through the index;
+        anything else falls back to a substring scan over the rendered keys,
+        which include the data type (func@data_type:args:kwargs).
+        """
+        self._engine.invalidate_pattern(pattern)
     
-    def _update_hit_rate(self):
+    def clear(self):
         """
-        Update hit rate statistics
+        Clear the data type regions and this manager's entries in 'default'
+        
+        'default' also backs get_cache()/cached(), so only the entries
+        tagged OWNED_TAG are dropped there (and in the L2 / on peers).
         """
-        total = self._stats['hits'] + self._stats['misses']
-        if total > 0:
-            self._stats['hit_rate'] = (self._stats['hits'] / total) * 100
+        for data_type in self.TTL_CONFIG:
+            region = self._region(data_type)
+            if region is not self._default:
+                region.clear()
+        self._default.invalidate_tag(OWNED_TAG)
     
-    def get_stats(self) -> Dict:
+    def _data_regions(self) -> Dict[str, CacheManager]:
         """
-        Get cache statistics
+        Data type -> region for the regions created so far
         """
-        with self._lock:
-            return {
-                **self._stats,
-                'entries': len(self._cache),
-                'memory_mb': self._estimate_memory() / (1024 * 1024)
-            }
+        regions = self._engine.regions()
+        return {data_type: regions[data_type] for data_type in self.TTL_CONFIG if data_type in regions}
     
-    def _estimate_memory(self) -> int:
+    def get_stats(self) -> Dict:
         """
-        Estimate memory usage (bytes)
+        Get cache statistics
+        
+        Memory figures come from the regions' running byte totals (deep size
+        computed once at set time), so this never walks the entries.
         """
-        # Rough estimation
-        import sys
-        total = 0
-        for key, entry in self._cache.items():
-            total += sys.getsizeof(key)
-            total += sys.getsizeof(entry)
-        return total
+        counts = self._counters.snapshot()
+        total = counts['hits'] + counts['misses']
+        regions = self._data_regions()
+        memory = sum(region.total_bytes for region in regions.values())
+        return {
+            **counts,
+            'evictions': sum(region.capacity_evictions for region in regions.values()),
+            'hit_rate': (counts['hits'] / total) * 100 if total else 0.0,
+            **self.single_flight.get_stats(),
+            **self.async_flight.get_stats(),
+            **self.refresher.get_stats(),
+            'entries': sum(len(region) for region in regions.values()),
+            'regions': {
+                data_type: {
+                    'entries': len(region),
+                    'bytes': region.total_bytes,
+                    'max_bytes': region.max_bytes,
+                }
+                for data_type, region in regions.items()
+            },
+            'memory_mb': memory / (1024 * 1024),
+            'adaptive_ttl': self.adaptive.get_stats() if self.adaptive is not None else None
+        }
     
     def warm_cache(self, db):
         """
@@ -253,18 +397,21 @@ class SmartCacheManager:
                 
                 # Cache top attachments for popular weapons (first 3)
                 for weapon in weapons[:3]:
-                    for mode in ['mp', 'br']:\n                        key = self._make_key('get_top_attachments', (category, weapon, mode), {}, 'top_attachments')
+                    for mode in ['mp', 'br']:
+                        key = self._make_key('get_top_attachments', (category, weapon, mode), {}, 'top_attachments')
                         attachments = db.get_top_attachments(category, weapon, mode)
                         self.set(key, attachments, 'top_attachments')
             
-            logger.info(f"Cache warming completed. {len(self._cache)} entries pre-loaded")
+            entries = sum(len(region) for region in self._data_regions().values())
+            logger.info(f"Cache warming completed. {entries} entries pre-loaded")
             
         except Exception as e:
             logger.error(f"Cache warming error: {e}")
 
 
 # Decorator for smart caching
-def smart_cached(data_type: str = 'default', ttl: Optional[int] = None):
+def smart_cached(data_type: str = 'default', ttl: Optional[int] = None, stale_while_revalidate: int = 0,
+                 negative_ttl: Optional[int] = None):
     """
     Smart cache decorator with automatic TTL selection
     
@@ -273,35 +420,122 @@ def smart_cached(data_type: str = 'default', ttl: Optional[int] = None):
         def get_weapons(category):
             # expensive database query
             return weapons
+    
+    Coroutine functions are supported: the awaited result is cached and
+    concurrent awaiters of the same key share one in-flight task.
+    
+    With ``stale_while_revalidate=N`` an expired value is still returned for
+    up to N seconds (the max-staleness bound) while a refresh runs in the
+    background (thread pool, or an asyncio task for coroutines).
+    
+    A None result is cached as a negative entry for ``negative_ttl`` seconds
+    (default: NEGATIVE_TTL_CONFIG for the data type, 0 disables) and is
+    counted separately as a negative hit.
     """
     def decorator(func):
-        # Get or create cache instance
-        if not hasattr(smart_cached, '_cache'):
-            smart_cached._cache = SmartCacheManager()
+        # Shared instance (same one get_smart_cache() returns)
+        cache = get_smart_cache()
+        entry_tags = (func.__name__,)
+        func_id = cache._key_id(func.__name__, data_type)
+        warm_id = function_id(func)
+        hot_keys = get_tracker()
+        grace = stale_while_revalidate
+        if negative_ttl is None:
+            miss_ttl = cache.NEGATIVE_TTL_CONFIG.get(data_type, cache.NEGATIVE_TTL_CONFIG['default'])
+        else:
+            miss_ttl = negative_ttl
         
-        cache = smart_cached._cache
+        def lookup(key):
+            # (value, stale) - get() never waits for the lock
+            if grace:
+                return cache.get_stale(key)
+            return cache.get(key), False
         
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            # Generate cache key
-            key = cache._make_key(func.__name__, args, kwargs, data_type)
-            
-            # Try to get from cache
-            cached_value = cache.get(key)
-            if cached_value is not None:
-                return cached_value
-            
-            # Execute function
-            result = func(*args, **kwargs)
-            
-            # Store in cache
-            cache.set(key, result, data_type, ttl)
-            
-            return result
+        async def lookup_async(key):
+            # Same as lookup() with the L2 lookup off the event loop
+            if grace:
+                return await cache.get_stale_async(key)
+            return await cache.get_async(key), False
+        
+        def unwrap(value):
+            # Negative entries are returned to the caller as None
+            if value is NEGATIVE:
+                cache._counters.cell()[NEGATIVE_HITS] += 1
+                return None
+            return value
+        
+        def entry_for(result):
+            # (value, ttl, grace) to store, or None when the result isn't cached
+            if result is None:
+                if not miss_ttl:
+                    return None
+                cache._counters.cell()[NEGATIVE_SETS] += 1
+                return NEGATIVE, miss_ttl, 0
+            return result, ttl, grace
+        
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def wrapper(*args, **kwargs):
+                # Generate cache key
+                key = make_key(func_id, args, kwargs)
+                
+                # Try to get from cache
+                cached_value, stale = await lookup_async(key)
+                if cached_value is not None and not stale:
+                    return unwrap(cached_value)
+                
+                async def load():
+                    hot_keys.record(warm_id, args, kwargs)
+                    result = await func(*args, **kwargs)
+                    entry = entry_for(result)
+                    if entry is not None:
+                        value, entry_ttl, entry_grace = entry
+                        # Busy lock and L2 write-through go to a worker thread, not the loop
+                        await cache.set_async(key, value, data_type, entry_ttl, entry_tags, entry_grace)
+                    return result
+                
+                if cached_value is not None:
+                    # Serve stale, refresh on the event loop
+                    cache.refresher.submit_async(key, lambda: cache.async_flight.do(key, load))
+                    return unwrap(cached_value)
+                
+                return await cache.async_flight.do(key, load)
+        else:
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                # Generate cache key
+                key = make_key(func_id, args, kwargs)
+                
+                # Try to get from cache
+                cached_value, stale = lookup(key)
+                if cached_value is not None and not stale:
+                    return unwrap(cached_value)
+                
+                def load():
+                    # Execute function (counted for startup warm up)
+                    hot_keys.record(warm_id, args, kwargs)
+                    result = func(*args, **kwargs)
+                    
+                    # Store in cache
+                    entry = entry_for(result)
+                    if entry is not None:
+                        value, entry_ttl, entry_grace = entry
+                        cache.set(key, value, data_type, entry_ttl, entry_tags, entry_grace)
+                    return result
+                
+                if cached_value is not None:
+                    # Serve stale, refresh in the thread pool
+                    cache.refresher.submit(key, lambda: cache.single_flight.do(key, load))
+                    return unwrap(cached_value)
+                
+                # Concurrent misses for the same key share one execution
+                return cache.single_flight.do(key, load)
         
         # Add invalidate method
-        wrapper.invalidate = lambda: cache.invalidate_pattern(func.__name__)
+        wrapper.invalidate = lambda: cache.invalidate_tag(func.__name__)
         wrapper.cache = cache
+        # Replayable by the startup warm up
+        register_function(func, wrapper)
         
         return wrapper
     
@@ -312,26 +546,41 @@ def invalidate_on_change(patterns: list):
     """
     Decorator to invalidate cache when data changes
     
+    Patterns that name an entity of the dependency graph ('attachment',
+    'weapon', 'category', ...) invalidate that entity and everything derived
+    from it; other patterns are matched against tags / keys as before.
+    
     Usage:
         @invalidate_on_change(['weapon', 'attachment'])
         def add_weapon(category, name):
             # add weapon
             return success
     """
+    def invalidate(result):
+        # If successful, invalidate cache
+        if result:
+            cache = get_smart_cache()
+            graph = get_dependency_graph()
+            for pattern in patterns:
+                if pattern in graph:
+                    graph.invalidate(pattern)
+                else:
+                    cache.invalidate_pattern(pattern)
+    
     def decorator(func):
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            # Execute function
-            result = func(*args, **kwargs)
-            
-            # If successful, invalidate cache
-            if result:
-                cache = getattr(smart_cached, '_cache', None)
-                if cache:
-                    for pattern in patterns:
-                        cache.invalidate_pattern(pattern)
-            
-            return result
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def wrapper(*args, **kwargs):
+                result = await func(*args, **kwargs)
+                invalidate(result)
+                return result
+        else:
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                # Execute function
+                result = func(*args, **kwargs)
+                invalidate(result)
+                return result
         
         return wrapper
     
@@ -340,6 +589,7 @@ def invalidate_on_change(patterns: list):
 
 # Global cache instance
 _smart_cache_instance = None
+_smart_cache_lock = threading.Lock()
 
 
 def get_smart_cache() -> SmartCacheManager:
@@ -348,5 +598,7 @@ def get_smart_cache() -> SmartCacheManager:
     """
     global _smart_cache_instance
     if _smart_cache_instance is None:
-        _smart_cache_instance = SmartCacheManager()
+        with _smart_cache_lock:
+            if _smart_cache_instance is None:
+                _smart_cache_instance = SmartCacheManager()
     return _smart_cache_instance
@@ -0,0 +1,251 @@
+"""
+snapshot دودویی cache روی دیسک برای restart سریع
+
+بعد از هر deploy همه region های CacheEngine خالی هستند و دقایق اول بعد از
+restart تمام درخواست‌ها به Postgres می‌رسند. این ماژول محتوای region ها را
+در یک فایل دودویی ذخیره می‌کند (هنگام shutdown و به صورت دوره‌ای با
+MaintenanceScheduler) و در startup برمی‌گرداند.
+
+قالب فایل:
+
+    header   MAGIC، نسخه، تعداد entry، زمان ذخیره، offset جدول index
+    values   مقدار pickle شده هر entry پشت سر هم
+    index    pickle زوج (generation namespace ها، لیستی از (region, key pickle
+             شده, tags, expires_at, stale_until, size, offset, length))
+
+زمان‌های انقضا به صورت wall clock (time.time) ذخیره می‌شوند و هنگام load به
+time.monotonic همان process تبدیل می‌شوند، پس TTL باقیمانده حفظ می‌شود و
+entry هایی که در فاصله restart منقضی شده‌اند load نمی‌شوند. generation
+namespace ها هم ذخیره و قبل از entry ها برگردانده می‌شوند تا key های
+invalidate شده در اجرای قبلی دوباره قابل دسترسی نشوند.
+
+load فایل را mmap می‌کند و فقط index را می‌خواند؛ مقدار هر entry اولین باری
+که خوانده شود از mmap unpickle می‌شود (_SnapshotEntry)، بنابراین زمان load
+به تعداد entry ها بستگی دارد نه حجم مقادیر. entry هایی که هیچوقت خوانده
+نشوند در snapshot بعدی بدون unpickle دوباره همان بایت‌ها نوشته می‌شوند.
+
+object های ثبت شده با register_target (مثل 'db') در key ها با نامشان ذخیره
+می‌شوند، پس key متدهای DatabaseAdapter بعد از restart به instance جدید اشاره
+می‌کنند. entry هایی که key یا مقدارشان قابل pickle نیست نادیده گرفته می‌شوند.
+
+⚠️ فایل با pickle خوانده می‌شود؛ فقط snapshot هایی که خود bot نوشته load شوند
+"""
+
+import mmap
+import os
+import pickle
+import struct
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from utils.logger import get_logger
+from .cache_manager import CacheEntry
+from .engine import CacheEngine, get_engine
+from .serialization import dumps as _dumps, loads as _loads
+
+logger = get_logger('cache', 'cache.log')
+
+MAGIC = b'CDMS'
+FORMAT_VERSION = 2
+# magic, version, entry count, saved_at (wall clock), index offset
+_HEADER = struct.Struct('<4sHIdQ')
+
+_save_lock = threading.Lock()
+_stats: Dict[str, Optional[Dict[str, Any]]] = {'last_load': None, 'last_save': None}
+
+
+_value_slot = CacheEntry.value
+
+
+class _SnapshotEntry(CacheEntry):
+    """
+    CacheEntry که مقدارش تا اولین خواندن در mmap باقی می‌ماند
+
+    value یک property است که بار اول بایت‌ها را unpickle و در slot اصلی
+    CacheEntry ذخیره می‌کند؛ entry های معمولی هیچ هزینه اضافه‌ای ندارند.
+    اگر دو thread همزمان بخوانند هر دو unpickle می‌کنند و یکی باقی می‌ماند.
+    """
+
+    __slots__ = ('_source',)
+
+    def __init__(self, source, expiry: float, stale_until: float, tags, size: int):
+        # CacheEntry.__init__ صدا زده نمی‌شود: مقدار هنوز خوانده نشده است
+        self._source = source
+        self.expiry = expiry
+        self.stale_until = stale_until
+        self.tags = tags
+        self.size = size
+        self.last_access = time.monotonic()
+        self.hits = 0
+
+    def _get_value(self):
+        source = self._source
+        if source is not None:
+            buffer, offset, length = source
+            _value_slot.__set__(self, _loads(buffer[offset:offset + length]))
+            self._source = None
+        return _value_slot.__get__(self)
+
+    def _set_value(self, value):
+        _value_slot.__set__(self, value)
+        self._source = None
+
+    value = property(_get_value, _set_value)
+
+    def raw(self) -> Optional[bytes]:
+        """بایت‌های pickle شده اگر مقدار هنوز خوانده نشده باشد"""
+        source = self._source
+        if source is None:
+            return None
+        buffer, offset, length = source
+        return buffer[offset:offset + length]
+
+
+def save_snapshot(path: str, engine: Optional[CacheEngine] = None) -> Dict[str, Any]:
+    """
+    نوشتن entry های زنده همه region ها در path (اتمیک با os.replace)
+
+    Returns:
+        گزارش: entries / skipped / bytes / duration_ms
+    """
+    engine = engine or get_engine()
+    started = time.perf_counter()
+    entries = skipped = 0
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+
+    with _save_lock:
+        wall_now = time.time()
+        mono_now = time.monotonic()
+        index = []
+        with open(tmp_path, 'wb') as f:
+            f.write(bytes(_HEADER.size))
+            offset = _HEADER.size
+            for name, region in engine.regions().items():
+                for key, entry in region.items():
+                    if entry.stale_until <= mono_now:
+                        continue
+                    try:
+                        key_blob = _dumps(key)
+                        blob = entry.raw() if isinstance(entry, _SnapshotEntry) else None
+                        if blob is None:
+                            blob = _dumps(entry.value)
+                    except Exception:
+                        skipped += 1
+                        continue
+                    f.write(blob)
+                    index.append((
+                        name, key_blob, entry.tags,
+                        wall_now + (entry.expiry - mono_now),
+                        wall_now + (entry.stale_until - mono_now),
+                        entry.size, offset, len(blob),
+                    ))
+                    offset += len(blob)
+            entries = len(index)
+            # بعد از کپی entry ها: generation ذخیره شده هیچوقت از generation داخل key ها عقب‌تر نیست
+            generations = engine.namespaces.snapshot()
+            f.write(pickle.dumps((generations, index), pickle.HIGHEST_PROTOCOL))
+            size = f.tell()
+            f.seek(0)
+            f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, entries, wall_now, offset))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    report = {
+        'entries': entries,
+        'skipped': skipped,
+        'bytes': size,
+        'duration_ms': round((time.perf_counter() - started) * 1000, 1),
+        'at': wall_now,
+    }
+    _stats['last_save'] = report
+    logger.info(
+        f"Cache snapshot saved: {entries} entries ({size} bytes) in {report['duration_ms']}ms "
+        f"- skipped={skipped}"
+    )
+    return report
+
+
+def load_snapshot(path: str, engine: Optional[CacheEngine] = None) -> Dict[str, Any]:
+    """
+    برگرداندن entry های snapshot به region ها با TTL باقیمانده
+
+    entry هایی که الان در cache هستند بازنویسی نمی‌شوند.
+
+    Returns:
+        گزارش: entries / loaded / expired / skipped / bytes / duration_ms
+        (entries=0 اگر فایل نباشد یا قالبش متفاوت باشد)
+    """
+    engine = engine or get_engine()
+    started = time.perf_counter()
+    report = {'entries': 0, 'loaded': 0, 'expired': 0, 'skipped': 0, 'bytes': 0}
+
+    try:
+        with open(path, 'rb') as f:
+            # mmap بعد از بسته شدن فایل معتبر می‌ماند و با آخرین entry خوانده نشده آزاد می‌شود
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except FileNotFoundError:
+        return report
+    except (OSError, ValueError) as e:
+        # ValueError: فایل خالی
+        logger.warning(f"Could not read cache snapshot {path}: {e}")
+        return report
+
+    try:
+        magic, version, count, saved_at, index_offset = _HEADER.unpack_from(buffer)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            return report
+        generations, index = pickle.loads(buffer[index_offset:])
+    except Exception as e:
+        logger.warning(f"Corrupt cache snapshot {path}: {e}")
+        return report
+    engine.namespaces.restore(generations)
+    report['entries'] = count
+    report['bytes'] = len(buffer)
+
+    wall_now = time.time()
+    mono_now = time.monotonic()
+    for name, key_blob, tags, expires_at, stale_until, size, offset, length in index:
+        if stale_until <= wall_now:
+            report['expired'] += 1
+            continue
+        try:
+            key = _loads(key_blob)
+        except Exception:
+            report['skipped'] += 1
+            continue
+        entry = _SnapshotEntry(
+            (buffer, offset, length),
+            mono_now + (expires_at - wall_now),
+            mono_now + (stale_until - wall_now),
+            tags, size,
+        )
+        if engine.region(name).restore(key, entry):
+            report['loaded'] += 1
+        else:
+            report['skipped'] += 1
+
+    report['age'] = round(wall_now - saved_at, 1)
+    report['duration_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    _stats['last_load'] = report
+    logger.info(
+        f"Cache snapshot loaded: {report['loaded']}/{count} entries in {report['duration_ms']}ms "
+        f"(age={report['age']}s, expired={report['expired']}, skipped={report['skipped']})"
+    )
+    return report
+
+
+def schedule_snapshots(path: str, interval: float, engine: Optional[CacheEngine] = None):
+    """ذخیره دوره‌ای snapshot با MaintenanceScheduler موتور cache"""
+    engine = engine or get_engine()
+    engine.scheduler.add_job('snapshot_save', interval, lambda: save_snapshot(path, engine))
+
+
+def get_snapshot_stats() -> Dict[str, Optional[Dict[str, Any]]]:
+    """گزارش آخرین load و save (شامل duration_ms)"""
+    return dict(_stats)
@@ -0,0 +1,58 @@
+"""
+Index ثانویه tag → key ها برای invalidate سریع
+
+به جای جستجوی substring روی همه key ها، هر entry هنگام set زیر چند tag
+(نام تابع، دسته، سلاح، mode و ...) ثبت می‌شود و invalidate فقط key های
+همان tag را لمس می‌کند - هزینه متناسب با تعداد key های تحت تاثیر است.
+
+⚠️ این کلاس thread-safe نیست؛ صاحب index باید lock خودش را نگه دارد
+"""
+
+from typing import Dict, Hashable, Iterable, Set
+
+
+class TagIndex:
+    """نگاشت tag به مجموعه key هایی که زیر آن ثبت شده‌اند"""
+
+    __slots__ = ('_keys_by_tag',)
+
+    def __init__(self):
+        self._keys_by_tag: Dict[str, Set[Hashable]] = {}
+
+    def add(self, key: Hashable, tags: Iterable[str]):
+        """ثبت key زیر tag ها"""
+        for tag in tags:
+            keys = self._keys_by_tag.get(tag)
+            if keys is None:
+                self._keys_by_tag[tag] = {key}
+            else:
+                keys.add(key)
+
+    def discard(self, key: Hashable, tags: Iterable[str]):
+        """حذف key از tag ها (بعد از حذف/انقضا/بازنویسی entry)"""
+        for tag in tags:
+            keys = self._keys_by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_tag[tag]
+
+    def pop(self, tag: str) -> Set[Hashable]:
+        """برداشتن و برگرداندن همه key های یک tag"""
+        return self._keys_by_tag.pop(tag, set())
+
+    def keys_for(self, tag: str) -> Set[Hashable]:
+        """key های یک tag بدون تغییر index"""
+        return self._keys_by_tag.get(tag, set())
+
+    def tags(self) -> Iterable[str]:
+        return self._keys_by_tag.keys()
+
+    def clear(self):
+        self._keys_by_tag.clear()
+
+    def __contains__(self, tag: str) -> bool:
+        return tag in self._keys_by_tag
+
+    def __len__(self) -> int:
+        return len(self._keys_by_tag)
@@ -0,0 +1,136 @@
+"""
+رتبه‌بندی top-K افزایشی در حافظه
+
+برای رتبه‌بندی‌هایی مثل محبوب‌ترین سلاح‌ها یا فعال‌ترین کاربران که با هر
+رویداد (approve / like) یک واحد تغییر می‌کنند، اجرای GROUP BY روی کل جدول
+در هر خواندن لازم نیست. IncrementalTopK دو ساختار نگه می‌دارد:
+
+    counts   امتیاز همه item ها (dict)
+    top      k item برتر و یک min-heap روی آنها برای پیدا کردن کف رتبه‌بندی
+
+افزایش امتیاز O(log k) است: item داخل top فقط امتیازش به‌روز می‌شود و item
+بیرونی اگر از کف بیشتر شود جای کمترین عضو را می‌گیرد. کاهش امتیاز یک عضو top
+(reject بعد از approve، حذف لایک) ممکن است item بیرونی را جلو بیندازد، پس top
+علامت dirty می‌خورد و در خواندن بعدی با nlargest روی counts دوباره ساخته
+می‌شود؛ این رویدادها نادر هستند.
+
+heap تنبل است: به‌روزرسانی امتیاز عضو top یک entry جدید push می‌کند و entry های
+قدیمی هنگام رسیدن به سر heap دور ریخته می‌شوند.
+"""
+
+import heapq
+import itertools
+import threading
+from operator import itemgetter
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+
+
+class IncrementalTopK:
+    """
+    k item با بیشترین امتیاز، به‌روز شونده با delta
+
+    Args:
+        k: اندازه رتبه‌بندی نگه داشته شده (بیشترین limit قابل خواندن)
+    """
+
+    def __init__(self, k: int = 100):
+        self.k = k
+        self._counts: Dict[Hashable, int] = {}
+        self._top: Dict[Hashable, int] = {}
+        # (score, seq, item) - entry هایی که score آنها با _top یکی نیست کهنه هستند
+        self._heap: List[Tuple[int, int, Hashable]] = []
+        self._seq = itertools.count()
+        self._dirty = False
+        # رتبه‌بندی مرتب شده تا تغییر بعدی
+        self._ranking: Optional[List[Tuple[Hashable, int]]] = None
+        self._lock = threading.Lock()
+        self.rebuilds = 0
+
+    @classmethod
+    def from_counts(cls, counts: Iterable[Tuple[Hashable, int]], k: int = 100) -> 'IncrementalTopK':
+        """ساخت از امتیازهای کامل (مثلاً نتیجه یک GROUP BY)"""
+        topk = cls(k)
+        topk._counts = {item: score for item, score in counts if score > 0}
+        topk._rebuild_locked()
+        return topk
+
+    def _push_locked(self, item: Hashable, score: int):
+        self._top[item] = score
+        heapq.heappush(self._heap, (score, next(self._seq), item))
+        if len(self._heap) > 4 * self.k + 64:
+            # فشرده کردن entry های کهنه
+            self._heap = [(s, next(self._seq), i) for i, s in self._top.items()]
+            heapq.heapify(self._heap)
+
+    def _floor_locked(self) -> Tuple[int, Hashable]:
+        """کمترین عضو top"""
+        heap = self._heap
+        while True:
+            score, _, item = heap[0]
+            if self._top.get(item) == score:
+                return score, item
+            heapq.heappop(heap)
+
+    def _rebuild_locked(self):
+        self._top = dict(heapq.nlargest(self.k, self._counts.items(), key=itemgetter(1)))
+        self._heap = [(score, next(self._seq), item) for item, score in self._top.items()]
+        heapq.heapify(self._heap)
+        self._dirty = False
+        self._ranking = None
+        self.rebuilds += 1
+
+    def add(self, item: Hashable, delta: int = 1) -> int:
+        """
+        تغییر امتیاز item
+
+        Returns:
+            امتیاز جدید (item با امتیاز صفر یا منفی حذف می‌شود)
+        """
+        with self._lock:
+            score = self._counts.get(item, 0) + delta
+            if score > 0:
+                self._counts[item] = score
+            else:
+                self._counts.pop(item, None)
+            self._ranking = None
+            if self._dirty:
+                return score
+            if item in self._top:
+                if delta < 0:
+                    self._dirty = True
+                else:
+                    self._push_locked(item, score)
+            elif score > 0:
+                if len(self._top) < self.k:
+                    self._push_locked(item, score)
+                else:
+                    floor_score, floor_item = self._floor_locked()
+                    if score > floor_score:
+                        heapq.heappop(self._heap)
+                        del self._top[floor_item]
+                        self._push_locked(item, score)
+            return score
+
+    def score(self, item: Hashable) -> int:
+        return self._counts.get(item, 0)
+
+    def top(self, limit: Optional[int] = None) -> List[Tuple[Hashable, int]]:
+        """
+        (item, score) های برتر به ترتیب نزولی امتیاز
+
+        limit بیشتر از k فقط k item برمی‌گرداند.
+        """
+        ranking = self._ranking
+        if ranking is None:
+            with self._lock:
+                if self._dirty:
+                    self._rebuild_locked()
+                ranking = sorted(self._top.items(), key=itemgetter(1), reverse=True)
+                self._ranking = ranking
+        return ranking[:limit] if limit is not None else list(ranking)
+
+    def __len__(self) -> int:
+        return len(self._counts)
+
+    def get_stats(self) -> Dict[str, int]:
+        return {'items': len(self._counts), 'k': self.k, 'heap': len(self._heap), 'rebuilds': self.rebuilds}
@@ -3,20 +3,213 @@ User Attachments Cache Manager
 مدیریت Cache برای بهبود Performance سیستم اتچمنت کاربران
 """
 
+import heapq
 import time
-import json
-from typing import Dict, Any, Optional, List
+import threading
+from operator import itemgetter
+from typing import Callable, Dict, Any, Optional, List, Tuple
 from datetime import datetime, timedelta
-from functools import wraps
-from threading import Lock
 from utils.logger import get_logger
+from .cache_manager import cached
+from .engine import get_engine
+from .negative import NEGATIVE
+from .topk import IncrementalTopK
 
 logger = get_logger('ua_cache', 'cache.log')
 
+# ستون‌های شمارشی ردیف ua_stats_cache (id=1)
+STATS_COLUMNS = (
+    'total_attachments', 'pending_count', 'approved_count', 'rejected_count',
+    'total_users', 'active_users', 'banned_users', 'br_count', 'mp_count',
+    'total_likes', 'total_reports', 'pending_reports',
+    'last_week_submissions', 'last_week_approvals',
+)
+
+# محاسبه کامل آمار (فقط در reconcile_stats)
+STATS_QUERY = """
+    WITH stats AS (
+        SELECT 
+            COUNT(*) as total_attachments,
+            COUNT(CASE WHEN status = 'pending' THEN 1 END) as pending_count,
+            COUNT(CASE WHEN status = 'approved' THEN 1 END) as approved_count,
+            COUNT(CASE WHEN status = 'rejected' THEN 1 END) as rejected_count,
+            COUNT(CASE WHEN mode = 'br' AND status = 'approved' THEN 1 END) as br_count,
+            COUNT(CASE WHEN mode = 'mp' AND status = 'approved' THEN 1 END) as mp_count,
+            COUNT(DISTINCT user_id) as total_users,
+            COALESCE(SUM(like_count), 0) as total_likes,
+            COALESCE(SUM(report_count), 0) as total_reports,
+            COUNT(CASE WHEN submitted_at >= (CURRENT_TIMESTAMP - INTERVAL '7 days') THEN 1 END) as last_week_submissions,
+            COUNT(CASE WHEN approved_at >= (CURRENT_TIMESTAMP - INTERVAL '7 days') AND status = 'approved' THEN 1 END) as last_week_approvals
+        FROM user_attachments
+    ),
+    banned AS (
+        SELECT COUNT(*) as banned_users
+        FROM user_submission_stats 
+        WHERE is_banned = TRUE
+    ),
+    reports AS (
+        SELECT COUNT(*) as pending_reports
+        FROM user_attachment_reports
+        WHERE status = 'pending'
+    )
+    SELECT 
+        s.*,
+        b.banned_users,
+        r.pending_reports,
+        s.total_users - b.banned_users as active_users
+    FROM stats s, banned b, reports r
+"""
+
+# CTE و ردیف ua_stats_cache در یک statement (یک snapshot): snapshot_* مقدار افزایشی
+# در لحظه‌ای است که CTE دیده، پس delta های بعد از آن = مقدار فعلی - snapshot_*
+STATS_SNAPSHOT_QUERY = f"""
+    SELECT computed.*, {', '.join(f'snapshot.{column} AS snapshot_{column}' for column in STATS_COLUMNS)}
+    FROM ({STATS_QUERY}) AS computed
+    LEFT JOIN ua_stats_cache snapshot ON snapshot.id = 1
+"""
+
+# بازه reconcile دوره‌ای آمار و رتبه‌بندی‌ها (ثانیه)
+STATS_RECONCILE_INTERVAL = 900
+# بازه ذخیره رتبه‌بندی‌های تغییر کرده در جداول ua_top_*_cache (ثانیه)
+RANKINGS_PERSIST_INTERVAL = 60
+# اندازه رتبه‌بندی‌های درون حافظه (بیشترین limit قابل خواندن)
+TOP_CAPACITY = 100
+
+
+def replace_table_rows(cursor, table: str, columns: Tuple[str, ...], rows: List[Tuple]) -> Dict[str, Any]:
+    """
+    جایگزینی کامل محتوای یک جدول cache داخل تراکنش جاری cursor
+    
+    ردیف‌ها با یک executemany در یک temp table (staging) نوشته می‌شوند و سپس
+    جدول اصلی با DELETE و INSERT ... SELECT از staging جایگزین می‌شود. چون هر
+    دو در یک تراکنش هستند خواننده‌ها تا commit محتوای قبلی را می‌بینند (جدول
+    هیچوقت خالی دیده نمی‌شود). LOCK با حالت SHARE ROW EXCLUSIVE refresh های
+    همزمان process های دیگر را سریالی می‌کند ولی خواننده‌ها را متوقف نمی‌کند
+    (بر خلاف swap با ALTER TABLE RENAME که ACCESS EXCLUSIVE می‌گیرد).
+    
+    Returns:
+        rows / stage_ms / swap_ms
+    """
+    names = ', '.join(columns)
+    staging = f"{table}_staging"
+    started = time.perf_counter()
+    cursor.execute(f"LOCK TABLE {table} IN SHARE ROW EXCLUSIVE MODE")
+    cursor.execute(f"CREATE TEMP TABLE {staging} (LIKE {table} INCLUDING DEFAULTS) ON COMMIT DROP")
+    if rows:
+        cursor.executemany(
+            f"INSERT INTO {staging} ({names}) VALUES ({', '.join(['%s'] * len(columns))})",
+            rows,
+        )
+    staged = time.perf_counter()
+    cursor.execute(f"DELETE FROM {table}")
+    cursor.execute(
+        f"INSERT INTO {table} ({names}, updated_at) SELECT {names}, CURRENT_TIMESTAMP FROM {staging}"
+    )
+    return {
+        'rows': len(rows),
+        'stage_ms': round((staged - started) * 1000, 2),
+        'swap_ms': round((time.perf_counter() - staged) * 1000, 2),
+    }
+
+
+_STATUS_COLUMNS = {'pending': 'pending_count', 'approved': 'approved_count', 'rejected': 'rejected_count'}
+_MODE_COLUMNS = {'br': 'br_count', 'mp': 'mp_count'}
+# پنجره last_week_submissions / last_week_approvals در STATS_QUERY
+_LAST_WEEK = timedelta(days=7)
+
+
+def _in_last_week(moment: Optional[datetime]) -> bool:
+    if moment is None:
+        return False
+    return moment >= datetime.now(moment.tzinfo) - _LAST_WEEK
+
+
+def stats_delta(event: str, mode: Optional[str] = None, previous_status: str = 'pending', count: int = 1,
+                new_user: bool = False, approved_at: Optional[datetime] = None,
+                submitted_at: Optional[datetime] = None, likes: int = 0, reports: int = 0) -> Dict[str, int]:
+    """
+    تغییر ستون‌های ua_stats_cache برای یک رویداد
+    
+    Args:
+        event: submit / approve / reject / delete / like / report / resolve_report / ban / unban
+        mode: mode اتچمنت (br / mp) برای approve، reject و delete
+        previous_status: وضعیت اتچمنت قبل از approve، reject یا delete
+        count: تعداد لایک (منفی برای حذف لایک)
+        new_user: اولین ارسال این کاربر (submit)
+        approved_at: زمان approve قبلی اتچمنت approve شده (reject / delete)؛ فقط
+            داخل ۷ روز اخیر از last_week_approvals کم می‌شود
+        submitted_at: زمان ارسال اتچمنت حذف شده (delete)
+        likes / reports: like_count و report_count اتچمنت حذف شده (delete)
+    
+    total_users و pending_reports در delete تغییر نمی‌کنند (به بقیه اتچمنت‌های
+    کاربر و گزارش‌ها بستگی دارند) و در reconcile بعدی اصلاح می‌شوند.
+    
+    Raises:
+        ValueError: رویداد ناشناخته
+    """
+    deltas: Dict[str, int] = {}
+    
+    def add(column: Optional[str], value: int):
+        if column:
+            deltas[column] = deltas.get(column, 0) + value
+    
+    if event == 'submit':
+        add('total_attachments', 1)
+        add('pending_count', 1)
+        add('last_week_submissions', 1)
+        if new_user:
+            add('total_users', 1)
+            add('active_users', 1)
+    elif event in ('approve', 'reject'):
+        status = 'approved' if event == 'approve' else 'rejected'
+        if previous_status != status:
+            add(_STATUS_COLUMNS.get(previous_status), -1)
+            add(_STATUS_COLUMNS[status], 1)
+            if event == 'approve':
+                add(_MODE_COLUMNS.get(mode), 1)
+                add('last_week_approvals', 1)
+            elif previous_status == 'approved':
+                add(_MODE_COLUMNS.get(mode), -1)
+                if _in_last_week(approved_at):
+                    add('last_week_approvals', -1)
+    elif event == 'delete':
+        add('total_attachments', -1)
+        add(_STATUS_COLUMNS.get(previous_status), -1)
+        if previous_status == 'approved':
+            add(_MODE_COLUMNS.get(mode), -1)
+            if _in_last_week(approved_at):
+                add('last_week_approvals', -1)
+        if _in_last_week(submitted_at):
+            add('last_week_submissions', -1)
+        add('total_likes', -likes)
+        add('total_reports', -reports)
+    elif event == 'like':
+        add('total_likes', count)
+    elif event == 'report':
+        add('total_reports', 1)
+        add('pending_reports', 1)
+    elif event == 'resolve_report':
+        add('pending_reports', -1)
+    elif event in ('ban', 'unban'):
+        sign = 1 if event == 'ban' else -1
+        add('banned_users', sign)
+        add('active_users', -sign)
+    else:
+        raise ValueError(f"Unknown stats event '{event}'")
+    return {column: value for column, value in deltas.items() if value}
+
 
 class UACache:
     """مدیریت Cache برای User Attachments"""
     
+    # TTL تعدادها برای pagination (ثانیه)
+    COUNT_TTL = 60
+    # TTL اطلاعات هر کاربر و شناسه‌هایی که در جدول users نیستند (ثانیه)
+    USER_TTL = 600
+    MISSING_USER_TTL = 60
+    # ردیف ua_stats_cache که از آخرین reconcile قدیمی‌تر باشد دوباره محاسبه می‌شود
+    STATS_MAX_AGE = 2 * STATS_RECONCILE_INTERVAL
+    
     def __init__(self, db_adapter, ttl_seconds: int = 300):
         """
         Args:
@@ -25,350 +218,342 @@ class UACache:
         """
         self.db = db_adapter
         self.ttl = ttl_seconds
-        self.memory_cache = {}
-        self.lock = Lock()
+        # region 'ua' از موتور cache مشترک؛ هر entry زیر نوع خودش tag می‌شود
+        # (stats / count) تا invalidate(cache_type) از index استفاده کند
+        self.memory_cache = get_engine().region('ua')
+        # هر کاربر یک entry در region 'ua_users' (محدود با LRU)
+        self.users_cache = get_engine().region('ua_users')
+        # آخرین reconcile_stats: at / duration_ms / drift
+        self.last_reconcile: Optional[Dict[str, Any]] = None
+        # رتبه‌بندی‌های درون حافظه (در اولین خواندن از GROUP BY ساخته می‌شوند)
+        self._rank_lock = threading.Lock()
+        self._weapon_ranks: Optional[Dict[str, IncrementalTopK]] = None
+        self._user_ranks: Optional[IncrementalTopK] = None
+        self._user_info: Dict[int, Dict[str, Any]] = {}
+        self._rankings_changed = False
+        # آخرین persist_rankings موفق (at / duration_ms / زمان هر جدول) و تعداد خطاها
+        self.last_persist: Optional[Dict[str, Any]] = None
+        self.persist_failures = 0
+        # با UARefresher فعال: درخواست refresh پس‌زمینه (stats / rankings / persist)
+        # به جای محاسبه همزمان در مسیر درخواست
+        self.on_change: Optional[Callable[..., None]] = None
+    
+    def _remember(self, cache_key: str, cache_type: str, data: Any, ttl: Optional[int] = None):
+        """ذخیره در memory cache با TTL (پیش‌فرض self.ttl)"""
+        self.memory_cache.set(cache_key, data, ttl=ttl or self.ttl, tags=(cache_type,))
+    
+    def _request_refresh(self, *tasks: str) -> bool:
+        """
+        سپردن refresh به UARefresher
         
-    def _is_cache_valid(self, updated_at: str) -> bool:
-        """بررسی اعتبار cache بر اساس زمان"""
-        if not updated_at:
+        Returns:
+            False اگر refresher فعال نباشد (caller خودش محاسبه می‌کند)
+        """
+        on_change = self.on_change
+        if on_change is None:
             return False
-            
         try:
-            cache_time = datetime.fromisoformat(updated_at)
-            expiry_time = datetime.now() - timedelta(seconds=self.ttl)
-            return cache_time > expiry_time
+            on_change(*tasks)
         except Exception as e:
-            logger.error(f"Error checking cache validity: {e}")
+            logger.error(f"Could not request UA refresh {tasks}: {e}")
             return False
+        return True
     
+    def _read_stats_row(self, max_age: Optional[float] = None) -> Optional[Dict]:
+        """خواندن ردیف ua_stats_cache (با max_age فقط اگر از آخرین reconcile جوان‌تر باشد)"""
+        try:
+            with self.db.get_connection() as conn:
+                cursor = conn.cursor()
+                any_age = max_age is None
+                if not any_age:
+                    try:
+                        cursor.execute(
+                            """
+                            SELECT * FROM ua_stats_cache 
+                            WHERE id = 1 
+                              AND updated_at > (CURRENT_TIMESTAMP - make_interval(secs => %s))
+                            """,
+                            (max_age,),
+                        )
+                    except Exception as e:
+                        logger.debug(f"Cache table might not have updated_at column or table missing: {e}")
+                        any_age = True
+                if any_age:
+                    cursor.execute(
+                        """
+                        SELECT * FROM ua_stats_cache 
+                        WHERE id = 1
+                        """
+                    )
+                cache_row = cursor.fetchone()
+        except Exception as cache_err:
+            logger.debug(f"Skipping DB cache for stats (will compute fresh): {cache_err}")
+            return None
+        if not cache_row:
+            return None
+        stats = dict(cache_row)
+        self._remember('stats', 'stats', stats)
+        return stats
+    
+    def load_stats(self) -> Optional[Dict]:
+        """پر کردن memory cache از ردیف ua_stats_cache بدون توجه به سن آن (job های UARefresher)"""
+        if not hasattr(self.db, 'get_connection'):
+            return None
+        return self._read_stats_row()
+        
     def get_stats(self, force_refresh: bool = False) -> Optional[Dict]:
-        """دریافت آمار از cache یا محاسبه جدید"""
+        """
+        دریافت آمار از cache یا ردیف ua_stats_cache
+        
+        ردیف با record_event به صورت افزایشی به‌روز می‌شود، پس خواندن آن هزینه
+        ثابت دارد. CTE کامل فقط وقتی اجرا می‌شود که ردیف نباشد، از آخرین
+        reconcile بیشتر از STATS_MAX_AGE گذشته باشد یا force_refresh داده شود.
+        با UARefresher فعال ردیف کهنه سرو و محاسبه به پس‌زمینه سپرده می‌شود.
+        """
         
         # بررسی memory cache اول
-        if not force_refresh and 'stats' in self.memory_cache:
-            cached = self.memory_cache['stats']
-            if self._is_cache_valid(cached.get('timestamp')):
+        if not force_refresh:
+            cached_stats = self.memory_cache.get('stats')
+            if cached_stats is not None:
                 logger.debug("Stats retrieved from memory cache")
-                return cached['data']
+                return cached_stats
         
         try:
             if not hasattr(self.db, 'get_connection'):
                 return None
             
             # بررسی database cache
-            cache_row = None
             if not force_refresh:
-                try:
-                    with self.db.get_connection() as conn:
-                        cursor = conn.cursor()
-                        try:
-                            cursor.execute(
-                                """
-                                SELECT * FROM ua_stats_cache 
-                                WHERE id = 1 
-                                  AND updated_at > (CURRENT_TIMESTAMP - INTERVAL '5 minutes')
-                                """
-                            )
-                        except Exception as e:
-                            logger.debug(f"Cache table might not have updated_at column or table missing: {e}")
-                            cursor.execute(
-                                """
-                                SELECT * FROM ua_stats_cache 
-                                WHERE id = 1
-                                """
-                            )
-                        cache_row = cursor.fetchone()
-                except Exception as cache_err:
-                    logger.debug(f"Skipping DB cache for stats (will compute fresh): {cache_err}")
-                    cache_row = None
-                
-                if cache_row:
-                    stats = dict(cache_row)
-                    with self.lock:
-                        self.memory_cache['stats'] = {
-                            'data': stats,
-                            'timestamp': datetime.now().isoformat()
-                        }
+                stats = self._read_stats_row(self.STATS_MAX_AGE)
+                if stats is None and self._request_refresh('stats'):
+                    stats = self._read_stats_row()
+                if stats is not None:
                     logger.debug("Stats retrieved from database cache")
                     return stats
             
-            # محاسبه آمار جدید با CTE
-            logger.info("Calculating fresh stats with CTE")
-            start_time = time.time()
-            with self.db.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute(
-                    """
-                    WITH stats AS (
-                        SELECT 
-                            COUNT(*) as total_attachments,
-                            COUNT(CASE WHEN status = 'pending' THEN 1 END) as pending_count,
-                            COUNT(CASE WHEN status = 'approved' THEN 1 END) as approved_count,
-                            COUNT(CASE WHEN status = 'rejected' THEN 1 END) as rejected_count,
-                            COUNT(CASE WHEN mode = 'br' AND status = 'approved' THEN 1 END) as br_count,
-                            COUNT(CASE WHEN mode = 'mp' AND status = 'approved' THEN 1 END) as mp_count,
-                            COUNT(DISTINCT user_id) as total_users,
-                            COALESCE(SUM(like_count), 0) as total_likes,
-                            COALESCE(SUM(report_count), 0) as total_reports,
-                            COUNT(CASE WHEN submitted_at >= (CURRENT_TIMESTAMP - INTERVAL '7 days') THEN 1 END) as last_week_submissions,
-                            COUNT(CASE WHEN approved_at >= (CURRENT_TIMESTAMP - INTERVAL '7 days') AND status = 'approved' THEN 1 END) as last_week_approvals
-                        FROM user_attachments
-                    ),
-                    banned AS (
-                        SELECT COUNT(*) as banned_users
-                        FROM user_submission_stats 
-                        WHERE is_banned = TRUE
-                    ),
-                    reports AS (
-                        SELECT COUNT(*) as pending_reports
-                        FROM user_attachment_reports
-                        WHERE status = 'pending'
-                    )
-                    SELECT 
-                        s.*,
-                        b.banned_users,
-                        r.pending_reports,
-                        s.total_users - b.banned_users as active_users
-                    FROM stats s, banned b, reports r
-                    """
-                )
-                row = cursor.fetchone()
-            elapsed = (time.time() - start_time) * 1000
-            logger.info(f"Stats calculated in {elapsed:.2f}ms")
-            
-            if row:
-                stats = dict(row)
-                stats['updated_at'] = datetime.now().isoformat()
-                
-                # ذخیره در database cache
-                try:
-                    with self.db.transaction() as tconn:
-                        tcur = tconn.cursor()
-                        tcur.execute(
-                            """
-                            INSERT INTO ua_stats_cache (
-                                id, total_attachments, pending_count, approved_count, rejected_count,
-                                total_users, active_users, banned_users, br_count, mp_count,
-                                total_likes, total_reports, pending_reports,
-                                last_week_submissions, last_week_approvals,
-                                updated_at
-                            ) VALUES (1, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP)
-                            ON CONFLICT (id) DO UPDATE SET
-                                total_attachments = EXCLUDED.total_attachments,
-                                pending_count = EXCLUDED.pending_count,
-                                approved_count = EXCLUDED.approved_count,
-                                rejected_count = EXCLUDED.rejected_count,
-                                total_users = EXCLUDED.total_users,
-                                active_users = EXCLUDED.active_users,
-                                banned_users = EXCLUDED.banned_users,
-                                br_count = EXCLUDED.br_count,
-                                mp_count = EXCLUDED.mp_count,
-                                total_likes = EXCLUDED.total_likes,
-                                total_reports = EXCLUDED.total_reports,
-                                pending_reports = EXCLUDED.pending_reports,
-                                last_week_submissions = EXCLUDED.last_week_submissions,
-                                last_week_approvals = EXCLUDED.last_week_approvals,
-                                updated_at = CURRENT_TIMESTAMP
-                            """,
-                            (
-                                stats['total_attachments'], stats['pending_count'], stats['approved_count'],
-                                stats['rejected_count'], stats['total_users'], stats['active_users'],
-                                stats['banned_users'], stats['br_count'], stats['mp_count'],
-                                stats['total_likes'], stats['total_reports'], stats['pending_reports'],
-                                stats['last_week_submissions'], stats['last_week_approvals']
-                            ),
-                        )
-                except Exception as e:
-                    logger.debug(f"Could not update cache table: {e}")
-                
-                # ذخیره در memory cache
-                with self.lock:
-                    self.memory_cache['stats'] = {
-                        'data': stats,
-                        'timestamp': datetime.now().isoformat()
-                    }
-                
-                return stats
+            return self.reconcile_stats()
                 
         except Exception as e:
             logger.error(f"Error getting stats: {e}")
             return None
     
-    def get_top_weapons(self, limit: int = 10, force_refresh: bool = False) -> List[Dict]:
-        """دریافت محبوب‌ترین سلاح‌ها از cache"""
+    def reconcile_stats(self) -> Optional[Dict]:
+        """
+        محاسبه کامل آمار با CTE و بازنویسی ردیف ua_stats_cache
+        
+        CTE بدون lock اجرا می‌شود (STATS_SNAPSHOT_QUERY مقدار ردیف در همان snapshot را
+        هم برمی‌گرداند). سپس یک upsert کوتاه هر ستون را computed + (مقدار فعلی -
+        snapshot) می‌کند تا delta هایی که record_event حین محاسبه اعمال کرده حفظ شوند؛
+        ردیف فقط برای همین statement قفل می‌شود و write ها منتظر CTE نمی‌مانند.
+        اختلاف مقدار افزایشی با مقدار واقعی (drift) log و در last_reconcile
+        نگه داشته می‌شود؛ ستون‌های last_week_* فقط اینجا از پنجره ۷ روزه خارج می‌شوند.
+        """
+        if not hasattr(self.db, 'transaction'):
+            return None
+        logger.info("Calculating fresh stats with CTE")
+        start_time = time.time()
+        with self.db.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(STATS_SNAPSHOT_QUERY)
+            row = cursor.fetchone()
+        if not row:
+            return None
+        row = dict(row)
+        computed = {column: row[column] for column in STATS_COLUMNS}
+        snapshot = {column: row.get(f'snapshot_{column}') for column in STATS_COLUMNS}
+        
+        with self.db.transaction() as conn:
+            cursor = conn.cursor()
+            # بدون ردیف در snapshot (اولین اجرا) مقدار محاسبه شده مستقیم نوشته می‌شود
+            cursor.execute(
+                f"""
+                INSERT INTO ua_stats_cache (id, {', '.join(STATS_COLUMNS)}, updated_at)
+                VALUES (1, {', '.join(['%s'] * len(STATS_COLUMNS))}, CURRENT_TIMESTAMP)
+                ON CONFLICT (id) DO UPDATE SET
+                    {', '.join(
+                        f'{column} = %s + (ua_stats_cache.{column} - COALESCE(%s, ua_stats_cache.{column}))'
+                        for column in STATS_COLUMNS
+                    )},
+                    updated_at = CURRENT_TIMESTAMP
+                RETURNING *
+                """,
+                tuple(computed[column] for column in STATS_COLUMNS)
+                + tuple(value for column in STATS_COLUMNS for value in (computed[column], snapshot[column])),
+            )
+            written = cursor.fetchone()
+        elapsed = (time.time() - start_time) * 1000
+        stats = dict(written) if written else dict(computed)
+        stats['updated_at'] = datetime.now().isoformat()
+        
+        drift = {
+            column: computed[column] - snapshot[column]
+            for column in STATS_COLUMNS if snapshot[column] is not None and computed[column] != snapshot[column]
+        }
+        self.last_reconcile = {'at': stats['updated_at'], 'duration_ms': round(elapsed, 2), 'drift': drift}
+        if drift:
+            logger.info(f"Stats reconciled in {elapsed:.2f}ms - drift: {drift}")
+        else:
+            logger.info(f"Stats calculated in {elapsed:.2f}ms")
+        
+        # ذخیره در memory cache
+        self._remember('stats', 'stats', stats)
+        return stats
+    
+    def record_event(self, event: str, cursor=None, user_id: Optional[int] = None, weapon: Optional[str] = None,
+                     username: Optional[str] = None, likes: int = 0, approved: bool = True,
+                     **info) -> Optional[Dict]:
+        """
+        اعمال delta یک رویداد روی ردیف ua_stats_cache (بدون اجرای CTE) و رتبه‌بندی‌ها
+        
+        Args:
+            event: submit / approve / reject / delete / like / report / resolve_report / ban / unban
+            cursor: cursor تراکنش write؛ با آن delta همراه خود write commit یا rollback
+                می‌شود و reconcile_stats آن را دوبار حساب نمی‌کند
+            user_id / weapon / username: صاحب و سلاح اتچمنت (برای رتبه‌بندی‌ها)
+            likes: تعداد لایک اتچمنت هنگام approve، reject یا delete (total_likes کاربر)
+            approved: برای like - اتچمنت approve شده است
+            info: پارامترهای stats_delta (mode / previous_status / count / new_user /
+                approved_at / submitted_at / reports)
+        
+        Returns:
+            ردیف به‌روز شده (None اگر ردیف هنوز ساخته نشده یا خطا رخ داده باشد)
+        
+        مثال:
+            with db.transaction() as conn:
+                cur = conn.cursor()
+                cur.execute("UPDATE user_attachments SET status = 'approved' ...")
+                ua_cache.record_event('approve', cursor=cur, mode='br', user_id=uid, weapon='M4')
+        """
+        deltas = stats_delta(event, likes=likes, **info)
+        self._update_rankings(event, user_id, weapon, username, likes, approved, info)
+        self._request_refresh('persist')
+        if not deltas:
+            return None
+        query = (
+            f"UPDATE ua_stats_cache SET {', '.join(f'{column} = {column} + %s' for column in deltas)} "
+            f"WHERE id = 1 RETURNING *"
+        )
+        params = tuple(deltas.values())
+        row = None
+        try:
+            if cursor is not None:
+                cursor.execute(query, params)
+                row = cursor.fetchone()
+            elif hasattr(self.db, 'transaction'):
+                with self.db.transaction() as conn:
+                    own_cursor = conn.cursor()
+                    own_cursor.execute(query, params)
+                    row = own_cursor.fetchone()
+        except Exception as e:
+            logger.error(f"Error applying stats delta for '{event}': {e}")
+        
+        # process های دیگر نسخه memory خود را کنار می‌گذارند و ردیف جدید را می‌خوانند
+        self.memory_cache.invalidate_tag('stats')
+        if not row:
+            return None
+        stats = dict(row)
+        self._remember('stats', 'stats', stats)
+        return stats
+    
+    def get_top_weapons(self, limit: int = 10, force_refresh: bool = False, mode: Optional[str] = None) -> List[Dict]:
+        """
+        دریافت محبوب‌ترین سلاح‌ها از رتبه‌بندی درون حافظه
+        
+        رتبه‌بندی هر mode یک IncrementalTopK است که با approve / reject در
+        record_event به‌روز می‌شود؛ GROUP BY فقط در اولین خواندن و reconcile اجرا می‌شود.
+        
+        Args:
+            mode: فقط سلاح‌های یک mode (br / mp)؛ بدون آن ادغام رتبه‌بندی همه mode ها
+        """
         
         try:
             limit = int(limit)
         except Exception:
             limit = 10
-        limit = max(1, min(limit, 100))
-        cache_key = f'top_weapons_{limit}'
-        
-        # بررسی memory cache اول
-        if not force_refresh and cache_key in self.memory_cache:
-            cached = self.memory_cache[cache_key]
-            if self._is_cache_valid(cached.get('timestamp')):
-                logger.debug(f"Top weapons retrieved from memory cache")
-                return cached['data']
+        limit = max(1, min(limit, TOP_CAPACITY))
         
         try:
-            if not hasattr(self.db, 'get_connection'):
-                return []
-            
-            # بررسی database cache
-            if not force_refresh:
-                try:
-                    with self.db.get_connection() as conn:
-                        cursor = conn.cursor()
-                        try:
-                            cursor.execute(
-                                """
-                                SELECT weapon_name, attachment_count, mode
-                                FROM ua_top_weapons_cache
-                                WHERE updated_at > (CURRENT_TIMESTAMP - INTERVAL '5 minutes')
-                                ORDER BY attachment_count DESC
-                                LIMIT %s
-                                """,
-                                (limit,),
-                            )
-                        except Exception:
-                            cursor.execute(
-                                """
-                                SELECT weapon_name, attachment_count, mode
-                                FROM ua_top_weapons_cache
-                                ORDER BY attachment_count DESC
-                                LIMIT %s
-                                """,
-                                (limit,),
-                            )
-                        cache_rows = cursor.fetchall()
-                    if cache_rows:
-                        weapons = [dict(row) for row in cache_rows]
-                        with self.lock:
-                            self.memory_cache[cache_key] = {
-                                'data': weapons,
-                                'timestamp': datetime.now().isoformat()
-                            }
-                        logger.debug("Top weapons retrieved from database cache")
-                        return weapons
-                except Exception as cache_err:
-                    logger.debug(f"Skipping DB cache for top weapons: {cache_err}")
-            
-            # محاسبه جدید
-            logger.info("Calculating fresh top weapons")
-            with self.db.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute(
-                    """
-                    SELECT 
-                        COALESCE(custom_weapon_name, 'Unknown') as weapon_name,
-                        COUNT(*) as attachment_count,
-                        mode
-                    FROM user_attachments
-                    WHERE status = 'approved' 
-                      AND custom_weapon_name IS NOT NULL
-                    GROUP BY custom_weapon_name, mode
-                    ORDER BY attachment_count DESC
-                    LIMIT %s
-                    """,
-                    (limit,),
-                )
-                rows = cursor.fetchall()
-            weapons = [dict(row) for row in rows]
-            
-            # ذخیره در database cache
-            try:
-                with self.db.transaction() as tconn:
-                    tcur = tconn.cursor()
-                    tcur.execute("DELETE FROM ua_top_weapons_cache")
-                    for weapon in weapons:
-                        tcur.execute(
-                            """
-                            INSERT INTO ua_top_weapons_cache (weapon_name, attachment_count, mode, updated_at)
-                            VALUES (%s, %s, %s, CURRENT_TIMESTAMP)
-                            """,
-                            (weapon['weapon_name'], weapon['attachment_count'], weapon.get('mode', '')),
-                        )
-            except Exception as e:
-                logger.debug(f"Could not refresh top weapons cache: {e}")
-            
-            # ذخیره در memory cache
-            with self.lock:
-                self.memory_cache[cache_key] = {
-                    'data': weapons,
-                    'timestamp': datetime.now().isoformat()
-                }
-            
-            return weapons
+            if force_refresh or self._weapon_ranks is None:
+                if not self.reconcile_rankings():
+                    return []
+            ranks = self._weapon_ranks
+            rows = heapq.nlargest(
+                limit,
+                (
+                    (count, weapon, weapon_mode)
+                    for weapon_mode, topk in list(ranks.items()) if mode is None or weapon_mode == mode
+                    for weapon, count in topk.top(limit)
+                ),
+                key=itemgetter(0),
+            )
+            return [
+                {'weapon_name': weapon, 'attachment_count': count, 'mode': weapon_mode}
+                for count, weapon, weapon_mode in rows
+            ]
             
         except Exception as e:
             logger.error(f"Error getting top weapons: {e}")
             return []
     
     def get_top_users(self, limit: int = 5, force_refresh: bool = False) -> List[Dict]:
-        """دریافت فعال‌ترین کاربران از cache"""
+        """دریافت فعال‌ترین کاربران از رتبه‌بندی درون حافظه (بر اساس تعداد اتچمنت approve شده)"""
         
         try:
             limit = int(limit)
         except Exception:
             limit = 5
-        limit = max(1, min(limit, 100))
-        cache_key = f'top_users_{limit}'
-        
-        # بررسی memory cache
-        if not force_refresh and cache_key in self.memory_cache:
-            cached = self.memory_cache[cache_key]
-            if self._is_cache_valid(cached.get('timestamp')):
-                logger.debug("Top users retrieved from memory cache")
-                return cached['data']
+        limit = max(1, min(limit, TOP_CAPACITY))
         
         try:
-            if not hasattr(self.db, 'get_connection'):
-                return []
-            
-            # بررسی database cache
-            if not force_refresh:
-                try:
-                    with self.db.get_connection() as conn:
-                        cursor = conn.cursor()
-                        try:
-                            cursor.execute(
-                                """
-                                SELECT user_id, username, approved_count, total_likes
-                                FROM ua_top_users_cache
-                                WHERE updated_at > (CURRENT_TIMESTAMP - INTERVAL '5 minutes')
-                                ORDER BY approved_count DESC
-                                LIMIT %s
-                                """,
-                                (limit,),
-                            )
-                        except Exception:
-                            cursor.execute(
-                                """
-                                SELECT user_id, username, approved_count, total_likes
-                                FROM ua_top_users_cache
-                                ORDER BY approved_count DESC
-                                LIMIT %s
-                                """,
-                                (limit,),
-                            )
-                        cache_rows = cursor.fetchall()
-                    if cache_rows:
-                        users = [dict(row) for row in cache_rows]
-                        with self.lock:
-                            self.memory_cache[cache_key] = {
-                                'data': users,
-                                'timestamp': datetime.now().isoformat()
-                            }
-                        logger.debug("Top users retrieved from database cache")
-                        return users
-                except Exception as cache_err:
-                    logger.debug(f"Skipping DB cache for top users: {cache_err}")
+            if force_refresh or self._user_ranks is None:
+                if not self.reconcile_rankings():
+                    return []
+            user_info = self._user_info
+            users = []
+            for user_id, approved_count in self._user_ranks.top(limit):
+                info = user_info.get(user_id, {})
+                users.append({
+                    'user_id': user_id,
+                    'username': info.get('username'),
+                    'approved_count': approved_count,
+                    'total_likes': info.get('total_likes', 0),
+                })
+            return users
             
-            # محاسبه جدید
-            logger.info("Calculating fresh top users")
+        except Exception as e:
+            logger.error(f"Error getting top users: {e}")
+            return []
+    
+    def reconcile_rankings(self) -> bool:
+        """
+        ساخت دوباره رتبه‌بندی‌ها از GROUP BY کامل و ذخیره آنها در جداول cache
+        
+        رویدادهایی که حین اجرای query اعمال شوند روی ساختار قبلی می‌مانند و
+        در reconcile بعدی اصلاح می‌شوند.
+        
+        Returns:
+            False اگر database در دسترس نباشد یا query خطا بدهد
+        """
+        if not hasattr(self.db, 'get_connection'):
+            return False
+        logger.info("Calculating fresh top weapons and top users")
+        start_time = time.time()
+        try:
             with self.db.get_connection() as conn:
                 cursor = conn.cursor()
+                cursor.execute(
+                    """
+                    SELECT 
+                        custom_weapon_name as weapon_name,
+                        mode,
+                        COUNT(*) as attachment_count
+                    FROM user_attachments
+                    WHERE status = 'approved' 
+                      AND custom_weapon_name IS NOT NULL
+                    GROUP BY custom_weapon_name, mode
+                    """
+                )
+                weapon_rows = cursor.fetchall()
                 cursor.execute(
                     """
                     SELECT 
@@ -380,42 +565,112 @@ class UACache:
                     LEFT JOIN users u ON ua.user_id = u.user_id
                     WHERE ua.status = 'approved'
                     GROUP BY ua.user_id, u.username
-                    ORDER BY approved_count DESC
-                    LIMIT %s
-                    """,
-                    (limit,),
+                    """
                 )
-                rows = cursor.fetchall()
-            users = [dict(row) for row in rows]
-            
-            # ذخیره در database cache
-            try:
-                with self.db.transaction() as tconn:
-                    tcur = tconn.cursor()
-                    tcur.execute("DELETE FROM ua_top_users_cache")
-                    for user in users:
-                        tcur.execute(
-                            """
-                            INSERT INTO ua_top_users_cache (user_id, username, approved_count, total_likes, updated_at)
-                            VALUES (%s, %s, %s, %s, CURRENT_TIMESTAMP)
-                            """,
-                            (user['user_id'], user.get('username'), user['approved_count'], user['total_likes']),
-                        )
-            except Exception as e:
-                logger.debug(f"Could not refresh top users cache: {e}")
-            
-            # ذخیره در memory cache
-            with self.lock:
-                self.memory_cache[cache_key] = {
-                    'data': users,
-                    'timestamp': datetime.now().isoformat()
+                user_rows = cursor.fetchall()
+        except Exception as e:
+            logger.error(f"Error calculating rankings: {e}")
+            return False
+        
+        by_mode: Dict[str, List] = {}
+        for row in weapon_rows:
+            by_mode.setdefault(row['mode'] or '', []).append((row['weapon_name'], row['attachment_count']))
+        weapon_ranks = {mode: IncrementalTopK.from_counts(counts, TOP_CAPACITY) for mode, counts in by_mode.items()}
+        user_ranks = IncrementalTopK.from_counts(
+            ((row['user_id'], row['approved_count']) for row in user_rows), TOP_CAPACITY
+        )
+        user_info = {
+            row['user_id']: {'username': row['username'], 'total_likes': row['total_likes']} for row in user_rows
+        }
+        with self._rank_lock:
+            self._weapon_ranks = weapon_ranks
+            self._user_ranks = user_ranks
+            self._user_info = user_info
+            self._rankings_changed = True
+        logger.info(
+            f"Rankings calculated in {(time.time() - start_time) * 1000:.2f}ms "
+            f"({len(weapon_rows)} weapon/mode pairs, {len(user_rows)} users)"
+        )
+        self.persist_rankings()
+        return True
+    
+    def _update_rankings(self, event: str, user_id: Optional[int], weapon: Optional[str],
+                         username: Optional[str], likes: int, approved: bool, info: Dict[str, Any]):
+        """اعمال رویداد record_event روی رتبه‌بندی‌ها (اگر هنوز ساخته نشده‌اند کاری لازم نیست)"""
+        if self._user_ranks is None:
+            return
+        previous_status = info.get('previous_status', 'pending')
+        sign = 0
+        if event == 'approve' and previous_status != 'approved':
+            sign = 1
+        elif event in ('reject', 'delete') and previous_status == 'approved':
+            sign = -1
+        elif not (event == 'like' and approved and user_id is not None):
+            return
+        
+        with self._rank_lock:
+            if self._user_ranks is None:
+                return
+            if user_id is not None:
+                user = self._user_info.setdefault(user_id, {'username': username, 'total_likes': 0})
+                if username:
+                    user['username'] = username
+            if sign:
+                if weapon:
+                    mode = info.get('mode') or ''
+                    topk = self._weapon_ranks.get(mode)
+                    if topk is None:
+                        topk = self._weapon_ranks[mode] = IncrementalTopK(TOP_CAPACITY)
+                    topk.add(weapon, sign)
+                if user_id is not None:
+                    self._user_ranks.add(user_id, sign)
+                    user['total_likes'] += sign * likes
+            else:
+                user['total_likes'] += info.get('count', 1)
+            self._rankings_changed = True
+    
+    def persist_rankings(self) -> bool:
+        """
+        نوشتن رتبه‌بندی‌ها در ua_top_weapons_cache و ua_top_users_cache
+        
+        هر دو جدول در یک تراکنش با replace_table_rows (staging + جایگزینی)
+        بازنویسی می‌شوند؛ اگر از آخرین ذخیره رویدادی نیامده باشد کاری انجام
+        نمی‌شود. زمان هر refresh در last_persist ثبت می‌شود.
+        """
+        if not self._rankings_changed or self._user_ranks is None or not hasattr(self.db, 'transaction'):
+            return False
+        self._rankings_changed = False
+        weapons = self.get_top_weapons(TOP_CAPACITY)
+        users = self.get_top_users(TOP_CAPACITY)
+        started = time.perf_counter()
+        try:
+            with self.db.transaction() as tconn:
+                tcur = tconn.cursor()
+                tables = {
+                    'ua_top_weapons_cache': replace_table_rows(
+                        tcur, 'ua_top_weapons_cache', ('weapon_name', 'attachment_count', 'mode'),
+                        [(weapon['weapon_name'], weapon['attachment_count'], weapon['mode']) for weapon in weapons],
+                    ),
+                    'ua_top_users_cache': replace_table_rows(
+                        tcur, 'ua_top_users_cache', ('user_id', 'username', 'approved_count', 'total_likes'),
+                        [(user['user_id'], user['username'], user['approved_count'], user['total_likes'])
+                         for user in users],
+                    ),
                 }
-            
-            return users
-            
         except Exception as e:
-            logger.error(f"Error getting top users: {e}")
-            return []
+            self._rankings_changed = True
+            self.persist_failures += 1
+            logger.error(f"Could not persist rankings: {e}")
+            return False
+        
+        duration_ms = round((time.perf_counter() - started) * 1000, 2)
+        self.last_persist = {'at': datetime.now().isoformat(), 'duration_ms': duration_ms, 'tables': tables}
+        logger.info(
+            f"Ranking tables refreshed in {duration_ms}ms: "
+            + ', '.join(f"{table}={timing['rows']} rows (stage {timing['stage_ms']}ms, swap {timing['swap_ms']}ms)"
+                        for table, timing in tables.items())
+        )
+        return True
     
     def get_paginated_count(self, status: str = 'pending') -> int:
         """دریافت تعداد برای pagination با cache"""
@@ -423,12 +678,10 @@ class UACache:
         cache_key = f'count_{status}'
         
         # بررسی memory cache (کوتاه‌تر برای counts)
-        if cache_key in self.memory_cache:
-            cached = self.memory_cache[cache_key]
-            cache_time = cached.get('timestamp', 0)
-            if time.time() - cache_time < 60:  # 1 minute cache for counts
-                logger.debug(f"Count for {status} from memory cache")
-                return cached['count']
+        cached_count = self.memory_cache.get(cache_key)
+        if cached_count is not None:
+            logger.debug(f"Count for {status} from memory cache")
+            return cached_count
         
         try:
             if not hasattr(self.db, 'get_connection'):
@@ -439,11 +692,7 @@ class UACache:
                 stats = self.get_stats()
                 if stats:
                     count = stats.get(f'{status}_count', 0)
-                    with self.lock:
-                        self.memory_cache[cache_key] = {
-                            'count': count,
-                            'timestamp': time.time()
-                        }
+                    self._remember(cache_key, 'count', count, ttl=self.COUNT_TTL)
                     return count
             
             # Query مستقیم اگر cache موجود نباشه
@@ -457,11 +706,7 @@ class UACache:
                 count = int((row or {}).get('cnt') or 0)
             
             # ذخیره در memory cache
-            with self.lock:
-                self.memory_cache[cache_key] = {
-                    'count': count,
-                    'timestamp': time.time()
-                }
+            self._remember(cache_key, 'count', count, ttl=self.COUNT_TTL)
             
             return count
             
@@ -472,17 +717,31 @@ class UACache:
     def invalidate(self, cache_type: Optional[str] = None):
         """پاک کردن cache"""
         
-        with self.lock:
-            if cache_type:
-                # پاک کردن نوع خاصی از cache
-                keys_to_delete = [k for k in self.memory_cache if k.startswith(cache_type)]
-                for key in keys_to_delete:
-                    del self.memory_cache[key]
-                logger.info(f"Invalidated {len(keys_to_delete)} {cache_type} cache entries")
+        if cache_type:
+            # پاک کردن نوع خاصی از cache (از طریق tag؛ برای prefix های دیگر جستجوی key)
+            if self.memory_cache.has_tag(cache_type):
+                removed = self.memory_cache.invalidate_tag(cache_type)
+                logger.info(f"Invalidated {removed} {cache_type} cache entries")
             else:
-                # پاک کردن همه cache
-                self.memory_cache.clear()
-                logger.info("All cache entries invalidated")
+                self.memory_cache.invalidate_pattern(cache_type)
+                logger.info(f"Invalidated {cache_type} cache entries")
+        else:
+            # پاک کردن همه cache
+            self.memory_cache.clear()
+            logger.info("All cache entries invalidated")
+        
+        if cache_type in (None, 'users'):
+            self.users_cache.clear()
+        
+        if cache_type in (None, 'stats'):
+            self._request_refresh('stats')
+        
+        if cache_type in (None, 'top_weapons', 'top_users') and not self._request_refresh('rankings'):
+            # رتبه‌بندی‌ها در خواندن بعدی از GROUP BY ساخته می‌شوند؛ با refresher
+            # فعال رتبه‌بندی فعلی تا پایان reconcile پس‌زمینه سرو می‌شود
+            # (write هایی که record_event صدا می‌زنند به invalidate نیاز ندارند)
+            with self._rank_lock:
+                self._weapon_ranks = self._user_ranks = None
         
         # به‌روزرسانی database cache timestamp to force refresh
         try:
@@ -499,25 +758,35 @@ class UACache:
         except Exception as e:
             logger.error(f"Error invalidating database cache: {e}")
     
+    @staticmethod
+    def _user_key(user_id: int) -> str:
+        return f'user:{user_id}'
+    
     def batch_get_users(self, user_ids: List[int]) -> Dict[int, Dict]:
-        """دریافت batch اطلاعات کاربران برای جلوگیری از N+1 queries"""
+        """
+        دریافت batch اطلاعات کاربران برای جلوگیری از N+1 queries
+        
+        هر کاربر entry جداگانه دارد، پس صفحه‌هایی که کاربران مشترک دارند از
+        cache هم استفاده می‌کنند: entry های موجود با یک get_many خوانده می‌شوند و
+        فقط شناسه‌های miss با یک query IN (...) از دیتابیس می‌آیند. شناسه‌هایی
+        که در جدول users نیستند هم (با TTL کوتاه‌تر) cache می‌شوند.
+        """
         if not user_ids:
             return {}
         
-        cache_key = f'users_{hash(tuple(sorted(user_ids)))}'
-        
-        # بررسی memory cache
-        if cache_key in self.memory_cache:
-            cached = self.memory_cache[cache_key]
-            if self._is_cache_valid(cached.get('timestamp')):
-                logger.debug(f"Batch users retrieved from cache")
-                return cached['data']
+        keys = {self._user_key(user_id): user_id for user_id in user_ids}
+        cached_users = self.users_cache.get_many(keys)
+        users = {keys[key]: user for key, user in cached_users.items() if user is not NEGATIVE}
+        missing = [user_id for key, user_id in keys.items() if key not in cached_users]
+        if not missing:
+            logger.debug("Batch users retrieved from cache")
+            return users
         
         try:
             if not hasattr(self.db, 'get_connection'):
-                return {}
+                return users
             
-            placeholders = ','.join(['%s'] * len(user_ids))
+            placeholders = ','.join(['%s'] * len(missing))
             query = f"""
                 SELECT user_id, username, first_name
                 FROM users
@@ -525,59 +794,54 @@ class UACache:
             """
             with self.db.get_connection() as conn:
                 cursor = conn.cursor()
-                cursor.execute(query, tuple(user_ids))
+                cursor.execute(query, tuple(missing))
                 rows = cursor.fetchall()
             
-            users = {row['user_id']: dict(row) for row in rows}
+            fetched = {row['user_id']: dict(row) for row in rows}
             
             # ذخیره در memory cache
-            with self.lock:
-                self.memory_cache[cache_key] = {
-                    'data': users,
-                    'timestamp': datetime.now().isoformat()
-                }
+            self.users_cache.set_many(
+                {self._user_key(user_id): user for user_id, user in fetched.items()},
+                ttl=self.USER_TTL, tags=('users',),
+            )
+            absent = [user_id for user_id in missing if user_id not in fetched]
+            if absent:
+                self.users_cache.set_many(
+                    {self._user_key(user_id): NEGATIVE for user_id in absent},
+                    ttl=self.MISSING_USER_TTL, tags=('users',),
+                )
+            logger.debug(f"Batch users: {len(users)} cached, {len(missing)} fetched")
             
+            users.update(fetched)
             return users
             
         except Exception as e:
             logger.error(f"Error batch getting users: {e}")
-            return {}
+            return users
+    
+    def invalidate_user(self, *user_ids: int):
+        """
+        حذف اطلاعات cache شده کاربران (بعد از تغییر username / first_name)
+        
+        حذف از طریق listener های موتور به L2 و process های دیگر هم می‌رسد.
+        """
+        for user_id in user_ids:
+            self.users_cache.delete(self._user_key(user_id))
 
 
 # Decorator برای cache کردن نتایج توابع
 def cache_result(ttl_seconds: int = 300):
-    """Decorator برای cache کردن نتایج توابع"""
+    """
+    Decorator برای cache کردن نتایج توابع
+    
+    روی decorator ``cached`` (region 'default' موتور cache) ساخته شده تا
+    بودجه حافظه، sweep و metrics مشترک داشته باشد. مثل قبل خروجی None هم
+    cache می‌شود و wrapper.clear_cache فقط entry های همین تابع را پاک می‌کند.
+    """
     
     def decorator(func):
-        cache = {}
-        
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            # ساخت cache key
-            cache_key = f"{func.__name__}_{str(args)}_{str(kwargs)}"
-            
-            # بررسی cache
-            if cache_key in cache:
-                cached_data, cached_time = cache[cache_key]
-                if time.time() - cached_time < ttl_seconds:
-                    logger.debug(f"Cache hit for {func.__name__}")
-                    return cached_data
-            
-            # اجرای تابع
-            result = func(*args, **kwargs)
-            
-            # ذخیره در cache
-            cache[cache_key] = (result, time.time())
-            logger.debug(f"Cache miss for {func.__name__}, result cached")
-            
-            return result
-        
-        # اضافه کردن متد برای clear کردن cache
-        def clear_cache():
-            cache.clear()
-            logger.debug(f"Cache cleared for {func.__name__}")
-        
-        wrapper.clear_cache = clear_cache
+        wrapper = cached(ttl_seconds, negative_ttl=ttl_seconds)(func)
+        wrapper.clear_cache = wrapper.cache_clear
         return wrapper
     
     return decorator
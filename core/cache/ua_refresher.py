@@ -0,0 +1,233 @@
+"""
+پیش‌محاسبه aggregate های اتچمنت کاربران خارج از مسیر درخواست
+
+بدون آن اولین admin که بعد از انقضای cache داشبورد اتچمنت کاربران را باز
+می‌کند هزینه get_stats / get_top_weapons / get_top_users را همزمان می‌پردازد.
+UARefresher یک Task روی event loop برنامه است (از BotApplicationFactory در
+post_init شروع می‌شود) که کارهای زیر را در thread جدا (asyncio.to_thread)
+اجرا می‌کند تا loop مسدود نشود:
+
+    stats      reconcile_stats    (CTE کامل آمار)
+    rankings   reconcile_rankings (GROUP BY رتبه‌بندی‌ها)
+    persist    persist_rankings   (ذخیره رتبه‌بندی‌های تغییر کرده)
+    stats_row  load_stats         (خواندن ردیف ua_stats_cache به memory cache)
+
+زمان‌بندی:
+
+- startup: همه کارها یک بار
+- هر interval ثانیه: stats و rankings
+- هر persist_interval ثانیه: persist و stats_row (memory cache قبل از TTL پر می‌شود)
+- رویدادها: UACache با on_change کار لازم را درخواست می‌کند (record_event
+  → persist، invalidate → stats / rankings)؛ درخواست‌ها debounce ثانیه جمع و
+  با هم اجرا می‌شوند
+
+وقتی refresher فعال است UACache به جای محاسبه همزمان مقدار قبلی را سرو
+می‌کند و refresh را به refresher می‌سپارد. get_stats() زمان آخرین اجرا،
+مدت و تعداد خطای هر کار را برمی‌گرداند.
+"""
+
+import asyncio
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, Optional, Set
+
+from utils.logger import get_logger
+from .ua_cache_manager import RANKINGS_PERSIST_INTERVAL, STATS_RECONCILE_INTERVAL
+
+logger = get_logger('ua_cache', 'cache.log')
+
+# ترتیب اجرا وقتی چند کار با هم درخواست شوند
+TASKS = ('stats', 'rankings', 'persist', 'stats_row')
+
+
+class _TaskStats:
+    __slots__ = ('runs', 'failures', 'last_refresh', 'last_duration_ms', 'last_error', 'last_reason')
+
+    def __init__(self):
+        self.runs = 0
+        self.failures = 0
+        self.last_refresh: Optional[str] = None
+        self.last_duration_ms: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.last_reason: Optional[str] = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class UARefresher:
+    """
+    Task پس‌زمینه برای پیش‌محاسبه آمار و رتبه‌بندی‌های UACache
+
+    Args:
+        ua_cache: instance از UACache
+        interval: بازه محاسبه کامل stats و rankings (ثانیه)
+        persist_interval: بازه persist و خواندن دوباره ردیف آمار (ثانیه)
+        debounce: مدت جمع کردن درخواست‌های رویدادها قبل از اجرا (ثانیه)
+    """
+
+    def __init__(self, ua_cache, interval: float = STATS_RECONCILE_INTERVAL,
+                 persist_interval: float = RANKINGS_PERSIST_INTERVAL, debounce: float = 2.0):
+        self.ua_cache = ua_cache
+        self.interval = interval
+        self.persist_interval = persist_interval
+        self.debounce = debounce
+        self._stats = {name: _TaskStats() for name in TASKS}
+        self._requested: Set[str] = set()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def _run_job(self, name: str):
+        """اجرای یک کار (در thread)؛ نتیجه ناموفق به RuntimeError تبدیل می‌شود"""
+        cache = self.ua_cache
+        if name == 'stats':
+            ok = cache.reconcile_stats() is not None
+        elif name == 'rankings':
+            ok = cache.reconcile_rankings()
+        elif name == 'persist':
+            # persist بدون تغییر False برمی‌گرداند؛ خطا فقط در persist_failures دیده می‌شود
+            failures = cache.persist_failures
+            cache.persist_rankings()
+            ok = cache.persist_failures == failures
+        else:
+            ok = cache.load_stats() is not None
+        if not ok:
+            raise RuntimeError(f"{name} refresh returned no result")
+
+    # ---- چرخه عمر ----
+
+    def start(self):
+        """شروع Task روی event loop جاری (باید داخل loop صدا زده شود)"""
+        if self._task is not None and not self._task.done():
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self.ua_cache.on_change = self.notify_change
+        self._task = self._loop.create_task(self._run())
+        logger.info(
+            f"UA refresher started (interval={self.interval}s, persist_interval={self.persist_interval}s)"
+        )
+
+    async def stop(self):
+        if self.ua_cache.on_change == self.notify_change:
+            self.ua_cache.on_change = None
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    # ---- درخواست‌ها ----
+
+    def notify_change(self, *tasks: str):
+        """
+        درخواست اجرای کارها بعد از debounce (از هر thread قابل صدا زدن است)
+        """
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            loop.call_soon_threadsafe(self._request, tasks)
+        except RuntimeError:
+            # loop در حال بسته شدن
+            pass
+
+    def _request(self, tasks: Iterable[str]):
+        self._requested.update(task for task in tasks if task in self._stats)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self):
+        await self.refresh(TASKS, 'startup')
+        now = time.monotonic()
+        next_full = now + self.interval
+        next_persist = now + self.persist_interval
+        while True:
+            timeout = max(0.0, min(next_full, next_persist) - time.monotonic())
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            if self._wakeup.is_set():
+                await asyncio.sleep(self.debounce)
+                self._wakeup.clear()
+                requested, self._requested = self._requested, set()
+                await self.refresh(requested, 'change')
+            now = time.monotonic()
+            if now >= next_full:
+                await self.refresh(('stats', 'rankings'), 'scheduled')
+                next_full = time.monotonic() + self.interval
+            if now >= next_persist:
+                await self.refresh(('persist', 'stats_row'), 'scheduled')
+                next_persist = time.monotonic() + self.persist_interval
+
+    async def refresh(self, tasks: Iterable[str], reason: str = 'manual') -> bool:
+        """
+        اجرای کارها به ترتیب TASKS در thread جدا
+
+        Returns:
+            True اگر هیچ کاری خطا نداشت
+        """
+        tasks = set(tasks)
+        ok = True
+        for name in TASKS:
+            if name not in tasks:
+                continue
+            stats = self._stats[name]
+            started = time.perf_counter()
+            error = None
+            try:
+                await asyncio.to_thread(self._run_job, name)
+            except Exception as e:
+                error = str(e) or type(e).__name__
+            stats.runs += 1
+            stats.last_duration_ms = round((time.perf_counter() - started) * 1000, 2)
+            stats.last_reason = reason
+            if error is not None:
+                stats.failures += 1
+                stats.last_error = error
+                ok = False
+                logger.warning(f"UA refresh '{name}' ({reason}) failed: {error}")
+            else:
+                stats.last_refresh = datetime.now().isoformat()
+                stats.last_error = None
+        return ok
+
+    def get_stats(self) -> Dict[str, Any]:
+        """وضعیت هر کار: runs / failures / last_refresh / last_duration_ms / last_error / last_reason"""
+        return {
+            'running': self.running,
+            'pending': sorted(self._requested),
+            'tasks': {name: stats.as_dict() for name, stats in self._stats.items()},
+        }
+
+
+_refresher: Optional[UARefresher] = None
+
+
+def start_ua_refresher(ua_cache, interval: float = STATS_RECONCILE_INTERVAL,
+                       persist_interval: float = RANKINGS_PERSIST_INTERVAL) -> UARefresher:
+    """ساخت و شروع refresher سراسری روی event loop جاری"""
+    global _refresher
+    if _refresher is None:
+        _refresher = UARefresher(ua_cache, interval, persist_interval)
+    _refresher.start()
+    return _refresher
+
+
+async def stop_ua_refresher():
+    global _refresher
+    refresher, _refresher = _refresher, None
+    if refresher is not None:
+        await refresher.stop()
+
+
+def get_ua_refresher() -> Optional[UARefresher]:
+    return _refresher
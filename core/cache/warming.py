@@ -0,0 +1,284 @@
+"""
+گرم کردن cache در startup بر اساس key های واقعاً پرمصرف
+
+در زمان اجرا، هر miss از توابع decorate شده با cached / smart_cached (یعنی هر
+بار که تابع واقعاً اجرا می‌شود) در HotKeyTracker شمرده می‌شود. لیست پرمصرف‌ترین
+فراخوانی‌ها به صورت JSON روی دیسک ذخیره می‌شود (دوره‌ای و هنگام shutdown) و در
+startup همان فراخوانی‌ها به صورت موازی با تعداد worker محدود و یک بودجه زمانی
+دوباره اجرا می‌شوند تا cache قبل از رسیدن اولین کاربر پر شده باشد
+(BotApplicationFactory آن را در پس‌زمینه اجرا می‌کند و startup منتظر نمی‌ماند).
+فقط خود فراخوانی‌های replay (با contextvar) شمرده نمی‌شوند؛ miss های کاربران
+در همان زمان مثل همیشه ثبت می‌شوند.
+
+آرگومان‌هایی که قابل ذخیره در JSON نیستند با نام target جایگزین می‌شوند؛
+مثلاً self در متدهای DatabaseAdapter با register_target('db', db) به صورت
+{"$target": "db"} ذخیره و در replay دوباره به همان object تبدیل می‌شود.
+فراخوانی‌هایی که آرگومان غیرقابل ذخیره دارند ذخیره نمی‌شوند.
+"""
+
+import asyncio
+import contextvars
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from utils.logger import get_logger
+from .keys import make_key
+
+logger = get_logger('cache', 'cache.log')
+
+FORMAT_VERSION = 1
+
+# توابع قابل replay: شناسه (module.qualname) -> wrapper decorate شده
+_functions: Dict[str, Callable] = {}
+# object هایی که به جای آرگومان با نام ذخیره می‌شوند (مثل 'db')
+_targets: Dict[str, Any] = {}
+# True داخل فراخوانی‌های warm up (هر Task و thread اجرای آن context خودش را دارد)
+_replaying: contextvars.ContextVar = contextvars.ContextVar('cache_warmup_replaying', default=False)
+
+
+def function_id(func: Callable) -> str:
+    """شناسه پایدار تابع برای ذخیره در لیست hot key ها"""
+    return f"{func.__module__}.{func.__qualname__}"
+
+
+def register_function(func: Callable, wrapper: Callable) -> str:
+    """ثبت wrapper یک تابع cache شده برای replay (توسط decorator ها صدا زده می‌شود)"""
+    func_id = function_id(func)
+    _functions[func_id] = wrapper
+    return func_id
+
+
+def register_target(name: str, obj: Any):
+    """ثبت object ای که در آرگومان‌ها با نام جایگزین می‌شود (مثلاً database adapter)"""
+    _targets[name] = obj
+
+
+def target_name(obj: Any) -> Optional[str]:
+    """نام ثبت شده برای obj (یا None اگر target نیست)"""
+    for name, target in _targets.items():
+        if obj is target:
+            return name
+    return None
+
+
+def get_target(name: str) -> Any:
+    """object ثبت شده با نام name (KeyError اگر ثبت نشده باشد)"""
+    return _targets[name]
+
+
+class _Unserializable(Exception):
+    pass
+
+
+def _encode(value: Any) -> Any:
+    name = target_name(value)
+    if name is not None:
+        return {'$target': name}
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if isinstance(value, (list, tuple)):
+        return [_encode(v) for v in value]
+    if isinstance(value, dict) and all(isinstance(k, str) for k in value):
+        return {k: _encode(v) for k, v in value.items()}
+    raise _Unserializable(type(value).__name__)
+
+
+def _decode(value: Any) -> Any:
+    if isinstance(value, list):
+        return [_decode(v) for v in value]
+    if isinstance(value, dict):
+        if set(value) == {'$target'}:
+            try:
+                return get_target(value['$target'])
+            except KeyError:
+                raise _Unserializable(f"unknown target {value['$target']!r}")
+        return {k: _decode(v) for k, v in value.items()}
+    return value
+
+
+class HotKeyTracker:
+    """
+    شمارش فراخوانی‌هایی که باعث اجرای تابع (miss) شده‌اند
+
+    تعداد فراخوانی‌های متمایز با MAX_TRACKED محدود است؛ وقتی پر شود نیمه
+    کم‌مصرف‌تر حذف می‌شود.
+    """
+
+    MAX_TRACKED = 5000
+
+    def __init__(self):
+        self._calls: Dict[Any, Tuple[str, tuple, dict, int]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, func_id: str, args: tuple, kwargs: dict):
+        # فراخوانی‌های warm up شمرده نمی‌شوند، بقیه caller ها در همان زمان شمرده می‌شوند
+        if _replaying.get():
+            return
+        key = make_key(func_id, args, kwargs)
+        with self._lock:
+            call = self._calls.get(key)
+            count = call[3] + 1 if call is not None else 1
+            self._calls[key] = (func_id, args, kwargs, count)
+            if len(self._calls) > self.MAX_TRACKED:
+                self._prune_locked()
+
+    def _prune_locked(self):
+        ranked = sorted(self._calls.items(), key=lambda item: item[1][3], reverse=True)
+        self._calls = dict(ranked[:self.MAX_TRACKED // 2])
+
+    def hottest(self, limit: int) -> List[Tuple[str, tuple, dict, int]]:
+        with self._lock:
+            calls = list(self._calls.values())
+        calls.sort(key=lambda call: call[3], reverse=True)
+        return calls[:limit]
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+
+_tracker = HotKeyTracker()
+_last_report: Optional[Dict[str, Any]] = None
+
+
+def get_tracker() -> HotKeyTracker:
+    return _tracker
+
+
+def save_hot_keys(path: str, limit: int = 500) -> int:
+    """
+    ذخیره پرمصرف‌ترین فراخوانی‌ها در path (نوشتن اتمیک با os.replace)
+
+    Returns:
+        تعداد فراخوانی‌های ذخیره شده
+    """
+    entries = []
+    for func_id, args, kwargs, count in _tracker.hottest(limit * 2):
+        try:
+            entries.append({'func': func_id, 'args': _encode(args), 'kwargs': _encode(kwargs), 'hits': count})
+        except _Unserializable:
+            continue
+        if len(entries) >= limit:
+            break
+    if not entries:
+        return 0
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'version': FORMAT_VERSION, 'saved_at': datetime.now().isoformat(), 'keys': entries},
+                  f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    logger.info(f"Saved {len(entries)} hot cache keys to {path}")
+    return len(entries)
+
+
+def load_hot_keys(path: str) -> List[Dict[str, Any]]:
+    """خواندن لیست ذخیره شده (لیست خالی اگر فایل نباشد یا نسخه‌اش متفاوت باشد)"""
+    try:
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return []
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not read hot cache keys from {path}: {e}")
+        return []
+    if data.get('version') != FORMAT_VERSION:
+        return []
+    return data.get('keys', [])
+
+
+async def warm_up(entries: List[Dict[str, Any]], max_workers: int = 8, time_budget: float = 20.0) -> Dict[str, Any]:
+    """
+    replay فراخوانی‌ها به ترتیب پرمصرف بودن
+
+    توابع sync در ThreadPoolExecutor با max_workers thread و coroutine ها روی
+    event loop (با همان محدودیت همزمانی) اجرا می‌شوند. بعد از time_budget ثانیه
+    کارهای باقیمانده لغو می‌شوند (فراخوانی‌هایی که در thread شروع شده‌اند تا
+    پایان ادامه می‌یابند ولی منتظرشان نمی‌مانیم).
+
+    Returns:
+        گزارش: total / warmed / failed / skipped / timed_out / coverage / duration_ms
+    """
+    global _last_report
+    started = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='cache-warmup')
+    semaphore = asyncio.Semaphore(max_workers)
+    report = {'total': len(entries), 'warmed': 0, 'failed': 0, 'skipped': 0, 'timed_out': 0}
+
+    async def replay(entry):
+        wrapper = _functions.get(entry.get('func'))
+        try:
+            args = _decode(entry.get('args', []))
+            kwargs = _decode(entry.get('kwargs', {}))
+        except _Unserializable:
+            wrapper = None
+        if wrapper is None:
+            report['skipped'] += 1
+            return
+        # context همین Task است، پس روی بقیه Task ها اثری ندارد
+        _replaying.set(True)
+        async with semaphore:
+            try:
+                if inspect.iscoroutinefunction(wrapper):
+                    await wrapper(*args, **kwargs)
+                else:
+                    # run_in_executor context را به thread نمی‌برد
+                    call = functools.partial(wrapper, *args, **kwargs)
+                    await loop.run_in_executor(executor, contextvars.copy_context().run, call)
+                report['warmed'] += 1
+            except Exception as e:
+                report['failed'] += 1
+                logger.debug(f"Cache warm up failed for {entry.get('func')}: {e}")
+
+    tasks = [loop.create_task(replay(entry)) for entry in entries]
+    try:
+        if tasks:
+            _, pending = await asyncio.wait(tasks, timeout=time_budget)
+            report['timed_out'] = len(pending)
+    finally:
+        # بعد از time_budget یا لغو خود warm up (shutdown)
+        for task in tasks:
+            task.cancel()
+        executor.shutdown(wait=False)
+
+    replayable = report['total'] - report['skipped']
+    report['coverage'] = round(report['warmed'] / replayable * 100, 1) if replayable else 0.0
+    report['duration_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    _last_report = report
+    logger.info(
+        f"Cache warm up: {report['warmed']}/{report['total']} keys ({report['coverage']}% of replayable) "
+        f"in {report['duration_ms']}ms - failed={report['failed']} skipped={report['skipped']} "
+        f"timed_out={report['timed_out']}"
+    )
+    return report
+
+
+def get_warming_stats() -> Dict[str, Any]:
+    return {'tracked_calls': len(_tracker), 'last_warm_up': _last_report}
+
+
+async def warm_caches(targets: Dict[str, Any], path: str, max_keys: int = 500, max_workers: int = 8,
+                      time_budget: float = 20.0, save_interval: float = 300) -> Dict[str, Any]:
+    """
+    گرم کردن cache در startup و زمان‌بندی ذخیره دوره‌ای لیست hot key ها
+
+    Args:
+        targets: object های قابل ارجاع در آرگومان‌ها (مثلاً {'db': db})
+        path: مسیر فایل JSON
+    """
+    from .engine import get_engine
+
+    for name, obj in targets.items():
+        register_target(name, obj)
+    get_engine().scheduler.add_job('hot_keys_save', save_interval, lambda: save_hot_keys(path, max_keys))
+    return await warm_up(load_hot_keys(path)[:max_keys], max_workers, time_budget)